@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+import argparse
+from utils.benchmark_utils import (
+    expand_matrix, load_inputs, make_long_fixture, run_benchmark, compare_results
+)
+from config import WHISPER_CONFIG
+
+def run(args):
+    config = WHISPER_CONFIG['benchmark']
+    cases = expand_matrix(
+        args.backends, args.models, args.compute_types, args.beam_sizes,
+        device=WHISPER_CONFIG['device'], language=config['language'], decodings=args.decodings,
+        draft_model=WHISPER_CONFIG['cascade']['draft_model']
+    )
+    inputs = load_inputs(config['data_dir'], config['references'])
+    if args.long_sec > 0:
+        # 長時間音声の計測用にサンプルを連結したフィクスチャを追加
+        inputs.append(make_long_fixture(inputs, args.long_sec, WHISPER_CONFIG['paths']['work']))
+
+    report = run_benchmark(
+        cases, inputs, repeats=args.repeats, output_dir=config['output_dir'], batch_size=args.batch_size,
+        adaptive_beam=WHISPER_CONFIG['adaptive_beam'], cascade=WHISPER_CONFIG['cascade']
+    )
+    output = args.output or os.path.join(config['output_dir'], f"benchmark_{report['meta']['created'].replace(':', '')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"output : {output}")
+
+def compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare_results(baseline, current)
+    for regression in regressions:
+        print(f"REGRESSION {regression['key']} {regression['metric']}: {regression['baseline']} -> {regression['current']}")
+    if regressions:
+        raise SystemExit(1)
+    print("No regressions")
+
+def save_baseline(args):
+    shutil.copyfile(args.result, args.baseline)
+    print(f"baseline : {args.baseline}")
+
+def main():
+    config = WHISPER_CONFIG['benchmark']
+    parser = argparse.ArgumentParser(description="文字起こしのベンチマーク")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="ベンチマークを実行してJSONに保存")
+    run_parser.add_argument('--backends', nargs='+', default=config['backends'])
+    run_parser.add_argument('--models', nargs='+', default=config['models'])
+    run_parser.add_argument('--compute-types', nargs='+', default=config['compute_types'])
+    run_parser.add_argument('--beam-sizes', nargs='+', type=int, default=config['beam_sizes'])
+    run_parser.add_argument('--decodings', nargs='+', default=config['decodings'], choices=['fixed', 'adaptive', 'cascade'],
+                            help="adaptive: 貪欲法の後に信頼度の低い区間だけをビームサーチ / "
+                                 "cascade: 小さいモデルの後に信頼度の低い区間だけを大きいモデルで処理 (faster-whisperのみ)")
+    run_parser.add_argument('--repeats', type=int, default=config['repeats'], help="ウォーム計測の回数")
+    run_parser.add_argument('--batch-size', type=int, default=config['batch_size'], help="短い入力をまとめたバッチ推論も計測する (0で無効)")
+    run_parser.add_argument('--long-sec', type=float, default=config['long_fixture_sec'], help="長時間フィクスチャの長さ(0で無効)")
+    run_parser.add_argument('--output', help="結果の出力先")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help="ベースラインと比較して回帰を検出")
+    compare_parser.add_argument('current', help="比較する結果のJSON")
+    compare_parser.add_argument('--baseline', default=config['baseline'])
+    compare_parser.set_defaults(func=compare)
+
+    baseline_parser = subparsers.add_parser('baseline', help="結果をベースラインとして保存")
+    baseline_parser.add_argument('result', help="ベースラインにする結果のJSON")
+    baseline_parser.add_argument('--baseline', default=config['baseline'])
+    baseline_parser.set_defaults(func=save_baseline)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
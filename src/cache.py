@@ -0,0 +1,37 @@
+import argparse
+from datetime import datetime
+from utils.cache_utils import TranscriptionCache
+from config import WHISPER_CONFIG
+
+def main():
+    parser = argparse.ArgumentParser(description="文字起こしキャッシュの確認と削除")
+    parser.add_argument('--dir', default=WHISPER_CONFIG['cache']['dir'], help="キャッシュディレクトリ")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="エントリ一覧を表示")
+    subparsers.add_parser('stats', help="件数と合計サイズを表示")
+    prune_parser = subparsers.add_parser('prune', help="サイズ上限まで古いものから削除")
+    prune_parser.add_argument('--max-size-mb', type=float, default=WHISPER_CONFIG['cache']['max_size_mb'])
+    subparsers.add_parser('clear', help="全削除")
+    args = parser.parse_args()
+
+    cache = TranscriptionCache(args.dir, WHISPER_CONFIG['cache']['max_size_mb'])
+
+    if args.command == 'list':
+        for entry in cache.entries():
+            last_used = datetime.fromtimestamp(entry['last_used']).strftime('%Y-%m-%d %H:%M:%S')
+            params = entry['params']
+            print(f"{entry['key'][:16]}  {entry['size']:>10}  {last_used}  "
+                  f"{params.get('backend', '')}/{params.get('model', '')}/{params.get('language', '')}  {entry['source']}")
+    elif args.command == 'stats':
+        entries = cache.entries()
+        total = sum(entry['size'] for entry in entries)
+        print(f"entries: {len(entries)}")
+        print(f"size   : {total / 1024 / 1024:.2f} MB / {cache.max_size_bytes / 1024 / 1024:.2f} MB")
+    elif args.command == 'prune':
+        removed = cache.evict(int(args.max_size_mb * 1024 * 1024))
+        print(f"removed: {len(removed)}")
+    elif args.command == 'clear':
+        print(f"removed: {cache.clear()}")
+
+if __name__ == '__main__':
+    main()
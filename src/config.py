@@ -14,14 +14,170 @@ WHISPER_CONFIG = {
     },
     'paths': {
         'input': '../input',
-        'output': '../output'
+        'output': '../output',
+        'work': '../output/.work'  # 音声の抽出やリマックスの作業ディレクトリ
     },
     'timestamps': {
         'include': True,
         'format': 'full'
     },
-    'output_format': 'html',  # 'txt' or 'html'
+    'output_format': 'html',  # 'txt', 'html' or 'srt'
+    # 単語単位のタイムスタンプ (html: 再生中の単語をハイライト / srt: 単語ごとの字幕)
+    # 単語の位置合わせは追加の処理になるため、有効な場合もtxt出力では求めない
+    'word_timestamps': False,
+    'media': {
+        # HTML出力のメディアの配置方法 ('auto', 'reflink', 'hardlink', 'symlink', 'relative', 'copy')
+        # autoはreflink→hardlink→copyの順に試す。relativeは配置せず入力ファイルを相対パスで参照する
+        'placement': 'auto',
+        'proxy': False  # Trueの場合は音声のみの軽量なプロキシ(.m4a)を再生用に作成
+    },
     'language': 'ja',
     'device': 'cpu',
-    'compute_type': 'int8'
+    'compute_type': 'int8',
+    'cache': {
+        'enabled': True,
+        'dir': '../cache',
+        'max_size_mb': 1024
+    },
+    'transcripts': {
+        # 文字起こし結果を列指向のバイナリ形式(.wtr)で保存し、モデルを使わずに出力し直せるようにする (transcript.py)
+        'enabled': True,
+        'dir': '../output/.transcripts'
+    },
+    'search': {
+        # 出力した文字起こし結果の全文検索の索引 (search.py)。文字起こしの最後に追加・変更分だけを索引し直す
+        'enabled': True,
+        'db': '../output/.search/index.sqlite3'
+    },
+    'vad': {
+        # 文字起こしの前に音声区間を検出し、無音を除いた音声だけをモデルに渡す (両方のバックエンド。時刻は元の音声に戻す)
+        # 音声の無いファイルはモデルを実行せずに空の結果を出力し、全てのファイルが無音ならモデルをロードしない (ライブ入力も同様)
+        'enabled': True,
+        'method': 'auto',  # 'silero' (faster-whisperのSilero VAD) / 'energy' (音量) / 'auto' (Sileroが使えなければ音量)
+        'threshold': 0.5,  # Sileroの音声の確率の閾値
+        'energy_threshold_db': -45,  # 音量で検出する場合の閾値(dBFS)
+        'min_speech_ms': 250,  # これより短い音声区間は捨てる
+        'min_silence_ms': 2000,  # これより短い無音は区切らない
+        'speech_pad_ms': 400  # 音声区間の前後に付ける余白
+    },
+    'checkpoint': {
+        # 窓ごとに処理する長いファイル (streaming_decode・long_audio) の途中経過を保存し、中断後はその続きから処理する
+        # 完了した窓の結果は再利用するため、温度を上げたサンプリングに切り替わる窓が無ければ最初から処理した結果と一致する
+        'enabled': True,
+        'dir': '../output/.checkpoints',
+        'interval_sec': 60  # 途中経過を保存する間隔(秒)
+    },
+    'model_pool': {
+        'max_memory_mb': 4096  # ロード済みモデルの合計メモリ上限 (0の場合は無制限)
+    },
+    'pcm_cache': {
+        'enabled': True,
+        'dir': '../output/.pcm'  # デコード済みPCM(.npy)の保存先
+    },
+    'long_audio': {
+        'enabled': True,
+        'min_duration_sec': 1800,  # この長さ以上のファイルを分割して並列処理
+        'window_sec': 600,
+        'overlap_sec': 5,
+        'workers': 4
+    },
+    'streaming_decode': {
+        'enabled': False,  # 有効にすると長いファイルは分割並列処理より優先してストリーミングで処理
+        'min_duration_sec': 3600,
+        'window_sec': 30,
+        'overlap_sec': 2
+    },
+    'live': {
+        # 標準入力や名前付きパイプからの逐次文字起こし (stream.py)
+        'chunk_sec': 0.5,  # 入力を読み込む単位
+        'min_chunk_sec': 1.0,  # この長さの音声が届くごとに未確定部分を文字起こしし直す
+        'max_buffer_sec': 30,  # 未確定の音声を溜める上限
+        'show_partial': True,  # 未確定の結果もログに出力する
+        'echo': True  # 確定したセグメントを標準出力に書き出す
+    },
+    'benchmark': {
+        'backends': ['faster-whisper', 'whisper'],
+        'models': ['tiny', 'base', 'small'],
+        'compute_types': ['int8'],
+        'beam_sizes': [1, 5],
+        # 'fixed': 全体を指定のビーム幅で処理 / 'adaptive': 貪欲法の後に信頼度の低い区間だけを指定のビーム幅で処理し直す
+        # 'cascade': cascade.draft_modelで下書きし、信頼度の低い区間だけを指定のモデルで処理し直す
+        # (faster-whisperのみ。閾値はadaptive_beam・cascadeの設定を使う。cascadeはdraft_modelより大きいモデルのみ)
+        'decodings': ['fixed', 'adaptive', 'cascade'],
+        'repeats': 1,  # ウォーム計測の回数
+        'batch_size': 8,  # 短い入力をまとめたバッチ推論のスループットも計測する (0で無効)
+        'long_fixture_sec': 600,  # サンプルを連結した長時間音声の長さ (0で無効)
+        'language': 'ja',
+        'data_dir': 'data',
+        'references': 'data/references.json',
+        'output_dir': '../output/benchmark',
+        'baseline': 'data/benchmark_baseline.json'
+    },
+    'watch': {
+        # 入力ディレクトリを監視するデーモン (watch.py)
+        'backend': 'faster-whisper',  # 'faster-whisper' or 'whisper'
+        'db': '../output/.watch/queue.sqlite3',  # 永続キューの保存先
+        'poll_sec': 2,  # 監視の間隔
+        'settle_sec': 5,  # サイズと更新日時がこの時間変わらなければ書き込み完了とみなす
+        'workers': 1,  # 同時に処理するジョブ数 (ワーカーごとにモデルをロード済みで待機)
+        'max_queue': 100,  # 未完了のジョブがこの数に達すると新しいファイルの登録を止める
+        'max_attempts': 5,  # 失敗したジョブの試行回数の上限
+        'backoff_sec': 30,  # 再試行までの待ち時間 (失敗するたびに倍にする)
+        'backoff_max_sec': 3600
+    },
+    'service': {
+        # HTTPの文字起こしサービス (server.py)
+        'host': '0.0.0.0',
+        'port': 8000,
+        # 常駐させるワーカープール (先頭が既定)。ワーカーごとにモデルをロード済みで待機する
+        'pools': [
+            {'backend': 'faster-whisper', 'model': 'small', 'workers': 1},
+        ],
+        'max_pending': 100,  # 処理待ちのジョブがこの数に達すると503を返す
+        'max_upload_mb': 2048,
+        'work_dir': '../output/.service'  # 投入された音声とセグメントの保存先
+    },
+    'batch': {
+        'workers': 1  # 2以上でワーカープロセスによる並列処理
+    },
+    'batched': {
+        # faster-whisperのバッチ推論 (BatchedInferencePipeline)
+        'enabled': True,
+        'batch_size': 8,  # 1回の推論で同時に処理する音声(VAD区間)の数
+        'max_clip_sec': 30,  # この長さ以下のファイルはまとめてバッチ推論する (30秒まで)
+        'max_files': 64,  # 1回にまとめるファイル数の上限 (まとめた音声はメモリに読み込む)
+        'vad_segments': False  # 長いファイルもVAD区間をまとめてバッチ推論する (前の区間の文脈を使わないため結果が変わりうる)
+    },
+    'cascade': {
+        # faster-whisperで小さいモデルが全体を下書きし、信頼度の低いセグメントだけをmodelで処理し直す (faster.py)
+        # 有効な場合はmodels.availableの代わりにmodelを使い、出力ファイル名は <名前>_<draft_model>-<model> になる
+        'enabled': False,
+        'draft_model': 'base',
+        'model': 'medium',
+        'avg_logprob': -0.8,  # 平均対数確率がこれを下回るセグメントを処理し直す
+        'compression_ratio': 2.4,  # 圧縮率がこれを上回る(繰り返しの多い)セグメントを処理し直す
+        'no_speech_prob': 0.6,  # 無音の確率がこれを上回るセグメントを処理し直す
+        'merge_gap_sec': 2.0,  # 間隔がこれ以下の区間は1つにまとめて処理する
+        'padding_sec': 1.0  # 処理し直す区間の前後に付ける文脈
+    },
+    'adaptive_beam': {
+        # faster-whisperで貪欲法(beam_size=1)で文字起こしし、信頼度の低いセグメントだけをビームサーチで処理し直す (faster.py)
+        # cascadeと両方有効な場合はcascadeを使う
+        'enabled': False,
+        'beam_size': 5,  # 処理し直す区間のビーム幅
+        'avg_logprob': -0.8,  # 平均対数確率がこれを下回るセグメントを処理し直す
+        'compression_ratio': 2.4,  # 圧縮率がこれを上回る(繰り返しの多い)セグメントを処理し直す
+        'no_speech_prob': 1.0,  # 無音の確率がこれを上回るセグメントを処理し直す (1.0で無効。ビームサーチでは改善しにくい)
+        'merge_gap_sec': 2.0,  # 間隔がこれ以下の区間は1つにまとめて処理する
+        'padding_sec': 1.0  # 処理し直す区間の前後に付ける文脈
+    },
+    'logging': {
+        'level': 'info'  # debug: 認識したセグメントもすべて表示 / info / warning / error
+    },
+    'metrics': {
+        # ファイルごとの処理段階別の時間・RTF・メモリ使用量の記録
+        'enabled': True,
+        'jsonl': '../output/metrics/metrics.jsonl',  # 1ファイル1行で追記する
+        'prometheus': '../output/metrics/metrics.prom'  # 処理の終了時に集計して書き出す (node_exporterのtextfile collector用)
+    }
 }
\ No newline at end of file
@@ -1,31 +1,130 @@
 import os
 import glob
 from utils.faster_whisper_utils import FasterWhisperProcessor
-from utils.moviepy_utils import convert_audio_file
+from utils.moviepy_utils import prepare_input, get_media_duration
+from utils.batch_utils import run_batch
+from utils.cache_utils import TranscriptionCache
+from utils.model_pool_utils import get_model_pool
+from utils.audio_utils import PcmCache
+from utils.transcript_utils import TranscriptArchive
+from utils.checkpoint_utils import CheckpointStore
+from utils.search_utils import update_index
+from utils.metrics_utils import get_metrics, write_prometheus
+from utils.log_utils import configure_logging
 from config import WHISPER_CONFIG
 
-def faster(language = None):
-    processor = FasterWhisperProcessor(
+def faster(language = None, workers = None):
+    processor_kwargs = dict(
         output_dir=WHISPER_CONFIG['paths']['output'],
         input_dir=WHISPER_CONFIG['paths']['input'],
         include_timestamps=WHISPER_CONFIG['timestamps']['include'],
         timestamp_format=WHISPER_CONFIG['timestamps']['format'],
         output_format=WHISPER_CONFIG['output_format'],
-        language=WHISPER_CONFIG['language'] if language is None else language
+        language=WHISPER_CONFIG['language'] if language is None else language,
+        cache=TranscriptionCache(
+            WHISPER_CONFIG['cache']['dir'],
+            WHISPER_CONFIG['cache']['max_size_mb']
+        ) if WHISPER_CONFIG['cache']['enabled'] else None,
+        long_audio=WHISPER_CONFIG['long_audio'],
+        pcm_cache=PcmCache(WHISPER_CONFIG['pcm_cache']['dir']) if WHISPER_CONFIG['pcm_cache']['enabled'] else None,
+        streaming_decode=WHISPER_CONFIG['streaming_decode'],
+        media_placement=WHISPER_CONFIG['media']['placement'],
+        media_proxy=WHISPER_CONFIG['media']['proxy'],
+        word_timestamps=WHISPER_CONFIG['word_timestamps'],
+        archive=TranscriptArchive(WHISPER_CONFIG['transcripts']['dir']) if WHISPER_CONFIG['transcripts']['enabled'] else None,
+        vad=WHISPER_CONFIG['vad'] if WHISPER_CONFIG['vad']['enabled'] else None,
+        checkpoints=CheckpointStore(
+            WHISPER_CONFIG['checkpoint']['dir'],
+            WHISPER_CONFIG['checkpoint']['interval_sec']
+        ) if WHISPER_CONFIG['checkpoint']['enabled'] else None,
+        batched=WHISPER_CONFIG['batched'] if WHISPER_CONFIG['batched']['enabled'] else None,
+        cascade=WHISPER_CONFIG['cascade'] if WHISPER_CONFIG['cascade']['enabled'] else None,
+        adaptive_beam=WHISPER_CONFIG['adaptive_beam'] if WHISPER_CONFIG['adaptive_beam']['enabled'] else None
     )
+    configure_logging(WHISPER_CONFIG['logging']['level'])
+    metrics = get_metrics()
+    metrics.configure(WHISPER_CONFIG['metrics']['enabled'], WHISPER_CONFIG['metrics']['jsonl'])
+    processor = FasterWhisperProcessor(**processor_kwargs)
+    workers = WHISPER_CONFIG['batch']['workers'] if workers is None else workers
+    work_dir = WHISPER_CONFIG['paths']['work']
+    get_model_pool().set_max_memory(WHISPER_CONFIG['model_pool']['max_memory_mb'])
+    # VADを使う場合はモデルを最初に文字起こしする時にロードする (全てのファイルが無音ならロードしない)
+    model_kwargs = dict(device=WHISPER_CONFIG['device'], compute_type=WHISPER_CONFIG['compute_type'], preload=not processor.vad)
     
     print("Starting transcription process...")
     print(f"Output format: {processor.output_format}")
     
-    for model_name in WHISPER_CONFIG['models']['available']:
+    input_paths = glob.glob(os.path.join(processor.input_dir, '*'))
+    # カスケードの場合は下書きのモデルと組み合わせる大きいモデルだけを使う
+    model_names = [WHISPER_CONFIG['cascade']['model']] if processor.cascade else WHISPER_CONFIG['models']['available']
+    if not input_paths:
+        model_names = []
+    for model_name in model_names:
+        if workers > 1:
+            # ワーカープロセスごとにモデルをロードして並列処理
+            audio_paths = []
+            media_paths = {}
+            source_paths = {}
+            for audio_path in input_paths:
+                with metrics.file(audio_path):
+                    prepared = prepare_input(audio_path, work_dir, processor.output_format == 'html')
+                if prepared is None:
+                    # 変換できないファイルは失敗として記録済みのため、残りのファイルだけを処理する
+                    continue
+                current_path, media_path = prepared
+                audio_paths.append(current_path)
+                source_paths[current_path] = audio_path
+                if media_path:
+                    media_paths[current_path] = media_path
+            # ファイル単位で並列化するため、ワーカー内での分割並列処理は行わない
+            batch_kwargs = dict(processor_kwargs, long_audio=None)
+            run_batch(FasterWhisperProcessor, batch_kwargs, model_name, model_kwargs, audio_paths, workers, media_paths, source_paths)
+            continue
+
         print(f"Loading model: {model_name}")
-        processor.set_model(model_name, device=WHISPER_CONFIG['device'], compute_type=WHISPER_CONFIG['compute_type'])
-        
-        for audio_path in glob.iglob(os.path.join(processor.input_dir, '*')):
-            current_path = convert_audio_file(audio_path)
-            processor.process_audio_file(current_path)
+        processor.set_model(model_name, **model_kwargs)
+
+        audio_paths = list(input_paths)
+        if processor.batched and not processor.refines():
+            # 短いファイルはまとめてバッチ推論する
+            max_clip_sec = min(processor.batched['max_clip_sec'], 30)
+            clips = [path for path in audio_paths if 0 < get_media_duration(path) <= max_clip_sec]
+            if len(clips) > 1:
+                clip_paths = []
+                media_paths = {}
+                source_paths = {}
+                for audio_path in clips:
+                    with metrics.file(audio_path):
+                        prepared = prepare_input(audio_path, work_dir, processor.output_format == 'html')
+                    if prepared is None:
+                        continue
+                    current_path, media_path = prepared
+                    clip_paths.append(current_path)
+                    source_paths[current_path] = audio_path
+                    if media_path:
+                        media_paths[current_path] = media_path
+                processor.process_clips(clip_paths, media_paths, source_paths)
+                audio_paths = [path for path in audio_paths if path not in clips]
+
+        for audio_path in audio_paths:
+            # 変換の時間も同じファイルの記録に含める
+            with metrics.file(audio_path):
+                # HTML出力の場合のみブラウザで再生できるメディアを用意する
+                prepared = prepare_input(audio_path, work_dir, processor.output_format == 'html')
+                if prepared is None:
+                    continue
+                current_path, media_path = prepared
+                processor.process_audio_file(current_path, media_path, audio_path)
 
+    if processor.refines():
+        processor.refine_report()
+    processor.close()
+    get_model_pool().report()
+    if metrics.enabled:
+        write_prometheus(WHISPER_CONFIG['metrics']['jsonl'], WHISPER_CONFIG['metrics']['prometheus'])
+    if WHISPER_CONFIG['search']['enabled']:
+        update_index(WHISPER_CONFIG['search']['db'], [WHISPER_CONFIG['paths']['output'], WHISPER_CONFIG['transcripts']['dir']])
     print("Transcription complete!")
 
 if __name__ == '__main__':
-    faster()
\ No newline at end of file
+    faster()
@@ -0,0 +1,54 @@
+import argparse
+from utils.metrics_utils import STAGES, load_records, render_prometheus, write_prometheus
+from config import WHISPER_CONFIG
+
+def summary(args):
+    records = load_records(args.jsonl)
+    if not records:
+        print("no records")
+        return
+    # バックエンド・モデルごとに段階別の時間を合計する
+    groups = {}
+    for record in records:
+        groups.setdefault((record.get('backend') or '', record.get('model') or ''), []).append(record)
+    for (backend, model), group in groups.items():
+        wall = sum(record['wall_seconds'] for record in group)
+        audio = sum(record.get('audio_seconds') or 0.0 for record in group)
+        failed = sum(1 for record in group if not record.get('ok'))
+        peak = max(record.get('peak_rss_bytes') or 0 for record in group)
+        print(f"{backend}/{model}: {len(group)} files ({failed} failed)")
+        print(f"  audio: {audio:.1f}s / wall: {wall:.1f}s / RTF: {wall / audio if audio else 0.0:.3f} / peak RSS: {peak / 1024 / 1024:.0f} MB")
+        for stage in STAGES + ['other']:
+            seconds = sum(record['stages'].get(stage, 0.0) for record in group)
+            print(f"  {stage:<10} {seconds:>10.2f}s  {seconds / wall * 100 if wall else 0.0:>5.1f}%")
+    if args.files:
+        for record in records[-args.files:]:
+            rtf = f"{record['rtf']:.3f}" if record.get('rtf') is not None else '-'
+            print(f"{record['started']}  {record['wall_seconds']:>8.2f}s  RTF {rtf:>6}  {record.get('mode', '-'):<6}  "
+                  f"{'ok' if record.get('ok') else 'failed':<6}  {record['file']}")
+
+def prometheus(args):
+    if args.output:
+        write_prometheus(args.jsonl, args.output)
+        print(f"output : {args.output}")
+    else:
+        print(render_prometheus(load_records(args.jsonl)), end='')
+
+def main():
+    parser = argparse.ArgumentParser(description="処理段階別の計測結果の集計")
+    parser.add_argument('--jsonl', default=WHISPER_CONFIG['metrics']['jsonl'], help="計測結果のJSON Linesファイル")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    summary_parser = subparsers.add_parser('summary', help="段階別の時間の内訳を表示")
+    summary_parser.add_argument('--files', type=int, default=0, help="直近のファイルごとの結果も表示する件数")
+    summary_parser.set_defaults(func=summary)
+
+    prometheus_parser = subparsers.add_parser('prometheus', help="Prometheusのテキスト形式で出力")
+    prometheus_parser.add_argument('--output', help="書き出し先 (省略時は標準出力)")
+    prometheus_parser.set_defaults(func=prometheus)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 import glob
 import os
 import whisper
+from utils.model_pool_utils import get_model_pool
+from utils.audio_utils import PcmCache
+from config import WHISPER_CONFIG
 import time
 
 def createTextFile(base_file_path, text, model_name=None):
@@ -23,7 +26,9 @@ if __name__ == '__main__':
     "medium",
     # "large"
   ]
-  model = dict.fromkeys(model_list)
+  model_pool = get_model_pool()
+  model_pool.set_max_memory(WHISPER_CONFIG['model_pool']['max_memory_mb'])
+  pcm_cache = PcmCache(WHISPER_CONFIG['pcm_cache']['dir'])
   sample_input = {
     "data/sample1.mp3": "貴社の記者が汽車で帰社した。",
     "data/sample2.mp3": "この意見は革新的で核心を突いたものと私は確信している。",
@@ -35,15 +40,16 @@ if __name__ == '__main__':
   print("start")
   for p in glob.iglob('data/sample*.mp*'):
     result_list = []
+    # 全モデルで同じデコード済みPCMを使う
+    audio = pcm_cache.load(p)
     for model_name in model_list:
       if not model_name:
         continue
       # 変換の実行
       print(f"model: {model_name}")
-      if not model[model_name]:
-        model[model_name] = whisper.load_model(model_name)
+      model = model_pool.get('whisper', model_name, 'cpu', None, lambda: whisper.load_model(model_name, device='cpu'))
       start_time = time.perf_counter()
-      result = model[model_name].transcribe(p, language="ja")
+      result = model.transcribe(audio, language="ja")
       result_text = result["text"]
       execution_time = round(time.perf_counter() - start_time,4)
       if len(result_list) == 0:
@@ -52,4 +58,5 @@ if __name__ == '__main__':
     
     createTextFile(p, "\n".join(result_list))
 
+  model_pool.report()
   print("完了")
\ No newline at end of file
@@ -1,8 +1,11 @@
 import glob
 import os
 import whisper
+from utils.model_pool_utils import get_model_pool
+from utils.audio_utils import PcmCache
+from utils.score_utils import align, character_error_rate, levenshtein
+from config import WHISPER_CONFIG
 import time
-import difflib
 
 def createTextFile(base_file_path, text, model_name=None):
   file_name = os.path.basename(base_file_path)
@@ -16,42 +19,28 @@ def createTextFile(base_file_path, text, model_name=None):
     f.write(text)
 
 def highlight_diff(input_text, output_text):
-  d = difflib.Differ()
-  diff = list(d.compare(input_text, output_text))
+  # 編集距離が最小となるアラインメントで差異を求める
   result = []
-  correct_chars = 0
-  i = 0
-  while i < len(diff):
-    if diff[i].startswith('  '):
-      result.append(diff[i][2:])
-      correct_chars += 1
-      i += 1
+  for tag, i1, i2, j1, j2 in align(input_text, output_text):
+    deleted = input_text[i1:i2]
+    added = output_text[j1:j2]
+    if tag == 'equal':
+      result.append(deleted)
+      continue
+    if tag == 'replace':
+      result.append(f'~~{deleted}~~`{added}`')
+    elif tag == 'delete':
+      result.append(f'~~{deleted}~~')
     else:
-      j = i
-      deleted = []
-      added = []
-      while j < len(diff) and not diff[j].startswith('  '):
-        if diff[j].startswith('- '):
-          deleted.append(diff[j][2:])
-        elif diff[j].startswith('+ '):
-          added.append(diff[j][2:])
-        j += 1
-      
-      if deleted and added:
-        result.append(f'~~{"".join(deleted)}~~`{"".join(added)}`')
-      elif deleted:
-        result.append(f'~~{"".join(deleted)}~~')
-      elif added:
-        result.append(f'`{"".join(added)}`')
-      
-      i = j
+      result.append(f'`{added}`')
 
-  return ''.join(result), correct_chars
+  # 誤り数は区間ごとの長さの合計ではなく全体の編集距離 (アラインメントと同じ最小値)
+  return ''.join(result), levenshtein(input_text, output_text)
 
-def calculate_recognition_rate(input_text, correct_chars):
+def calculate_recognition_rate(input_text, errors):
   total_chars = len(input_text)
-  recognition_rate = (correct_chars / total_chars) * 100
-  return recognition_rate, correct_chars, total_chars
+  recognition_rate = max(0.0, 1 - errors / total_chars) * 100
+  return recognition_rate, errors, total_chars
 
 if __name__ == '__main__':
   model_list = [
@@ -61,7 +50,9 @@ if __name__ == '__main__':
     "medium",
     # "large"
   ]
-  model = dict.fromkeys(model_list)
+  model_pool = get_model_pool()
+  model_pool.set_max_memory(WHISPER_CONFIG['model_pool']['max_memory_mb'])
+  pcm_cache = PcmCache(WHISPER_CONFIG['pcm_cache']['dir'])
   sample_input = {
     "data/sample1.mp3": "貴社の記者が汽車で帰社した。",
     "data/sample2.mp3": "この意見は革新的で核心を突いたものと私は確信している。",
@@ -73,28 +64,31 @@ if __name__ == '__main__':
   print("start")
   for p in glob.iglob('data/sample*.mp*'):
     result_list = []
+    # 全モデルで同じデコード済みPCMを使う
+    audio = pcm_cache.load(p)
     for model_name in model_list:
       if not model_name:
         continue
       # 変換の実行
       print(f"model: {model_name}")
-      if not model[model_name]:
-        model[model_name] = whisper.load_model(model_name)
+      model = model_pool.get('whisper', model_name, 'cpu', None, lambda: whisper.load_model(model_name, device='cpu'))
       start_time = time.perf_counter()
-      result = model[model_name].transcribe(p, language="ja")
+      result = model.transcribe(audio, language="ja")
       result_text = result["text"]
       execution_time = round(time.perf_counter() - start_time, 4)
       
-      # 差異をハイライトし、正しく認識された文字数を取得
-      highlighted_text, correct_chars = highlight_diff(sample_input[p], result_text)
+      # 差異をハイライトし、誤り(置換・削除・挿入)の文字数を取得
+      highlighted_text, errors = highlight_diff(sample_input[p], result_text)
       
-      # 認識率を計算
-      recognition_rate, correct_chars, total_chars = calculate_recognition_rate(sample_input[p], correct_chars)
+      # 認識率を計算 (CERは句読点・空白を除いて計算)
+      recognition_rate, errors, total_chars = calculate_recognition_rate(sample_input[p], errors)
+      cer = character_error_rate(sample_input[p], result_text)
       
       if len(result_list) == 0:
         result_list.append(f"# Whisper音声認識検証\n\n## Input  \n{sample_input[p]}\n\n<audio controls src='../src/{p}'></audio>\n\n## Output")
-      result_list.append(f"### {model_name} ( {str(execution_time)}s )\n{highlighted_text}\n\n認識率: {recognition_rate:.2f}% ({correct_chars}/{total_chars}文字)\n")
+      result_list.append(f"### {model_name} ( {str(execution_time)}s )\n{highlighted_text}\n\n認識率: {recognition_rate:.2f}% (誤り {errors}/{total_chars}文字) / CER: {cer * 100:.2f}%\n")
     
     createTextFile(p, "\n".join(result_list))
 
+  model_pool.report()
   print("完了")
\ No newline at end of file
@@ -0,0 +1,58 @@
+import time
+import argparse
+from utils.search_utils import SearchIndex, format_position
+from utils.log_utils import configure_logging
+from config import WHISPER_CONFIG
+
+def directories():
+    return [WHISPER_CONFIG['paths']['output'], WHISPER_CONFIG['transcripts']['dir']]
+
+def update(index, args):
+    started = time.perf_counter()
+    counts = index.update(directories())
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"added: {counts['added']}, updated: {counts['updated']}, removed: {counts['removed']}, "
+          f"unchanged: {counts['unchanged']} ({elapsed:.1f} ms)")
+
+def query(index, args):
+    if not args.no_update:
+        index.update(directories())
+    started = time.perf_counter()
+    hits = index.search(args.text, args.limit, args.file)
+    elapsed = (time.perf_counter() - started) * 1000
+    for hit in hits:
+        print(f"{hit['path']}  #{hit['seq']}  {format_position(hit['start'])}  {hit['text']}")
+    print(f"{len(hits)} hits ({elapsed:.1f} ms)")
+
+def stats(index, args):
+    for key, value in index.stats().items():
+        print(f"{key:<10}: {value}")
+
+def main():
+    parser = argparse.ArgumentParser(description="文字起こし結果の全文検索")
+    parser.add_argument('--db', default=WHISPER_CONFIG['search']['db'], help="索引のデータベースファイル")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help="出力ディレクトリの追加・変更分を索引に反映")
+    update_parser.set_defaults(func=update)
+
+    query_parser = subparsers.add_parser('query', help="検索語を含むセグメントを表示")
+    query_parser.add_argument('text')
+    query_parser.add_argument('--limit', type=int, default=50)
+    query_parser.add_argument('--file', help="ファイル名に含まれる文字列で絞り込む")
+    query_parser.add_argument('--no-update', action='store_true', help="検索前に索引を更新しない")
+    query_parser.set_defaults(func=query)
+
+    stats_parser = subparsers.add_parser('stats', help="索引の件数")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args()
+    configure_logging(WHISPER_CONFIG['logging']['level'])
+    index = SearchIndex(args.db)
+    try:
+        args.func(index, args)
+    finally:
+        index.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import io
+import os
+import json
+import uuid
+import signal
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from utils.whisper_utils import WhisperProcessor
+from utils.faster_whisper_utils import FasterWhisperProcessor
+from utils.service_utils import TranscriptionService, ServiceBusy
+from utils.html_utils import HtmlTranscriptWriter, MIME_TYPES
+from utils.cache_utils import TranscriptionCache
+from utils.audio_utils import PcmCache
+from utils.metrics_utils import get_metrics, load_records, render_prometheus
+from utils.log_utils import configure_logging
+from config import WHISPER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PROCESSOR_CLASSES = {
+    'whisper': WhisperProcessor,
+    'faster-whisper': FasterWhisperProcessor,
+}
+
+class TranscriptionHandler(BaseHTTPRequestHandler):
+    """
+    文字起こしサービスのHTTPハンドラ
+      POST   /jobs?filename=&backend=&model=&language=&priority=  音声(本文)を投入
+      GET    /jobs                                                ジョブ一覧
+      GET    /jobs/<id>                                           ジョブの状態
+      GET    /jobs/<id>/result?format=txt|html|json               結果
+      GET    /jobs/<id>/segments                                  セグメントを確定した順にNDJSONで返す
+      GET    /jobs/<id>/media                                     投入された音声 (HTMLの再生用)
+      DELETE /jobs/<id>                                           完了したジョブの削除
+      GET    /health                                              ワーカープールの状態
+      GET    /metrics                                             処理段階別の計測結果 (Prometheusのテキスト形式)
+    """
+
+    def log_message(self, format: str, *args) -> None:
+        """アクセスログ・エラーを標準エラーへ直接書かず、ログの設定(logging.level)に従って出力する"""
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def log_error(self, format: str, *args) -> None:
+        """リクエストの解析エラーなどは警告として出力する"""
+        logger.warning(f"{self.address_string()} {format % args}")
+
+    def send_json(self, status: int, body, headers: dict = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_text(self, status: int, text: str, content_type: str) -> None:
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self):
+        """(パスの要素, クエリ) に分解"""
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_POST(self):
+        parts, query = self.route()
+        if parts != ['jobs']:
+            return self.send_json(404, {'error': 'not found'})
+        service = self.server.service
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            return self.send_json(400, {'error': 'empty body'})
+        if length > self.server.max_upload_bytes:
+            return self.send_json(413, {'error': 'file too large'})
+
+        filename = os.path.basename(query.get('filename') or self.headers.get('X-Filename') or 'upload.wav')
+        upload_path = os.path.join(self.server.upload_dir, uuid.uuid4().hex + os.path.splitext(filename)[1].lower())
+        # 本文は少しずつファイルへ書き出し、メモリに全体を載せない
+        with open(upload_path, 'wb') as f:
+            remaining = length
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining > 0:
+            os.remove(upload_path)
+            return self.send_json(400, {'error': 'incomplete body'})
+
+        try:
+            status = service.submit(
+                upload_path,
+                filename,
+                backend=query.get('backend'),
+                model=query.get('model'),
+                language=query.get('language') or WHISPER_CONFIG['language'],
+                priority=int(query.get('priority') or 0)
+            )
+        except ServiceBusy as e:
+            os.remove(upload_path)
+            return self.send_json(503, {'error': str(e)}, {'Retry-After': '5'})
+        except ValueError as e:
+            os.remove(upload_path)
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(202, status, {'Location': f"/jobs/{status['id']}"})
+
+    def do_GET(self):
+        parts, query = self.route()
+        service = self.server.service
+        if parts == ['health']:
+            return self.send_json(200, {'pools': service.pools(), 'jobs': len(service.jobs)})
+        if parts == ['metrics']:
+            records = load_records(WHISPER_CONFIG['metrics']['jsonl']) if get_metrics().enabled else []
+            return self.send_text(200, render_prometheus(records), 'text/plain; version=0.0.4')
+        if parts == ['jobs']:
+            return self.send_json(200, [service.status(job_id) for job_id in list(service.jobs)])
+        if len(parts) < 2 or parts[0] != 'jobs':
+            return self.send_json(404, {'error': 'not found'})
+
+        status = service.status(parts[1])
+        if status is None:
+            return self.send_json(404, {'error': 'job not found'})
+        action = parts[2] if len(parts) > 2 else None
+        if action is None:
+            return self.send_json(200, status)
+        if action == 'segments':
+            return self.stream_segments(parts[1])
+        if action == 'media':
+            return self.send_media(parts[1], status)
+        if action != 'result':
+            return self.send_json(404, {'error': 'not found'})
+
+        if status['state'] == 'failed':
+            return self.send_json(500, status)
+        if status['state'] != 'done':
+            return self.send_json(409, status, {'Retry-After': '1'})
+        segments = service.segments(parts[1])
+        result_format = query.get('format', 'json')
+        if result_format == 'txt':
+            return self.send_text(200, ''.join(self.server.formatter.format_line(segment) for segment in segments), 'text/plain')
+        if result_format == 'html':
+            buffer = io.StringIO()
+            HtmlTranscriptWriter(buffer, status['filename'], 'media').write_all(segments, flush=False)
+            return self.send_text(200, buffer.getvalue(), 'text/html')
+        if result_format == 'json':
+            return self.send_json(200, {'job': status, 'segments': segments})
+        self.send_json(400, {'error': f"unknown format: {result_format}"})
+
+    def do_DELETE(self):
+        parts, _query = self.route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            return self.send_json(404, {'error': 'not found'})
+        if not self.server.service.delete(parts[1]):
+            return self.send_json(409, {'error': 'job not found or not finished'})
+        self.send_json(200, {'deleted': parts[1]})
+
+    def stream_segments(self, job_id: str) -> None:
+        """セグメントを書き出された順に1行ずつ返す (ジョブが終わると接続を閉じる)"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            for segment in self.server.service.follow(job_id):
+                self.wfile.write((json.dumps(segment, ensure_ascii=False) + '\n').encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_media(self, job_id: str, status: dict) -> None:
+        """投入された音声を返す"""
+        path = self.server.service.jobs[job_id]['source_path']
+        if not os.path.exists(path):
+            return self.send_json(404, {'error': 'media not found'})
+        ext = os.path.splitext(status['filename'])[1].lower()
+        self.send_response(200)
+        self.send_header('Content-Type', MIME_TYPES.get(ext, 'application/octet-stream'))
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+def serve(args):
+    config = WHISPER_CONFIG['service']
+    configure_logging(WHISPER_CONFIG['logging']['level'])
+    get_metrics().configure(WHISPER_CONFIG['metrics']['enabled'], WHISPER_CONFIG['metrics']['jsonl'])
+    processor_kwargs = dict(
+        output_dir=WHISPER_CONFIG['paths']['output'],
+        input_dir=WHISPER_CONFIG['paths']['input'],
+        include_timestamps=WHISPER_CONFIG['timestamps']['include'],
+        timestamp_format=WHISPER_CONFIG['timestamps']['format'],
+        output_format='txt',
+        language=WHISPER_CONFIG['language'],
+        cache=TranscriptionCache(
+            WHISPER_CONFIG['cache']['dir'],
+            WHISPER_CONFIG['cache']['max_size_mb']
+        ) if WHISPER_CONFIG['cache']['enabled'] else None,
+        # ジョブ単位で並列化するため、ワーカー内での分割並列処理は行わない
+        long_audio=None,
+        pcm_cache=PcmCache(WHISPER_CONFIG['pcm_cache']['dir']) if WHISPER_CONFIG['pcm_cache']['enabled'] else None,
+        streaming_decode=WHISPER_CONFIG['streaming_decode']
+    )
+    model_kwargs = dict(device=WHISPER_CONFIG['device'], compute_type=WHISPER_CONFIG['compute_type'])
+    upload_dir = os.path.join(config['work_dir'], 'uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+
+    logger.info("Starting worker pools...")
+    service = TranscriptionService(
+        config['pools'], PROCESSOR_CLASSES, processor_kwargs, model_kwargs,
+        work_dir=os.path.join(config['work_dir'], 'jobs'),
+        max_pending=config['max_pending']
+    )
+    server = ThreadingHTTPServer((args.host, args.port), TranscriptionHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.upload_dir = upload_dir
+    server.max_upload_bytes = int(config['max_upload_mb'] * 1024 * 1024)
+    # txt出力の整形用 (モデルはロードしない)
+    server.formatter = WhisperProcessor(**processor_kwargs)
+
+    def shutdown(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logger.info(f"Listening: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+    logger.info("Server stopped")
+
+def main():
+    config = WHISPER_CONFIG['service']
+    parser = argparse.ArgumentParser(description="文字起こしのHTTPサービス")
+    parser.add_argument('--host', default=config['host'])
+    parser.add_argument('--port', type=int, default=config['port'])
+    args = parser.parse_args()
+    serve(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+from utils.faster_whisper_utils import FasterWhisperProcessor
+from utils.model_pool_utils import get_model_pool
+from utils.metrics_utils import get_metrics, write_prometheus
+from utils.log_utils import configure_logging
+from config import WHISPER_CONFIG
+
+def stream(args):
+    config = WHISPER_CONFIG['live']
+    configure_logging(WHISPER_CONFIG['logging']['level'])
+    metrics = get_metrics()
+    metrics.configure(WHISPER_CONFIG['metrics']['enabled'], WHISPER_CONFIG['metrics']['jsonl'])
+    processor = FasterWhisperProcessor(
+        output_dir=WHISPER_CONFIG['paths']['output'],
+        input_dir=WHISPER_CONFIG['paths']['input'],
+        include_timestamps=WHISPER_CONFIG['timestamps']['include'],
+        timestamp_format=WHISPER_CONFIG['timestamps']['format'],
+        output_format=args.output_format,
+        language=args.language,
+        # 受け取った音声は出力ディレクトリに保存されるため配置やプロキシは不要
+        media_placement='relative',
+        media_proxy=False,
+        word_timestamps=WHISPER_CONFIG['word_timestamps']
+    )
+    processor.set_model(args.model, device=WHISPER_CONFIG['device'], compute_type=WHISPER_CONFIG['compute_type'])
+    ok = processor.process_live(
+        args.source,
+        name=args.name,
+        input_format=args.format,
+        input_args=args.input_args.split() if args.input_args else None,
+        chunk_sec=config['chunk_sec'],
+        min_chunk_sec=config['min_chunk_sec'],
+        max_buffer_sec=config['max_buffer_sec'],
+        show_partial=config['show_partial'],
+        echo=config['echo']
+    )
+    get_model_pool().report()
+    if metrics.enabled:
+        write_prometheus(WHISPER_CONFIG['metrics']['jsonl'], WHISPER_CONFIG['metrics']['prometheus'])
+    if not ok:
+        raise SystemExit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="標準入力や名前付きパイプからの逐次文字起こし")
+    parser.add_argument('source', nargs='?', default='-', help="入力元 ('-'の場合は標準入力)")
+    parser.add_argument('--name', default='live', help="出力ファイル名のベース")
+    parser.add_argument('--format', help="ffmpegの入力フォーマット (例: s16le。省略時は自動判別)")
+    parser.add_argument('--input-args', help="入力フォーマットの追加引数 (例: '-ar 44100 -ac 2')")
+    parser.add_argument('--model', default=WHISPER_CONFIG['models']['default'])
+    parser.add_argument('--language', default=WHISPER_CONFIG['language'])
+    parser.add_argument('--output-format', default=WHISPER_CONFIG['output_format'], choices=['txt', 'html', 'srt'])
+    args = parser.parse_args()
+    stream(args)
+
+if __name__ == '__main__':
+    main()
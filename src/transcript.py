@@ -0,0 +1,91 @@
+import os
+import argparse
+from utils.whisper_utils import WhisperProcessor
+from utils.transcript_utils import Transcript, TranscriptArchive
+from utils.log_utils import configure_logging
+from config import WHISPER_CONFIG
+
+def list_transcripts(args):
+    archive = TranscriptArchive(args.dir)
+    for path in archive.entries():
+        transcript = Transcript.load(path)
+        meta = transcript.meta
+        words = len(transcript.word_start_ms)
+        print(f"{os.path.getsize(path):>10}  {len(transcript):>6} segments  {words:>7} words  "
+              f"{meta.get('backend', '')}/{meta.get('model', '')}/{meta.get('language', '')}  {os.path.basename(path)}")
+
+def show(args):
+    transcript = Transcript.load(args.path)
+    formatter = WhisperProcessor(
+        output_dir=WHISPER_CONFIG['paths']['output'],
+        include_timestamps=WHISPER_CONFIG['timestamps']['include'],
+        timestamp_format=WHISPER_CONFIG['timestamps']['format']
+    )
+    for row in transcript.rows():
+        print(formatter.format_row(*row), end='')
+
+def render(args):
+    # モデルは使わず、保存された結果から出力ファイルだけを作り直す
+    transcript = Transcript.load(args.path)
+    meta = transcript.meta
+    processor = WhisperProcessor(
+        output_dir=args.output_dir,
+        input_dir=WHISPER_CONFIG['paths']['input'],
+        include_timestamps=WHISPER_CONFIG['timestamps']['include'],
+        timestamp_format=WHISPER_CONFIG['timestamps']['format'],
+        output_format=args.format,
+        language=meta.get('language'),
+        media_placement=WHISPER_CONFIG['media']['placement'],
+        media_proxy=WHISPER_CONFIG['media']['proxy']
+    )
+    processor.model_name = meta.get('model') or 'transcript'
+    source = meta.get('source') or os.path.basename(args.path)
+    media_path = args.media or os.path.join(processor.input_dir, source)
+    processor.create_output_file(source, transcript, media_path if args.format == 'html' else None)
+
+def import_jsonl(args):
+    # キャッシュのエントリ(先頭行がメタ情報)やサービスのセグメントのJSON Linesを変換する
+    transcript = Transcript.from_jsonl(args.jsonl)
+    meta = transcript.meta
+    params = meta.pop('params', {})
+    meta.setdefault('backend', params.get('backend'))
+    meta.setdefault('model', params.get('model'))
+    meta.setdefault('language', params.get('language'))
+    if args.source:
+        meta['source'] = args.source
+    meta.setdefault('source', os.path.basename(args.jsonl))
+    path = TranscriptArchive(args.dir).path_for(meta['source'], meta.get('model'))
+    transcript.save(path)
+    print(f"output : {path} ({len(transcript)} segments)")
+
+def main():
+    config = WHISPER_CONFIG['transcripts']
+    parser = argparse.ArgumentParser(description="保存された文字起こし結果(.wtr)の確認と出力")
+    parser.add_argument('--dir', default=config['dir'], help="保存先ディレクトリ")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help="保存された結果の一覧")
+    list_parser.set_defaults(func=list_transcripts)
+
+    show_parser = subparsers.add_parser('show', help="テキストとして表示")
+    show_parser.add_argument('path')
+    show_parser.set_defaults(func=show)
+
+    render_parser = subparsers.add_parser('render', help="出力ファイルを作り直す")
+    render_parser.add_argument('path')
+    render_parser.add_argument('--format', default=WHISPER_CONFIG['output_format'], choices=['txt', 'html', 'srt'])
+    render_parser.add_argument('--media', help="HTML出力で再生するメディア (省略時はinputディレクトリの元のファイル)")
+    render_parser.add_argument('--output-dir', default=WHISPER_CONFIG['paths']['output'])
+    render_parser.set_defaults(func=render)
+
+    import_parser = subparsers.add_parser('import', help="セグメントのJSON Linesを変換して保存")
+    import_parser.add_argument('jsonl')
+    import_parser.add_argument('--source', help="元の音声ファイル名")
+    import_parser.set_defaults(func=import_jsonl)
+
+    args = parser.parse_args()
+    configure_logging(WHISPER_CONFIG['logging']['level'])
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
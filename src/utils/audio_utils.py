@@ -0,0 +1,221 @@
+import os
+import sys
+import wave
+import hashlib
+import subprocess
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+
+# Whisperが扱うサンプリングレート
+SAMPLE_RATE = 16000
+
+def load_audio(file_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """ffmpegで音声をデコードし、モノラルfloat32のPCMとして返す"""
+    cmd = [
+        'ffmpeg', '-nostdin', '-threads', '0',
+        '-i', file_path,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+        '-'
+    ]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+class PcmCache:
+    """
+    デコード済みPCMのキャッシュ
+    16kHzモノラルfloat32のPCMを入力ファイルごとに一度だけ.npyとして保存し、以降はメモリマップで読み込む。
+    元ファイルのパスごとに保持し、更新日時とサイズが変わった場合は作り直す。
+    """
+
+    def __init__(self, cache_dir: str = '../output/.pcm'):
+        """
+        PcmCache初期化
+        Args:
+            cache_dir: キャッシュディレクトリのパス
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _prefix(self, file_path: str) -> str:
+        """元ファイルのパスごとのファイル名の接頭辞"""
+        abs_path = os.path.abspath(file_path)
+        stem = os.path.splitext(os.path.basename(abs_path))[0]
+        path_hash = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:8]
+        return f"{stem}-{path_hash}-"
+
+    def path_for(self, file_path: str) -> str:
+        """元ファイルの現在の状態(更新日時・サイズ)に対応するキャッシュファイルのパス"""
+        stat = os.stat(file_path)
+        state_hash = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f"{self._prefix(file_path)}{state_hash}.npy")
+
+    def load(self, file_path: str) -> np.ndarray:
+        """PCMをメモリマップで読み込む。キャッシュが無い場合はデコードして保存する"""
+        npy_path = self.path_for(file_path)
+        if not os.path.exists(npy_path):
+            audio = load_audio(file_path)
+            tmp_path = f"{npy_path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, audio)
+            os.replace(tmp_path, npy_path)
+            self._remove_stale(file_path, npy_path)
+        return np.load(npy_path, mmap_mode='r')
+
+    def _remove_stale(self, file_path: str, current_path: str) -> None:
+        """同じ元ファイルの古いキャッシュを削除"""
+        prefix = self._prefix(file_path)
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and name.endswith('.npy') and path != current_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+class StreamingAudioReader:
+    """
+    ffmpegのパイプからPCMを少しずつ読み込み、固定長の窓を順に返す
+    バッファは窓1つ分だけ確保して使い回すため、入力の長さに関係なくメモリ使用量は一定になる。
+    返す窓はバッファのビューなので、次の窓を読む前に使い終えること。
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        window_sec: float = 30,
+        overlap_sec: float = 2,
+        sample_rate: int = SAMPLE_RATE
+    ):
+        """
+        StreamingAudioReader初期化
+        Args:
+            file_path: 入力ファイルのパス
+            window_sec: 窓の長さ(秒)
+            overlap_sec: 前の窓との重なり(秒)
+            sample_rate: サンプリングレート
+        """
+        self.file_path = file_path
+        self.sample_rate = sample_rate
+        self.window = int(window_sec * sample_rate)
+        self.overlap = int(overlap_sec * sample_rate)
+        if not 0 <= self.overlap < self.window:
+            raise ValueError("overlap_sec must be smaller than window_sec")
+        self.buffer = np.zeros(self.window, dtype=np.float32)
+
+    def _fill(self, stream, start: int) -> int:
+        """バッファのstart以降をパイプから埋め、埋まったサンプル数を返す"""
+        raw = memoryview(self.buffer.view(np.uint8))
+        position = start * 4
+        while position < len(raw):
+            n = stream.readinto(raw[position:])
+            if not n:
+                break
+            position += n
+        return position // 4
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """(窓の開始サンプル位置, 窓のPCM) を順に返す"""
+        cmd = [
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '0',
+            '-i', self.file_path,
+            '-f', 'f32le', '-ac', '1', '-ar', str(self.sample_rate),
+            '-'
+        ]
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            offset = 0
+            filled = self._fill(process.stdout, 0)
+            while filled > 0:
+                yield offset, self.buffer[:filled]
+                if filled < self.window:
+                    break
+                # 末尾の重なり部分を先頭に移し、残りを次の入力で埋める
+                hop = self.window - self.overlap
+                self.buffer[:self.overlap] = self.buffer[hop:]
+                offset += hop
+                filled = self._fill(process.stdout, self.overlap)
+                if filled <= self.overlap:
+                    break
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+            stderr = process.stderr.read().decode(errors='ignore')
+            process.stderr.close()
+        if process.returncode not in (0, -9) and stderr:
+            raise RuntimeError(f"Failed to stream audio: {stderr}")
+
+class LiveAudioReader:
+    """
+    標準入力や名前付きパイプ(FIFO)から届いた分だけPCMを返す
+    入力はffmpegでデコードするため、生のPCMでもmp3などのエンコード済みの形式でもよい。
+    recorderを指定した場合は受け取ったPCMを16bitのwavとして順に書き出す (HTML出力の再生用)。
+    """
+
+    def __init__(
+        self,
+        source: str = '-',
+        input_format: Optional[str] = None,
+        input_args: Optional[List[str]] = None,
+        chunk_sec: float = 0.5,
+        sample_rate: int = SAMPLE_RATE,
+        recorder: Optional[wave.Wave_write] = None
+    ):
+        """
+        LiveAudioReader初期化
+        Args:
+            source: 入力元 ('-'の場合は標準入力、それ以外は名前付きパイプなどのパス)
+            input_format: ffmpegの入力フォーマット (例: 's16le'。Noneの場合は自動判別)
+            input_args: 入力フォーマットの追加引数 (例: ['-ar', '44100', '-ac', '2'])
+            chunk_sec: 1回に返すPCMの長さの目安(秒)
+            sample_rate: サンプリングレート
+            recorder: 受け取ったPCMを書き出すwav (Noneの場合は書き出さない)
+        """
+        self.source = source
+        self.input_format = input_format
+        self.input_args = input_args or []
+        self.chunk_bytes = int(chunk_sec * sample_rate) * 4
+        self.sample_rate = sample_rate
+        self.recorder = recorder
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        """届いたPCMをchunk_sec程度ずつ返す (入力が終わると最後の端数を返して終了)"""
+        cmd = ['ffmpeg', '-loglevel', 'error']
+        if self.source != '-':
+            cmd += ['-nostdin']
+        # 入力の解析やバッファリングで待たされないようにする
+        cmd += ['-fflags', 'nobuffer', '-probesize', '32768']
+        if self.input_format:
+            cmd += ['-f', self.input_format] + self.input_args
+        cmd += ['-i', 'pipe:0' if self.source == '-' else self.source]
+        cmd += ['-f', 'f32le', '-ac', '1', '-ar', str(self.sample_rate), '-flush_packets', '1', '-']
+        stdin = sys.stdin.buffer if self.source == '-' else subprocess.DEVNULL
+        process = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            fd = process.stdout.fileno()
+            pending = bytearray()
+            while True:
+                # 届いている分だけ読み込む (readと違い指定サイズまで待たない)
+                data = os.read(fd, self.chunk_bytes)
+                if data:
+                    pending += data
+                if len(pending) >= self.chunk_bytes or (not data and len(pending) >= 4):
+                    # サンプルの途中で切れた端数は次に回す
+                    size = len(pending) - len(pending) % 4
+                    chunk = np.frombuffer(bytes(pending[:size]), dtype=np.float32)
+                    del pending[:size]
+                    if self.recorder:
+                        self.recorder.writeframes((np.clip(chunk, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+                    yield chunk
+                if not data:
+                    break
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+            stderr = process.stderr.read().decode(errors='ignore')
+            process.stderr.close()
+        if process.returncode not in (0, -9) and stderr:
+            raise RuntimeError(f"Failed to read live audio: {stderr}")
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple, Type, Union
+import numpy as np
+from utils.moviepy_utils import get_media_duration, convert_audio_file, prepare_input
+from utils.metrics_utils import get_metrics
+from utils.word_utils import json_default
+from utils.log_utils import configure_logging, current_level
+
+logger = logging.getLogger(__name__)
+
+# ワーカープロセスごとに保持するプロセッサ(モデルはロード済み)
+_worker_processor = None
+
+def _init_worker(
+    processor_class: Type,
+    processor_kwargs: Dict,
+    model_name: str,
+    model_kwargs: Dict,
+    log_level: int = logging.INFO,
+    metrics_settings: Optional[Dict] = None
+) -> None:
+    """ワーカープロセスの初期化。プロセスごとに一度だけモデルをロードする"""
+    global _worker_processor
+    # spawnしたプロセスは親の設定を引き継がないため、ログと計測の設定を渡し直す
+    configure_logging(log_level)
+    if metrics_settings:
+        get_metrics().configure(**metrics_settings)
+    _worker_processor = processor_class(**processor_kwargs)
+    _worker_processor.set_model(model_name, **model_kwargs)
+
+def _process_in_worker(file_path: str, media_path: Optional[str] = None, source_path: Optional[str] = None) -> Tuple[str, bool]:
+    """ワーカープロセスでの1ファイル処理"""
+    return file_path, _worker_processor.process_audio_file(file_path, media_path, source_path)
+
+def process_input_in_worker(audio_path: str, work_dir: str) -> Tuple[str, bool]:
+    """ワーカープロセスでの入力ファイルの変換と処理 (音声の抽出・再生用メディアの用意も含む)"""
+    # 変換の時間も同じファイルの記録に含める
+    with get_metrics().file(audio_path):
+        prepared = prepare_input(audio_path, work_dir, _worker_processor.output_format == 'html')
+        if prepared is None:
+            return audio_path, False
+        current_path, media_path = prepared
+        return audio_path, _worker_processor.process_audio_file(current_path, media_path, audio_path)
+
+def transcribe_file_in_worker(
+    audio_path: str,
+    work_dir: str,
+    segments_path: str,
+    language: Optional[str] = None
+) -> int:
+    """
+    ワーカープロセスでの入力ファイルの文字起こし
+    セグメントはJSON Linesとしてsegments_pathへ1件ずつ書き出すため、処理中でも別のプロセスから読み出せる。
+    Returns:
+        セグメント数
+    """
+    if language:
+        _worker_processor.language = language
+    metrics = get_metrics()
+    with metrics.file(audio_path, backend=_worker_processor.backend, model=_worker_processor.model_name) as record:
+        count = 0
+        try:
+            # 変換できない場合もエラーを記録してジョブの失敗として呼び出し元へ伝える
+            current_path = convert_audio_file(audio_path, work_dir)
+            with open(segments_path, 'w', encoding='utf-8') as f:
+                for segment in _worker_processor.transcribe_file(current_path):
+                    with metrics.stage('write'):
+                        f.write(json.dumps(segment, ensure_ascii=False, default=json_default) + '\n')
+                        f.flush()
+                    count += 1
+        except Exception as e:
+            if record is not None:
+                record['error'] = str(e)
+            raise
+    return count
+
+def transcribe_in_worker(audio: Union[str, np.ndarray], options: Dict) -> List[Dict]:
+    """ワーカープロセスでの文字起こし (出力ファイルは作成しない)"""
+    return list(_worker_processor.transcribe(audio, options))
+
+def create_worker_pool(
+    processor_class: Type,
+    processor_kwargs: Dict,
+    model_name: str,
+    model_kwargs: Dict,
+    workers: int
+) -> ProcessPoolExecutor:
+    """各ワーカープロセスがモデルをロード済みのプロセスプールを作成"""
+    # ワーカー数に応じてスレッド数を分け合い、CPUの取り合いを防ぐ
+    model_kwargs = dict(model_kwargs)
+    if not model_kwargs.get('cpu_threads'):
+        model_kwargs['cpu_threads'] = max(1, (os.cpu_count() or 1) // workers)
+    # fork後のtorch/CTranslate2のスレッドプールはデッドロックしうるためspawnを使う
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(processor_class, processor_kwargs, model_name, model_kwargs, current_level(), get_metrics().settings())
+    )
+
+def _ping() -> int:
+    return os.getpid()
+
+def warm_up(executor: ProcessPoolExecutor, workers: int) -> None:
+    """
+    ワーカープロセスを起動してモデルのロードまで済ませる
+    ProcessPoolExecutorはジョブを投入するまでプロセスを起動しないため、最初のジョブがロードを待たないようにする
+    """
+    for future in [executor.submit(_ping) for _ in range(workers)]:
+        future.result()
+
+def schedule_by_duration(file_paths: List[str]) -> List[Tuple[str, float]]:
+    """
+    メディアの長さが長い順に並べ替え
+    長いファイルを先に投入することで、最後に長いファイルだけが残って待たされるのを防ぐ
+    """
+    durations = [(path, get_media_duration(path)) for path in file_paths]
+    return sorted(durations, key=lambda item: item[1], reverse=True)
+
+def run_batch(
+    processor_class: Type,
+    processor_kwargs: Dict,
+    model_name: str,
+    model_kwargs: Dict,
+    file_paths: List[str],
+    workers: int,
+    media_paths: Optional[Dict[str, str]] = None,
+    source_paths: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    複数ワーカープロセスでのバッチ処理
+    Args:
+        processor_class: プロセッサクラス (WhisperProcessor or FasterWhisperProcessor)
+        processor_kwargs: プロセッサの初期化引数
+        model_name: モデル名
+        model_kwargs: set_modelに渡す追加引数
+        file_paths: 処理対象ファイルのパス
+        workers: ワーカープロセス数
+        media_paths: 音声ファイルのパスからHTML出力で再生するメディアのパスへの対応
+        source_paths: 音声ファイルのパスから変換前の入力ファイルのパスへの対応
+    Returns:
+        処理結果の集計 (files, succeeded, audio_seconds, wall_seconds, throughput)
+    """
+    scheduled = schedule_by_duration(file_paths)
+    durations = dict(scheduled)
+    workers = max(1, min(workers, len(scheduled) or 1))
+
+    logger.info(f"Batch: {len(scheduled)} files, {workers} workers")
+    succeeded = 0
+    audio_seconds = 0.0
+    start_time = time.perf_counter()
+    with create_worker_pool(processor_class, processor_kwargs, model_name, model_kwargs, workers) as executor:
+        media_paths = media_paths or {}
+        source_paths = source_paths or {}
+        futures = [
+            executor.submit(_process_in_worker, path, media_paths.get(path), source_paths.get(path))
+            for path, _ in scheduled
+        ]
+        for future in as_completed(futures):
+            try:
+                file_path, ok = future.result()
+            except Exception as e:
+                logger.error(f"Worker error: {str(e)}")
+                continue
+            if ok:
+                succeeded += 1
+                audio_seconds += durations[file_path]
+    wall_seconds = time.perf_counter() - start_time
+
+    throughput = audio_seconds / wall_seconds if wall_seconds > 0 else 0.0
+    logger.info(f"Batch complete: {succeeded}/{len(scheduled)} files")
+    logger.info(f"Audio: {audio_seconds:.1f}s / Wall: {wall_seconds:.1f}s / Throughput: {throughput:.2f} audio-s/s")
+    return {
+        'files': len(scheduled),
+        'succeeded': succeeded,
+        'audio_seconds': audio_seconds,
+        'wall_seconds': wall_seconds,
+        'throughput': throughput,
+    }
@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import time
+import wave
+import platform
+import importlib
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from utils.audio_utils import load_audio, SAMPLE_RATE
+from utils.memory_utils import current_rss_bytes, peak_rss_bytes
+from utils.score_utils import character_errors
+
+# バックエンド名 → (モジュール, プロセッサクラス)。インストールされていないバックエンドもあるため遅延インポートする
+BACKENDS = {
+    'whisper': ('utils.whisper_utils', 'WhisperProcessor'),
+    'faster-whisper': ('utils.faster_whisper_utils', 'FasterWhisperProcessor'),
+}
+
+# 回帰とみなす閾値 (cerは差分、それ以外は増加率)
+REGRESSION_THRESHOLDS = {
+    'rtf': 0.10,
+    'cold_seconds': 0.20,
+    'peak_rss_bytes': 0.10,
+    'cer': 0.01,
+}
+
+# デコード方法 → 処理し直した割合を記録するプロセッサの設定名
+REFINE_NAMES = {
+    'adaptive': 'adaptive_beam',
+    'cascade': 'cascade',
+}
+
+# モデルの大きさの順 (カスケードの下書きが仕上げのモデルより小さい組み合わせだけを計測する)
+MODEL_ORDER = ['tiny', 'base', 'small', 'medium', 'large', 'turbo']
+
+def _model_rank(model: str) -> int:
+    """モデルの大きさの順位 ('large-v3'などは'large'として扱う。不明な場合は-1)"""
+    name = model.split('.')[0].split('-')[0]
+    return MODEL_ORDER.index(name) if name in MODEL_ORDER else -1
+
+def expand_matrix(
+    backends: List[str],
+    models: List[str],
+    compute_types: List[str],
+    beam_sizes: List[int],
+    device: str = 'cpu',
+    language: str = 'ja',
+    decodings: Optional[List[str]] = None,
+    draft_model: Optional[str] = None
+) -> List[Dict]:
+    """
+    バックエンド × モデル × 計算精度 × ビーム幅 × デコード方法 の組み合わせを展開
+    デコード方法 'adaptive' (貪欲法の後に信頼度の低い区間だけをビームサーチ) はfaster-whisperのビーム幅2以上のみ
+    デコード方法 'cascade' (draft_modelで下書きし、信頼度の低い区間だけをモデルで処理し直す) はfaster-whisperで
+    draft_modelより大きいモデルのみ
+    """
+    cases = []
+    for backend, model, compute_type, beam_size, decoding in itertools.product(
+        backends, models, compute_types, beam_sizes, decodings or ['fixed']
+    ):
+        # openai-whisperは計算精度を指定できないため1通りだけ実行する
+        if backend == 'whisper':
+            compute_type = None
+        if decoding == 'adaptive' and (backend != 'faster-whisper' or beam_size <= 1):
+            continue
+        if decoding == 'cascade' and (
+            backend != 'faster-whisper' or not draft_model or _model_rank(draft_model) >= _model_rank(model)
+        ):
+            continue
+        case = {
+            'backend': backend,
+            'model': model,
+            'compute_type': compute_type,
+            'beam_size': beam_size,
+            'device': device,
+            'language': language,
+        }
+        if decoding != 'fixed':
+            # 既存の結果とキーを揃えるため、fixedの場合は項目を持たない
+            case['decoding'] = decoding
+        if decoding == 'cascade':
+            case['draft_model'] = draft_model
+        if case not in cases:
+            cases.append(case)
+    return cases
+
+def case_key(case: Dict) -> str:
+    """結果を突き合わせるためのキー"""
+    key = f"{case['backend']}/{case['model']}/{case['compute_type']}/beam{case['beam_size']}/{case['device']}"
+    if case.get('decoding'):
+        key += f"/{case['decoding']}"
+    if case.get('draft_model'):
+        key += f"-{case['draft_model']}"
+    return key
+
+def write_wav(path: str, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> None:
+    """float32のPCMを16bitのwavとして保存"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+def make_long_fixture(inputs: List[Dict], duration_sec: float, work_dir: str, gap_sec: float = 1.0) -> Dict:
+    """
+    サンプル音声を無音を挟んで繰り返し連結した長時間音声を作成
+    参照テキストも同じ順に連結する
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"long_fixture_{int(duration_sec)}s.wav")
+    gap = np.zeros(int(gap_sec * SAMPLE_RATE), dtype=np.float32)
+    pieces = [(load_audio(item['path']), item['reference']) for item in inputs]
+    audio_parts = []
+    references = []
+    total = 0
+    while total < duration_sec * SAMPLE_RATE and pieces:
+        for audio, reference in pieces:
+            audio_parts += [audio, gap]
+            references.append(reference)
+            total += len(audio) + len(gap)
+    if not os.path.exists(path):
+        write_wav(path, np.concatenate(audio_parts) if audio_parts else gap)
+    return {'name': os.path.basename(path), 'path': path, 'reference': ''.join(references)}
+
+def load_inputs(data_dir: str, references_file: str) -> List[Dict]:
+    """参照テキストのあるサンプル音声の一覧"""
+    with open(references_file, 'r', encoding='utf-8') as f:
+        references = json.load(f)
+    return [
+        {'name': name, 'path': os.path.join(data_dir, name), 'reference': reference}
+        for name, reference in sorted(references.items())
+        if os.path.exists(os.path.join(data_dir, name))
+    ]
+
+def _measure_batched(processor, clips: List[np.ndarray], options: Dict, batch_size: int, repeats: int) -> Dict:
+    """短い音声をまとめてバッチ推論した場合の処理時間"""
+    runs = []
+    # 1回目はパイプラインの初期化を含むため除く
+    for _ in range(repeats + 1):
+        start_time = time.perf_counter()
+        processor.transcribe_clips(clips, options, batch_size)
+        runs.append(time.perf_counter() - start_time)
+    return {'batch_size': batch_size, 'seconds': min(runs[1:] or runs)}
+
+def _escalated_ratio(processor, name: str) -> Optional[float]:
+    """二段階の処理で処理し直した音声の割合 (使っていない場合はNone)"""
+    totals = getattr(processor, 'refine_totals', {}).get(name)
+    if not totals or not totals['audio_seconds']:
+        return None
+    return totals['escalated_seconds'] / totals['audio_seconds']
+
+def _run_case(
+    case: Dict,
+    inputs: List[Dict],
+    repeats: int,
+    output_dir: str,
+    batch_size: int = 0,
+    adaptive_beam: Optional[Dict] = None,
+    cascade: Optional[Dict] = None
+) -> Dict:
+    """1ケースの計測 (ケースごとに新しいプロセスで実行し、ロード時間とメモリを独立に計測する)"""
+    module_name, class_name = BACKENDS[case['backend']]
+    processor_class = getattr(importlib.import_module(module_name), class_name)
+    processor_kwargs = dict(output_dir=output_dir, language=case['language'])
+    if case.get('decoding') == 'adaptive':
+        processor_kwargs['adaptive_beam'] = dict(adaptive_beam or {}, beam_size=case['beam_size'])
+    elif case.get('decoding') == 'cascade':
+        processor_kwargs['cascade'] = dict(cascade or {}, draft_model=case['draft_model'])
+    processor = processor_class(**processor_kwargs)
+
+    rss_before = current_rss_bytes()
+    start_time = time.perf_counter()
+    processor.set_model(case['model'], device=case['device'], compute_type=case['compute_type'] or 'int8')
+    load_seconds = time.perf_counter() - start_time
+    model_rss_bytes = current_rss_bytes() - rss_before
+
+    options = processor.transcribe_options()
+    if case.get('decoding') != 'adaptive':
+        # カスケードは下書きと処理し直しの両方を同じビーム幅で処理する
+        options['beam_size'] = case['beam_size']
+
+    items = []
+    clips = []
+    for item in inputs:
+        start_time = time.perf_counter()
+        audio = load_audio(item['path'])
+        decode_seconds = time.perf_counter() - start_time
+        audio_seconds = len(audio) / SAMPLE_RATE
+        if audio_seconds <= 30:
+            clips.append(audio)
+
+        # 1回目はモデルの初期化などを含むコールド、2回目以降をウォームとして計測
+        start_time = time.perf_counter()
+        text = ''.join(segment['text'] for segment in processor.transcribe(audio, options))
+        first_seconds = time.perf_counter() - start_time
+        warm_runs = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            for _segment in processor.transcribe(audio, options):
+                pass
+            warm_runs.append(time.perf_counter() - start_time)
+        errors, total = character_errors(item['reference'], text)
+        items.append({
+            'name': item['name'],
+            'audio_seconds': audio_seconds,
+            'decode_seconds': decode_seconds,
+            'first_seconds': first_seconds,
+            'warm_seconds': min(warm_runs) if warm_runs else first_seconds,
+            'errors': errors,
+            'reference_chars': total,
+            'text': text,
+        })
+
+    batched = None
+    if batch_size and len(clips) > 1 and hasattr(processor, 'transcribe_clips'):
+        # 30秒以下の入力を1つずつ処理した場合とまとめてバッチ推論した場合の比較
+        clip_audio_seconds = sum(len(audio) for audio in clips) / SAMPLE_RATE
+        sequential_seconds = sum(item['warm_seconds'] for item in items if item['audio_seconds'] <= 30)
+        batched = _measure_batched(processor, clips, options, batch_size, repeats)
+        batched.update({
+            'clips': len(clips),
+            'audio_seconds': clip_audio_seconds,
+            'sequential_seconds': sequential_seconds,
+            'sequential_throughput': clip_audio_seconds / sequential_seconds if sequential_seconds else 0.0,
+            'throughput': clip_audio_seconds / batched['seconds'] if batched['seconds'] else 0.0,
+            'speedup': sequential_seconds / batched['seconds'] if batched['seconds'] else 0.0,
+        })
+
+    audio_seconds = sum(item['audio_seconds'] for item in items)
+    warm_seconds = sum(item['warm_seconds'] for item in items)
+    errors = sum(item['errors'] for item in items)
+    total = sum(item['reference_chars'] for item in items)
+    return {
+        **case,
+        'key': case_key(case),
+        'load_seconds': load_seconds,
+        'cold_seconds': load_seconds + (items[0]['first_seconds'] if items else 0.0),
+        'decode_seconds': sum(item['decode_seconds'] for item in items),
+        'warm_seconds': warm_seconds,
+        'audio_seconds': audio_seconds,
+        'rtf': warm_seconds / audio_seconds if audio_seconds else 0.0,
+        'cer': errors / total if total else 0.0,
+        'model_rss_bytes': model_rss_bytes,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'batched': batched,
+        # 適応ビーム・カスケードで処理し直した音声の割合 (ウォーム計測を含む全実行の合計)
+        'escalated_ratio': _escalated_ratio(processor, REFINE_NAMES.get(case.get('decoding'), '')),
+        'inputs': items,
+    }
+
+def run_benchmark(
+    cases: List[Dict],
+    inputs: List[Dict],
+    repeats: int = 1,
+    output_dir: str = '../output/benchmark',
+    batch_size: int = 0,
+    adaptive_beam: Optional[Dict] = None,
+    cascade: Optional[Dict] = None
+) -> Dict:
+    """
+    全ケースを順に計測し、結果をまとめて返す
+    batch_sizeを指定した場合は、短い入力をまとめてバッチ推論したスループットも計測する (faster-whisperのみ)
+    adaptive_beam・cascadeはそれぞれのケースで使う閾値
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for case in cases:
+        key = case_key(case)
+        print(f"Benchmark: {key}")
+        # ケースごとに新しいプロセスを使い、ロード済みモデルやピークメモリを持ち越さない
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            try:
+                result = executor.submit(
+                    _run_case, case, inputs, repeats, output_dir, batch_size, adaptive_beam, cascade
+                ).result()
+            except Exception as e:
+                print(f"Benchmark error: {key}: {str(e)}")
+                results.append({**case, 'key': key, 'error': str(e)})
+                continue
+        print(f"  load {result['load_seconds']:.2f}s  cold {result['cold_seconds']:.2f}s  "
+              f"RTF {result['rtf']:.3f}  CER {result['cer'] * 100:.2f}%  "
+              f"peak {result['peak_rss_bytes'] / 1024 / 1024:.0f} MB")
+        if result['batched']:
+            batched = result['batched']
+            print(f"  batched {batched['clips']} clips (batch size {batched['batch_size']}): "
+                  f"{batched['sequential_throughput']:.2f} -> {batched['throughput']:.2f} audio-s/s (x{batched['speedup']:.2f})")
+        if result['escalated_ratio'] is not None:
+            if case.get('decoding') == 'cascade':
+                print(f"  cascade: {result['escalated_ratio'] * 100:.1f}% of audio re-decoded with {case['model']}")
+            else:
+                print(f"  adaptive: {result['escalated_ratio'] * 100:.1f}% of audio re-decoded with beam {case['beam_size']}")
+        results.append(result)
+    # 適応ビーム・カスケードと、同じモデル・ビーム幅で全体を処理した場合との速度と精度の比較
+    completed = {result['key']: result for result in results if 'error' not in result}
+    for result in completed.values():
+        if result.get('decoding') not in REFINE_NAMES:
+            continue
+        fixed = completed.get(case_key({
+            key: value for key, value in result.items() if key not in ('decoding', 'draft_model')
+        }))
+        if not fixed:
+            continue
+        if result['decoding'] == 'cascade':
+            label = f"Cascade {result['draft_model']} -> {result['model']} vs {result['model']} only"
+        else:
+            label = f"Adaptive vs fixed beam {result['beam_size']}"
+        print(f"{label} ({result['model']}/{result['compute_type']}/beam{result['beam_size']}): "
+              f"RTF {fixed['rtf']:.3f} -> {result['rtf']:.3f} (x{fixed['rtf'] / result['rtf'] if result['rtf'] else 0.0:.2f}), "
+              f"CER {fixed['cer'] * 100:.2f}% -> {result['cer'] * 100:.2f}%")
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'repeats': repeats,
+            'batch_size': batch_size,
+            'adaptive_beam': adaptive_beam,
+            'cascade': cascade,
+            'inputs': [{'name': item['name']} for item in inputs],
+        },
+        'results': results,
+    }
+
+def compare_results(baseline: Dict, current: Dict, thresholds: Optional[Dict] = None) -> List[Dict]:
+    """ベースラインと比較して閾値を超えて悪化した指標を返す"""
+    thresholds = thresholds or REGRESSION_THRESHOLDS
+    baseline_results = {result['key']: result for result in baseline['results'] if 'error' not in result}
+    regressions = []
+    for result in current['results']:
+        base = baseline_results.get(result['key'])
+        if base is None:
+            continue
+        if 'error' in result:
+            regressions.append({'key': result['key'], 'metric': 'error', 'baseline': None, 'current': result['error']})
+            continue
+        for metric, threshold in thresholds.items():
+            before, after = base.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            if metric == 'cer':
+                regressed = after - before > threshold
+            else:
+                regressed = before > 0 and (after - before) / before > threshold
+            if regressed:
+                regressions.append({'key': result['key'], 'metric': metric, 'baseline': before, 'current': after})
+    return regressions
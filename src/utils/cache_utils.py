@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+from utils.word_utils import json_default
+
+class TranscriptionCache:
+    """
+    文字起こし結果のディスクキャッシュ
+    音声ファイルの内容のハッシュとモデル・パラメータからキーを作り、セグメントをJSON Linesで保存する。
+    サイズ上限を超えた場合は最終利用日時(mtime)の古いものから削除する(LRU)。
+    """
+    SUFFIX = '.jsonl'
+
+    def __init__(self, cache_dir: str = '../cache', max_size_mb: float = 1024):
+        """
+        TranscriptionCache初期化
+        Args:
+            cache_dir: キャッシュディレクトリのパス
+            max_size_mb: キャッシュの最大サイズ(MB)
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """ファイル内容のSHA-256ハッシュ"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, file_path: str, params: Dict) -> str:
+        """音声ハッシュと文字起こしパラメータからキャッシュキーを生成"""
+        digest = hashlib.sha256()
+        digest.update(self.file_hash(file_path).encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """キャッシュからセグメントを取得。ヒットしない場合はNone"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                f.readline()  # メタ情報
+                segments = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return None
+        # LRUのため最終利用日時を更新
+        os.utime(path)
+        return segments
+
+    def put(self, key: str, segments: Iterable[Dict], source: str = '', params: Optional[Dict] = None) -> None:
+        """セグメントをキャッシュに保存"""
+        for _ in self.tee(key, segments, source, params):
+            pass
+
+    def tee(self, key: str, segments: Iterable[Dict], source: str = '', params: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        セグメントをそのまま返しながらキャッシュに書き込む
+        最後まで読み切った場合のみエントリを確定し、途中で中断された場合は破棄する
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        meta = {'source': os.path.basename(source), 'params': params or {}, 'created': time.time()}
+        completed = False
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'meta': meta}, ensure_ascii=False) + '\n')
+                for segment in segments:
+                    f.write(json.dumps(segment, ensure_ascii=False, default=json_default) + '\n')
+                    yield segment
+            completed = True
+        finally:
+            if completed:
+                os.replace(tmp_path, path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def entries(self) -> List[Dict]:
+        """キャッシュエントリ一覧 (最終利用日時の新しい順)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                with open(path, 'r', encoding='utf-8') as f:
+                    meta = json.loads(f.readline()).get('meta', {})
+            except (OSError, ValueError):
+                continue
+            entries.append({
+                'key': name[:-len(self.SUFFIX)],
+                'size': stat.st_size,
+                'last_used': stat.st_mtime,
+                'source': meta.get('source', ''),
+                'params': meta.get('params', {}),
+            })
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def total_size(self) -> int:
+        """キャッシュの合計サイズ(バイト)"""
+        return sum(entry['size'] for entry in self.entries())
+
+    def evict(self, max_size_bytes: Optional[int] = None) -> List[str]:
+        """サイズ上限を超えた分を古いものから削除し、削除したキーを返す"""
+        limit = self.max_size_bytes if max_size_bytes is None else max_size_bytes
+        entries = self.entries()
+        total = sum(entry['size'] for entry in entries)
+        removed = []
+        while entries and total > limit:
+            entry = entries.pop()
+            try:
+                os.remove(self._path(entry['key']))
+            except OSError:
+                continue
+            total -= entry['size']
+            removed.append(entry['key'])
+        return removed
+
+    def clear(self) -> int:
+        """キャッシュを全削除し、削除件数を返す"""
+        return len(self.evict(0))
@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from utils.audio_utils import SAMPLE_RATE
+from utils.chunk_utils import Window, stitch_window_segments
+
+def is_weak(segment, thresholds: Dict) -> bool:
+    """
+    セグメントの信頼度が閾値を外れているかどうか
+    平均対数確率が低い・圧縮率が高い(繰り返し)・無音の確率が高い(幻聴)のいずれかに当たるものを弱いとみなす
+    Args:
+        segment: faster-whisperのセグメント (avg_logprob, compression_ratio, no_speech_probを持つ)
+        thresholds: 閾値 (avg_logprob, compression_ratio, no_speech_prob)
+    """
+    return (
+        segment.avg_logprob < thresholds['avg_logprob']
+        or segment.compression_ratio > thresholds['compression_ratio']
+        or segment.no_speech_prob > thresholds['no_speech_prob']
+    )
+
+def plan_regions(
+    weak: List[Dict],
+    total_samples: int,
+    merge_gap_sec: float = 2.0,
+    padding_sec: float = 1.0,
+    sample_rate: int = SAMPLE_RATE
+) -> List[Window]:
+    """
+    弱いセグメントから遅い設定(大きいモデル・ビームサーチ)で処理し直す区間を作る
+    間隔がmerge_gap_sec以下の区間は1つにまとめ、前後にpadding_secの文脈を付けて切り出す。
+    担当区間はセグメントの範囲そのままとし、重なり部分の結果はstitch_window_segmentsで捨てる。
+    Args:
+        weak: 弱いセグメント (開始時刻順)
+        total_samples: 音声全体のサンプル数
+        merge_gap_sec: まとめる区間の間隔の上限(秒)
+        padding_sec: 前後に付ける文脈(秒)
+    """
+    spans = []
+    for segment in weak:
+        if spans and segment['start'] - spans[-1][1] <= merge_gap_sec:
+            spans[-1][1] = max(spans[-1][1], segment['end'])
+        else:
+            spans.append([segment['start'], segment['end']])
+    padding = int(padding_sec * sample_rate)
+    return [
+        (
+            max(0, int(start * sample_rate) - padding),
+            min(total_samples, int(end * sample_rate) + padding),
+            start,
+            end,
+        )
+        for start, end in spans
+    ]
+
+def merge_cascade(draft: Iterable[Dict], regions: List[Window], results: List[List[Dict]]) -> Iterator[Dict]:
+    """
+    下書きの結果と処理し直した区間の結果を1つの時系列にまとめる
+    中心が処理し直した区間にある下書きのセグメントを、その区間の結果で置き換える
+    Args:
+        draft: 下書きのセグメント (開始時刻順)
+        regions: 処理し直した区間 (開始時刻順)
+        results: 区間ごとの結果 (区間の先頭からの時刻)
+    """
+    replaced = [list(stitch_window_segments(region, segments)) for region, segments in zip(regions, results)]
+    position = 0
+    for segment in draft:
+        middle = (segment['start'] + segment['end']) / 2
+        # この区間より前に終わる区間の結果を先に出す
+        while position < len(regions) and regions[position][3] <= middle:
+            yield from replaced[position]
+            position += 1
+        if position < len(regions) and regions[position][2] <= middle:
+            continue
+        yield segment
+    for segments in replaced[position:]:
+        yield from segments
+
+def estimate_speedup(duration: float, escalated_seconds: float, first_seconds: float, second_seconds: float) -> Optional[float]:
+    """
+    遅い設定だけで全体を処理した場合と比べた速度の推定
+    処理し直した区間の速度を全体の長さに換算して比べる (処理し直した区間が無い場合はNone)
+    """
+    elapsed = first_seconds + second_seconds
+    if not escalated_seconds or elapsed <= 0:
+        return None
+    return second_seconds / escalated_seconds * duration / elapsed
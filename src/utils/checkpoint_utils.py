@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from utils.word_utils import WordTimings
+
+logger = logging.getLogger(__name__)
+
+def _encode(value: Any) -> Any:
+    """
+    json.dumpsのdefault
+    再開した結果が最初から処理した結果と一致するよう、単語の確率も丸めずに保存する (float16は倍精度で正確に表せる)
+    """
+    if isinstance(value, WordTimings):
+        data = value.to_json()
+        if value.probabilities is not None:
+            data['probability'] = value.probabilities.tolist()
+        return data
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def decode_segment(segment: Dict) -> Dict:
+    """保存したセグメントの単語のタイムスタンプをWordTimingsに戻す"""
+    if segment.get('words') is not None:
+        segment['words'] = WordTimings.coerce(segment['words'])
+    return segment
+
+class Checkpoint:
+    """
+    1ファイル分の文字起こしのチェックポイント
+    窓の順に確定したセグメントと、次の窓から続けるための状態を JSON Lines に追記する。
+    最後の行は書き込み途中で中断されている場合があるため、読めない行以降は無視する。
+    """
+
+    def __init__(self, path: str, meta: Dict, interval_sec: float = 60):
+        """
+        Checkpoint初期化
+        Args:
+            path: チェックポイントファイルのパス
+            meta: 元の音声ファイル名・パラメータ (先頭行に保存し、読み込み時に一致を確認する)
+            interval_sec: 追記する間隔(秒)。窓が終わるたびではなく、前回の追記からこの時間が経った窓の後に追記する
+        """
+        self.path = path
+        self.meta = meta
+        self.interval_sec = interval_sec
+        self._segments = []
+        self._last_write = time.monotonic()
+
+    def load(self) -> Optional[Dict]:
+        """
+        保存された状態を読み込む (無い場合やパラメータが異なる場合はNone)
+        Returns:
+            window: 最後に完了した窓の番号, state: 次の窓に引き継ぐ状態, segments: 完了した窓のセグメント
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        try:
+            if json.loads(lines[0])['meta']['params'] != self.meta['params']:
+                return None
+        except (IndexError, KeyError, ValueError):
+            return None
+        resumed = None
+        segments = []
+        valid = 1
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            segments += [decode_segment(segment) for segment in record['segments']]
+            resumed = {'window': record['window'], 'state': record['state'], 'segments': segments}
+            valid += 1
+        if valid < len(lines):
+            # 書き込み途中の行を除いておく (続けて追記した行が読めなくならないように)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:valid])
+        return resumed
+
+    def add(self, window: int, segments: List[Dict], state: Optional[Dict] = None, force: bool = False) -> None:
+        """
+        完了した窓のセグメントを記録する
+        前回の追記からinterval_secが経った場合かforceの場合にファイルへ追記する
+        Args:
+            window: 完了した窓の番号
+            segments: その窓で確定したセグメント
+            state: 次の窓に引き継ぐ状態 (JSONに変換できること)
+            force: 間隔に関係なく追記する
+        """
+        self._segments += segments
+        if not force and time.monotonic() - self._last_write < self.interval_sec:
+            return
+        record = json.dumps(
+            {'window': window, 'state': state, 'segments': self._segments}, ensure_ascii=False, default=_encode
+        )
+        exists = os.path.exists(self.path)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if not exists:
+                f.write(json.dumps({'meta': self.meta}, ensure_ascii=False) + '\n')
+            f.write(record + '\n')
+            f.flush()
+            # コンテナの再起動などでも残るようディスクまで書き出す
+            os.fsync(f.fileno())
+        self._segments = []
+        self._last_write = time.monotonic()
+
+    def remove(self) -> None:
+        """完了したファイルのチェックポイントを削除"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class CheckpointStore:
+    """
+    チェックポイントの保存先
+    元ファイルのパス・更新日時・サイズと文字起こしのパラメータごとに1ファイルを保存する。
+    元ファイルが変わった場合は別のキーになり、古いチェックポイントは使われない。
+    """
+    SUFFIX = '.ckpt.jsonl'
+
+    def __init__(self, checkpoint_dir: str = '../output/.checkpoints', interval_sec: float = 60):
+        """
+        CheckpointStore初期化
+        Args:
+            checkpoint_dir: 保存先ディレクトリのパス
+            interval_sec: 追記する間隔(秒)
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.interval_sec = interval_sec
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def open(self, file_path: str, params: Dict) -> Checkpoint:
+        """音声ファイルとパラメータに対応するチェックポイント"""
+        abs_path = os.path.abspath(file_path)
+        stat = os.stat(abs_path)
+        digest = hashlib.sha256()
+        digest.update(f"{abs_path}:{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        stem = os.path.splitext(os.path.basename(abs_path))[0]
+        path = os.path.join(self.checkpoint_dir, f"{stem}-{digest.hexdigest()[:16]}{self.SUFFIX}")
+        meta = {'source': os.path.basename(abs_path), 'params': json.loads(json.dumps(params))}
+        return Checkpoint(path, meta, self.interval_sec)
+
+    def entries(self) -> List[str]:
+        """保存されているチェックポイントのパス (名前順)"""
+        return sorted(
+            os.path.join(self.checkpoint_dir, name)
+            for name in os.listdir(self.checkpoint_dir) if name.endswith(self.SUFFIX)
+        )
@@ -0,0 +1,70 @@
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from utils.audio_utils import SAMPLE_RATE
+from utils.word_utils import shift_segment
+
+# (開始サンプル, 終了サンプル, 担当区間の開始秒, 担当区間の終了秒)
+Window = Tuple[int, int, float, float]
+
+def find_quietest_point(audio: np.ndarray, start: int, end: int, frame_size: int = 480) -> int:
+    """start〜endの範囲で最もエネルギーの小さいフレームの中央位置(サンプル)を返す"""
+    start = max(0, start)
+    end = min(len(audio), end)
+    n_frames = (end - start) // frame_size
+    if n_frames <= 0:
+        return end
+    frames = np.asarray(audio[start:start + n_frames * frame_size]).reshape(n_frames, frame_size)
+    energy = np.square(frames, dtype=np.float32).mean(axis=1)
+    return start + int(np.argmin(energy)) * frame_size + frame_size // 2
+
+def plan_windows(
+    audio: np.ndarray,
+    window_sec: float = 600,
+    overlap_sec: float = 5,
+    search_sec: float = 10,
+    sample_rate: int = SAMPLE_RATE
+) -> List[Window]:
+    """
+    長い音声を重なりのある窓に分割
+    区切りは予定位置の手前search_sec秒の中で最も静かな位置に寄せ、
+    各窓は前後にoverlap_sec秒の重なりを持つ。
+    担当区間(重なりを除いた区間)は隙間なく全体を覆う。
+    """
+    if window_sec <= search_sec:
+        raise ValueError("search_sec must be smaller than window_sec")
+    total = len(audio)
+    window = int(window_sec * sample_rate)
+    search = int(search_sec * sample_rate)
+    overlap = int(overlap_sec * sample_rate)
+
+    cuts = [0]
+    while total - cuts[-1] > window:
+        target = cuts[-1] + window
+        # 区切りが前の区切りより後ろになるよう探索範囲を制限する
+        cuts.append(find_quietest_point(audio, max(cuts[-1] + 1, target - search), target))
+    cuts.append(total)
+
+    windows = [
+        (
+            max(0, core_start - overlap),
+            min(total, core_end + overlap),
+            core_start / sample_rate,
+            core_end / sample_rate,
+        )
+        for core_start, core_end in zip(cuts[:-1], cuts[1:])
+    ]
+    # 最後の窓は末尾をはみ出すセグメントも受け持つ
+    windows[-1] = windows[-1][:3] + (float('inf'),)
+    return windows
+
+def stitch_window_segments(window: Window, segments: Iterable[Dict], sample_rate: int = SAMPLE_RATE) -> Iterator[Dict]:
+    """
+    窓内のセグメントを全体の時刻に補正し、担当区間に中心があるものだけを返す
+    隣り合う窓の担当区間は重ならないため、重なり部分のセグメントはどちらか一方にだけ残る
+    """
+    offset = window[0] / sample_rate
+    core_start, core_end = window[2], window[3]
+    for segment in segments:
+        middle = (segment['start'] + segment['end']) / 2 + offset
+        if core_start <= middle < core_end:
+            yield shift_segment(segment, offset)
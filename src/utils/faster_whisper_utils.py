@@ -1,15 +1,51 @@
+import os
+import sys
+import time
+import wave
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+import numpy as np
 from utils.whisper_utils import WhisperProcessor
-from faster_whisper import WhisperModel
+from utils.cache_utils import TranscriptionCache
+from utils.audio_utils import load_audio, PcmCache, LiveAudioReader, SAMPLE_RATE
+from utils.model_pool_utils import get_model_pool
+from utils.moviepy_utils import get_media_duration
+from utils.metrics_utils import get_metrics
+from utils.word_utils import WordTimings, shift_segment
+from utils.transcript_utils import TranscriptArchive
+from utils.checkpoint_utils import CheckpointStore
+from utils.cascade_utils import is_weak, plan_regions, merge_cascade, estimate_speedup
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+
+logger = logging.getLogger(__name__)
+
+# 二段階の処理のログの表示名
+REFINE_LABELS = {'cascade': 'Cascade', 'adaptive_beam': 'Adaptive beam'}
 
 class FasterWhisperProcessor(WhisperProcessor):
+    backend = 'faster-whisper'
+
     def __init__(
         self, 
         output_dir: str = '../output',
         input_dir: str = '../input',
         include_timestamps: bool = True,
         timestamp_format: str = 'full',
-        output_format: str = 'txt',  # 'txt' or 'html'
-        language: str = 'ja' # 'ja' or 'en'
+        output_format: str = 'txt',  # 'txt', 'html' or 'srt'
+        language: str = 'ja', # 'ja' or 'en'
+        cache: Optional[TranscriptionCache] = None,
+        long_audio: Optional[Dict] = None,
+        pcm_cache: Optional[PcmCache] = None,
+        streaming_decode: Optional[Dict] = None,
+        media_placement: str = 'copy',
+        media_proxy: bool = False,
+        word_timestamps: bool = False,
+        archive: Optional[TranscriptArchive] = None,
+        vad: Optional[Dict] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        batched: Optional[Dict] = None,
+        cascade: Optional[Dict] = None,
+        adaptive_beam: Optional[Dict] = None
     ):
         """
         WhisperProcessor初期化
@@ -18,45 +54,585 @@ class FasterWhisperProcessor(WhisperProcessor):
             input_dir: 入力ディレクトリのパス
             include_timestamps: タイムスタンプを含めるかどうか
             timestamp_format: タイムスタンプのフォーマット ('full' or 'simple')
-            output_format: 出力フォーマット ('txt' or 'html')
+            output_format: 出力フォーマット ('txt', 'html' or 'srt')
+            cache: 文字起こし結果のキャッシュ (Noneの場合は使用しない)
+            long_audio: 長時間音声の分割並列処理の設定 (enabled, min_duration_sec, window_sec, overlap_sec, workers)
+            pcm_cache: デコード済みPCMのキャッシュ (Noneの場合は毎回デコードする)
+            streaming_decode: 音声を窓ごとに読み込むストリーミング処理の設定 (enabled, min_duration_sec, window_sec, overlap_sec)
+            media_placement: HTML出力のメディアの配置方法 ('auto', 'reflink', 'hardlink', 'symlink', 'relative', 'copy')
+            media_proxy: HTML出力で元のメディアの代わりに音声のみの軽量なプロキシを使うかどうか
+            word_timestamps: 単語のタイムスタンプを使う出力フォーマット(html, srt)で単語単位のタイムスタンプを求めるかどうか
+            archive: 文字起こし結果をバイナリ形式で保存する先 (Noneの場合は保存しない)
+            vad: 文字起こしの前に音声区間を検出して無音を除く設定 (Noneの場合はfaster-whisperのvad_filterを使う)
+            checkpoints: 窓ごとに処理する長いファイルの途中経過の保存先 (Noneの場合は保存しない)
+            batched: バッチ推論の設定 (batch_size, max_clip_sec, max_files, vad_segments。Noneの場合は使用しない)
+            cascade: 小さいモデルで下書きし、信頼度の低い区間だけをset_modelのモデルで処理し直す設定
+                (draft_model, avg_logprob, compression_ratio, no_speech_prob, merge_gap_sec, padding_sec。Noneの場合は使用しない)
+            adaptive_beam: 貪欲法で文字起こしし、信頼度の低い区間だけをビームサーチで処理し直す設定
+                (beam_size, avg_logprob, compression_ratio, no_speech_prob, merge_gap_sec, padding_sec。cascadeが優先)
         """
-        super().__init__(output_dir, input_dir, include_timestamps, timestamp_format, output_format, language)
+        super().__init__(
+            output_dir, input_dir, include_timestamps, timestamp_format, output_format, language,
+            cache, long_audio, pcm_cache, streaming_decode, media_placement, media_proxy, word_timestamps, archive, vad, checkpoints
+        )
+        self.batched = batched
+        self.cascade = cascade
+        self.adaptive_beam = adaptive_beam
+        # ファイルをまたいだ二段階の処理の集計 (refine_report)
+        self.refine_totals = {}
 
-    def set_model(self, model_name: str, device: str = 'cpu', compute_type: str = 'int8') -> None:
+    def set_model(
+        self,
+        model_name: str,
+        device: str = 'cpu',
+        compute_type: str = 'int8',
+        cpu_threads: int = 0,
+        preload: bool = True
+    ) -> None:
         """
         モデルの設定
         Args:
             model_name: モデル名 ('tiny', 'small', 'base', 'medium', 'large', 'large-v3')
             device: デバイス ('cpu' or 'cuda')
             compute_type: 計算精度 ('float16', 'int8_float16', 'int8')
+            cpu_threads: CPUスレッド数 (0の場合はデフォルト)
+            preload: すぐにロードするかどうか (Falseの場合は最初に文字起こしする時にロードするため、
+                VADで全てのファイルが無音だった場合はロードしない)
         """
         self.model_name = model_name
-        self.model = WhisperModel(model_name, device=device, compute_type=compute_type)
+        self.model_kwargs = dict(device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        if not preload:
+            return
+        self.load_model(model_name)
+        if self.cascade:
+            self.load_model(self.cascade['draft_model'])
+
+    def load_model(self, model_name: str) -> WhisperModel:
+        """モデルプールからモデルを取得 (未ロードか解放済みの場合はロードする)"""
+        kwargs = self.model_kwargs
+        return get_model_pool().get(
+            self.backend, model_name, kwargs['device'], kwargs['compute_type'],
+            lambda: WhisperModel(model_name, **kwargs)
+        )
+
+    @property
+    def draft_model(self) -> Optional[WhisperModel]:
+        """カスケードの下書きに使うモデル (modelと同じくモデルプールから取得する)"""
+        return self.load_model(self.cascade['draft_model']) if self.cascade and self.model_name else None
+
+    def refines(self) -> bool:
+        """信頼度の低い区間を処理し直す二段階の処理 (カスケード・適応ビーム) を使うかどうか"""
+        return bool(self.cascade or self.adaptive_beam)
+
+    def model_label(self) -> str:
+        """出力ファイル名や保存先に付けるモデル名 (カスケードの場合は 下書き-仕上げ)"""
+        if self.cascade:
+            return f"{self.cascade['draft_model']}-{self.model_name}"
+        return self.model_name
+
+    def batched_pipeline(self) -> BatchedInferencePipeline:
+        """
+        バッチ推論用のパイプライン (ロード済みのモデルを共有する)
+        モデルへの参照を残さないよう保持せず、呼び出しごとに作る
+        """
+        return BatchedInferencePipeline(model=self.model)
+
+    def transcribe_options(self) -> Dict:
+        """transcribeに渡すオプション (キャッシュキーにも使用)"""
+        options = {
+            'word_timestamps': self.needs_words(),
+            # 適応ビームの場合は貪欲法で全体を処理し、信頼度の低い区間だけをビームサーチで処理し直す
+            'beam_size': 1 if self.adaptive_beam and not self.cascade else 5,
+            # 共通のVADで無音を除いている場合は二重に検出しない
+            'vad_filter': not self.vad,
+        }
+        if self.batched and self.batched.get('vad_segments') and not self.refines():
+            # VAD区間をまとめてバッチ推論する (前の区間の文脈を使わないため結果が変わりうる)
+            options['batch_size'] = self.batched['batch_size']
+        return options
+
+    def transcribe(self, audio: Union[str, np.ndarray], options: Dict) -> Iterator[Dict]:
+        """
+        文字起こしを実行してセグメントのイテレータを返す
+        faster-whisperのsegmentsは遅延評価のため、デコードされたセグメントから順に返される
+        """
+        options = dict(options)
+        if self.refines() and not options.get('batch_size'):
+            return self.transcribe_refined(audio, options)
+        return self.transcribe_single(audio, options)
+
+    def transcribe_single(self, audio: Union[str, np.ndarray], options: Dict) -> Iterator[Dict]:
+        """二段階の処理を使わず、set_modelのモデルで1回だけ文字起こしする"""
+        options = dict(options)
+        batch_size = options.pop('batch_size', None)
+        # VADと特徴量抽出はここで先に実行され、推論はセグメントを取り出すたびに進む
+        with get_metrics().stage('vad'):
+            if batch_size:
+                segments, info = self.batched_pipeline().transcribe(
+                    audio,
+                    language=self.language,
+                    batch_size=batch_size,
+                    **options
+                )
+            else:
+                segments, info = self.model.transcribe(
+                    audio,
+                    language=self.language,
+                    **options
+                )
+        return (self.make_segment(segment) for segment in segments)
+
+    @staticmethod
+    def make_segment(segment, offset: float = 0.0) -> Dict:
+        """faster-whisperのセグメントから出力に使う項目だけを取り出す (単語は列指向で保持する)"""
+        converted = {'text': segment.text, 'start': segment.start, 'end': segment.end}
+        if segment.words:
+            converted['words'] = WordTimings.from_words(segment.words)
+        return shift_segment(converted, offset) if offset else converted
+
+    def decode_mode(self, file_path: str) -> str:
+        """音声の読み込み方法を決定 (二段階の処理は区間ごとに処理し直すため、分割並列処理の代わりに全体を処理する)"""
+        mode = super().decode_mode(file_path)
+        if self.refines() and mode == 'long':
+            return 'whole'
+        return mode
+
+    def cache_params(self, options: Dict) -> Dict:
+        """キャッシュキーに含めるパラメータ (二段階で処理する場合はその設定も含める)"""
+        params = super().cache_params(options)
+        if self.cascade:
+            params['cascade'] = {
+                name: self.cascade[name]
+                for name in ('draft_model', 'avg_logprob', 'compression_ratio', 'no_speech_prob', 'merge_gap_sec', 'padding_sec')
+            }
+        elif self.adaptive_beam:
+            params['adaptive_beam'] = {
+                name: self.adaptive_beam[name]
+                for name in ('beam_size', 'avg_logprob', 'compression_ratio', 'no_speech_prob', 'merge_gap_sec', 'padding_sec')
+            }
+        return params
+
+    def transcribe_refined(self, audio: Union[str, np.ndarray], options: Dict) -> Iterator[Dict]:
+        """
+        全体を速い設定で文字起こしし、信頼度の低いセグメントの区間だけを遅い設定で処理し直す
+          cascade      : 小さいモデル → set_modelのモデル
+          adaptive_beam: 貪欲法(beam_size=1) → ビームサーチ (同じモデル)
+        処理し直した区間の結果で1回目のセグメントを置き換えて1つの時系列にまとめる。
+        処理し直した音声の割合と、遅い設定だけで全体を処理した場合と比べた速度(推定)を記録する。
+        実測の比較はbenchmark.pyのdecodings ('adaptive'・'cascade') で行う。
+        """
+        metrics = get_metrics()
+        if isinstance(audio, str):
+            # 区間を切り出すため全体を読み込む (PCMキャッシュがあればメモリマップしたPCMを使う)
+            if self.pcm_cache:
+                audio = self.load_audio(audio)
+            else:
+                with metrics.stage('decode'):
+                    audio = load_audio(audio)
+        duration = len(audio) / SAMPLE_RATE
+        if self.cascade:
+            name, settings = 'cascade', self.cascade
+            first_name, first_options = self.cascade['draft_model'], options
+            second_name, second_options = self.model_name, options
+        else:
+            name, settings = 'adaptive_beam', self.adaptive_beam
+            first_name, first_options = self.model_name, dict(options, beam_size=1)
+            second_name, second_options = self.model_name, dict(options, beam_size=settings['beam_size'])
+
+        start_time = time.perf_counter()
+        draft = []
+        weak = []
+        # モデルはプールから使うたびに取得する (上限を超えた場合に下書きのモデルを解放できるように)
+        raw_segments, info = self.load_model(first_name).transcribe(audio, language=self.language, **first_options)
+        for raw in raw_segments:
+            segment = self.make_segment(raw)
+            draft.append(segment)
+            if is_weak(raw, settings):
+                weak.append(segment)
+        first_seconds = time.perf_counter() - start_time
+
+        regions = plan_regions(weak, len(audio), settings['merge_gap_sec'], settings['padding_sec'])
+        start_time = time.perf_counter()
+        results = []
+        for region in regions:
+            region_options = dict(second_options)
+            # 区間の直前までの1回目の結果を文脈として引き継ぐ
+            prompt = ''.join(segment['text'] for segment in draft if segment['end'] <= region[0] / SAMPLE_RATE)[-200:]
+            if prompt:
+                region_options['initial_prompt'] = prompt
+            segments, info = self.load_model(second_name).transcribe(audio[region[0]:region[1]], language=self.language, **region_options)
+            results.append([self.make_segment(segment) for segment in segments])
+        second_seconds = time.perf_counter() - start_time
+
+        # 処理し直した音声の長さ (前後の文脈を含む)
+        escalated_seconds = sum(region[1] - region[0] for region in regions) / SAMPLE_RATE
+        report = self.record_refined(name, duration, escalated_seconds, first_seconds, second_seconds)
+        logger.info(
+            f"{REFINE_LABELS[name]}: {len(weak)}/{len(draft)} segments, {len(regions)} regions, "
+            f"escalated {escalated_seconds:.1f}s / {duration:.1f}s ({report['escalated_ratio'] * 100:.1f}%)"
+            + (f", speedup x{report['speedup']:.2f} (estimated)" if report['speedup'] else '')
+        )
+        return merge_cascade(draft, regions, results)
+
+    def record_refined(self, name: str, duration: float, escalated_seconds: float, first_seconds: float, second_seconds: float) -> Dict:
+        """
+        二段階の処理の結果を集計して計測に記録する
+        遅い設定だけで処理した場合の時間は、処理し直した区間の速度から全体の長さに換算して推定する
+        """
+        totals = self.refine_totals.setdefault(
+            name, {'files': 0, 'audio_seconds': 0.0, 'escalated_seconds': 0.0, 'first_seconds': 0.0, 'second_seconds': 0.0}
+        )
+        totals['files'] += 1
+        totals['audio_seconds'] += duration
+        totals['escalated_seconds'] += escalated_seconds
+        totals['first_seconds'] += first_seconds
+        totals['second_seconds'] += second_seconds
+        report = {
+            'escalated_seconds': escalated_seconds,
+            'escalated_ratio': escalated_seconds / duration if duration else 0.0,
+            'first_seconds': first_seconds,
+            'second_seconds': second_seconds,
+            'speedup': estimate_speedup(duration, escalated_seconds, first_seconds, second_seconds),
+        }
+        if get_metrics().current() is not None:
+            get_metrics().set(**{name: report})
+        return report
+
+    def refine_report(self) -> Dict[str, Dict]:
+        """ファイルをまたいだ二段階の処理の集計を表示して返す"""
+        reports = {}
+        for name, totals in self.refine_totals.items():
+            ratio = totals['escalated_seconds'] / totals['audio_seconds'] if totals['audio_seconds'] else 0.0
+            speedup = estimate_speedup(
+                totals['audio_seconds'], totals['escalated_seconds'], totals['first_seconds'], totals['second_seconds']
+            )
+            baseline = f"{self.model_name} alone" if name == 'cascade' else f"beam {self.adaptive_beam['beam_size']} everywhere"
+            logger.info(
+                f"{REFINE_LABELS[name]} total: {totals['files']} files, escalated {totals['escalated_seconds']:.1f}s / "
+                f"{totals['audio_seconds']:.1f}s ({ratio * 100:.1f}%), "
+                f"first pass {totals['first_seconds']:.1f}s + second pass {totals['second_seconds']:.1f}s"
+                + (f", speedup x{speedup:.2f} vs {baseline} (estimated)" if speedup else '')
+            )
+            reports[name] = {**totals, 'escalated_ratio': ratio, 'speedup': speedup}
+        return reports
+
+    def transcribe_clips(self, audios: List[np.ndarray], options: Dict, batch_size: int = 8) -> List[List[Dict]]:
+        """
+        複数の短い音声をまとめてバッチ推論する
+        音声を連結して各音声の範囲をclip_timestampsとして渡し、batch_size個ずつ1回のエンコーダ・デコーダの実行で処理する。
+        セグメントは開始時刻から元の音声に振り分け、時刻を各音声の先頭からに補正して返す。
+        Args:
+            audios: 16kHzモノラルfloat32のPCM (それぞれ30秒以下)
+            options: transcribeに渡すオプション
+            batch_size: 1回の推論で処理する音声の数
+        Returns:
+            音声ごとのセグメントのリスト
+        """
+        # faster-whisperは合計30秒に収まる隣り合った範囲を1つにまとめるため、各範囲を無音で15秒より長くしてまとめられないようにする
+        # (エンコーダは常に30秒単位で処理するため、無音を足しても計算量は変わらない)
+        min_span = int(15.5 * SAMPLE_RATE)
+        parts = []
+        clip_timestamps = []
+        starts = []
+        indices = []
+        offset = 0
+        for index, audio in enumerate(audios):
+            if not len(audio):
+                continue
+            span = max(len(audio), min_span)
+            parts += [audio, np.zeros(span - len(audio), dtype=np.float32)]
+            clip_timestamps.append({'start': offset, 'end': offset + span})
+            starts.append(offset / SAMPLE_RATE)
+            indices.append(index)
+            offset += span
+        results = [[] for _ in audios]
+        if not clip_timestamps:
+            return results
+
+        options = {name: value for name, value in options.items() if name not in ('vad_filter', 'batch_size')}
+        with get_metrics().stage('vad'):
+            segments, info = self.batched_pipeline().transcribe(
+                np.concatenate(parts),
+                language=self.language,
+                batch_size=batch_size,
+                vad_filter=False,
+                clip_timestamps=clip_timestamps,
+                **options
+            )
+        for segment in segments:
+            # 時刻は丸められているため少し後ろで探す
+            position = int(np.searchsorted(starts, segment.start + 0.01, side='right')) - 1
+            position = max(0, position)
+            index = indices[position]
+            duration = len(audios[index]) / SAMPLE_RATE
+            converted = self.make_segment(segment, -starts[position])
+            converted['start'] = min(max(0.0, converted['start']), duration)
+            converted['end'] = min(max(converted['start'], converted['end']), duration)
+            results[index].append(converted)
+        return results
+
+    def process_clips(
+        self,
+        file_paths: List[str],
+        media_paths: Optional[Dict[str, str]] = None,
+        source_paths: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """
+        短い音声ファイルをまとめてバッチ推論し、ファイルごとに出力する
+        vadを設定した場合は各ファイルの音声区間だけを連結して推論し、音声の無いファイルはモデルを実行せずに空の結果を出力する
+        (全てのファイルが無音の場合はモデルをロードしない)
+        Args:
+            file_paths: 文字起こしする音声ファイルのパス (それぞれbatched.max_clip_sec以下)
+            media_paths: 音声ファイルのパスからHTML出力で再生するメディアのパスへの対応
+            source_paths: 音声ファイルのパスから変換前の入力ファイルのパスへの対応
+        Returns:
+            処理結果の集計 (files, succeeded, audio_seconds, wall_seconds, throughput)
+        """
+        metrics = get_metrics()
+        media_paths = media_paths or {}
+        source_paths = source_paths or {}
+        batch_size = self.batched['batch_size']
+        # 1ファイルずつ処理した場合とは結果が変わりうるため、キャッシュキーを分ける
+        options = dict(self.transcribe_options(), vad_filter=False, batch_size=batch_size)
+        params = self.cache_params(options)
+        max_files = max(1, self.batched['max_files'])
+
+        logger.info(f"Clips: {len(file_paths)} files, batch size {batch_size}")
+        succeeded = 0
+        audio_seconds = 0.0
+        start_time = time.perf_counter()
+        for group_start in range(0, len(file_paths), max_files):
+            group = file_paths[group_start:group_start + max_files]
+            with metrics.file(f"{len(group)} clips", backend=self.backend, model=self.model_name, mode='clips', files=len(group)):
+                results = {}
+                pending = []
+                audios = []
+                speech_maps = []
+                for file_path in group:
+                    if self.cache:
+                        with metrics.stage('cache'):
+                            segments = self.cache.get(self.cache.make_key(file_path, params))
+                        if segments is not None:
+                            logger.info(f"Cache hit: {file_path}")
+                            results[file_path] = segments
+                            continue
+                    try:
+                        with metrics.stage('decode'):
+                            audio = self.pcm_cache.load(file_path) if self.pcm_cache else load_audio(file_path)
+                        speech = None
+                        if self.vad:
+                            speech = self.speech_map(audio)
+                            if speech is None:
+                                logger.info(f"No speech detected: {file_path}")
+                                results[file_path] = []
+                                if self.cache:
+                                    self.cache.put(self.cache.make_key(file_path, params), [], source=file_path, params=params)
+                                continue
+                            audio = speech.extract(audio)
+                        audios.append(audio)
+                        speech_maps.append(speech)
+                        pending.append(file_path)
+                    except Exception as e:
+                        logger.error(f"Error processing {file_path}: {str(e)}")
+
+                if pending:
+                    try:
+                        with metrics.stage('inference'):
+                            clips = self.transcribe_clips(audios, options, batch_size)
+                    except Exception as e:
+                        logger.error(f"Error processing {len(pending)} clips: {str(e)}")
+                        metrics.set(ok=False, error=str(e))
+                        clips = None
+                    for file_path, speech, segments in zip(pending, speech_maps, clips or []):
+                        if speech:
+                            # 時刻を音声区間を連結する前の時刻に戻す
+                            segments = [speech.map_segment(segment) for segment in segments]
+                        results[file_path] = segments
+                        if self.cache:
+                            self.cache.put(self.cache.make_key(file_path, params), segments, source=file_path, params=params)
+
+                for file_path in group:
+                    if file_path not in results:
+                        continue
+                    logger.info(f"Processing: {file_path}")
+                    try:
+                        segments = iter(results[file_path])
+                        if self.archive:
+                            segments = self.archive_segments(file_path, segments, source_paths.get(file_path))
+                        with metrics.stage('write'):
+                            self.create_output_file(file_path, segments, media_paths.get(file_path))
+                    except Exception as e:
+                        logger.error(f"Error processing {file_path}: {str(e)}")
+                        continue
+                    succeeded += 1
+                    duration = get_media_duration(file_path)
+                    audio_seconds += duration
+                    metrics.add('audio_seconds', duration)
+                    metrics.add('segments', len(results[file_path]))
+        wall_seconds = time.perf_counter() - start_time
+
+        throughput = audio_seconds / wall_seconds if wall_seconds > 0 else 0.0
+        logger.info(f"Clips complete: {succeeded}/{len(file_paths)} files")
+        logger.info(f"Audio: {audio_seconds:.1f}s / Wall: {wall_seconds:.1f}s / Throughput: {throughput:.2f} audio-s/s")
+        return {
+            'files': len(file_paths),
+            'succeeded': succeeded,
+            'audio_seconds': audio_seconds,
+            'wall_seconds': wall_seconds,
+            'throughput': throughput,
+        }
+
+    def transcribe_live(
+        self,
+        chunks: Iterable[np.ndarray],
+        options: Dict,
+        min_chunk_sec: float = 1.0,
+        max_buffer_sec: float = 30.0,
+        show_partial: bool = False
+    ) -> Iterator[Dict]:
+        """
+        届いた音声を順に文字起こしし、確定したセグメントから返す
+        未確定の音声をバッファに溜め、min_chunk_sec分届くごとにバッファ全体を文字起こしし直す。
+        直前の結果と先頭から一致したセグメントを確定とみなして返し、その終了時刻までをバッファから捨てる。
+        バッファがmax_buffer_secを超えても一致しない場合は、最後のセグメント以外を確定させる。
+        二段階の処理(カスケード・適応ビーム)は伸びていくバッファを毎回2回処理することになるため使わない。
+        vadを設定した場合はバッファの音声区間だけを連結して文字起こしする (音声が無ければモデルを実行しない)。
+        Args:
+            chunks: 16kHzモノラルfloat32のPCMの断片
+            options: transcribeに渡すオプション
+            min_chunk_sec: 文字起こしし直す間隔(秒)
+            max_buffer_sec: 未確定の音声を溜める上限(秒)
+            show_partial: 未確定の結果を表示するかどうか
+        """
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = 0.0
+        received = 0
+        previous = []
+        prompt = ''
+        if self.adaptive_beam:
+            # 貪欲法だけにならないよう通常のビーム幅に戻す
+            options = dict(options, beam_size=5)
+
+        def transcribe_buffer() -> List[Dict]:
+            buffer_options = dict(options)
+            if prompt:
+                # 確定済みのテキストを文脈として引き継ぐ
+                buffer_options['initial_prompt'] = prompt
+            if not self.vad:
+                return [shift_segment(segment, buffer_start) for segment in self.transcribe_single(buffer, buffer_options)]
+            # transcribe_optionsはvadを設定した場合faster-whisperのvad_filterを使わないため、ここで無音を除く
+            speech = self.speech_map(buffer)
+            if speech is None:
+                return []
+            return [
+                shift_segment(speech.map_segment(segment), buffer_start)
+                for segment in self.transcribe_single(speech.extract(buffer), buffer_options)
+            ]
+
+        for chunk in chunks:
+            buffer = np.concatenate((buffer, chunk))
+            received += len(chunk)
+            if received < min_chunk_sec * SAMPLE_RATE:
+                continue
+            received = 0
+
+            hypothesis = transcribe_buffer()
+            agreed = 0
+            while (agreed < min(len(previous), len(hypothesis))
+                   and previous[agreed]['text'].strip() == hypothesis[agreed]['text'].strip()):
+                agreed += 1
+            if not agreed and len(buffer) > max_buffer_sec * SAMPLE_RATE:
+                if not hypothesis:
+                    # 発話が無いまま上限を超えた場合は末尾だけ残して捨てる
+                    buffer_start += (len(buffer) - int(min_chunk_sec * SAMPLE_RATE)) / SAMPLE_RATE
+                    buffer = buffer[-int(min_chunk_sec * SAMPLE_RATE):]
+                    previous = []
+                    continue
+                agreed = max(1, len(hypothesis) - 1)
+
+            for segment in hypothesis[:agreed]:
+                prompt = (prompt + segment['text'])[-200:]
+                yield segment
+            if agreed:
+                cut = hypothesis[agreed - 1]['end']
+                buffer = buffer[max(0, int((cut - buffer_start) * SAMPLE_RATE)):]
+                buffer_start = cut
+            previous = hypothesis[agreed:]
+            if show_partial and previous:
+                logger.info(f"Partial: {''.join(segment['text'] for segment in previous).strip()}")
 
-    def process_audio_file(
+        # 入力の終わりでは残りをすべて確定させる
+        if len(buffer):
+            yield from transcribe_buffer()
+
+    def process_live(
         self,
-        file_path: str
+        source: str = '-',
+        name: str = 'live',
+        input_format: Optional[str] = None,
+        input_args: Optional[List[str]] = None,
+        chunk_sec: float = 0.5,
+        min_chunk_sec: float = 1.0,
+        max_buffer_sec: float = 30.0,
+        show_partial: bool = False,
+        echo: bool = True
     ) -> bool:
-        """音声ファイルの処理"""
-        print(f"Processing: {file_path}")
+        """
+        標準入力や名前付きパイプからの音声の逐次処理
+        確定したセグメントはその都度表示し、txt/htmlの出力ファイルへ書き出す。
+        HTML出力の場合は受け取った音声を出力ディレクトリにwavとして保存し、再生用のメディアにする。
+        Args:
+            source: 入力元 ('-'の場合は標準入力、それ以外は名前付きパイプなどのパス)
+            name: 出力ファイル名のベース
+            input_format: ffmpegの入力フォーマット (Noneの場合は自動判別)
+            input_args: 入力フォーマットの追加引数
+            chunk_sec: 入力を読み込む単位(秒)
+            min_chunk_sec: 文字起こしし直す間隔(秒)
+            max_buffer_sec: 未確定の音声を溜める上限(秒)
+            show_partial: 未確定の結果をログに出力するかどうか
+            echo: 確定したセグメントを標準出力に書き出すかどうか
+        """
+        logger.info(f"Processing: {source}")
+        metrics = get_metrics()
+        recorder = None
         try:
-            if not self.model or not self.model_name:
-                print("Model not set. Please set the model before processing.")
+            if not self.model_name:
+                logger.error("Model not set. Please set the model before processing.")
                 return False
-            segments, info = self.model.transcribe(
-                file_path,
-                language=self.language,
-                word_timestamps=True,  # HTML出力の場合は常にTrue
-                beam_size=5,
-                vad_filter=True,
-            )
-            self.create_output_file(file_path, 
-                list({
-                    'text': segment.text,
-                    'start': segment.start,
-                    'end': segment.end
-                } for segment in segments))
+            media_path = None
+            if self.output_format == 'html':
+                media_path = os.path.join(self.output_dir, f"{name}.wav")
+                recorder = wave.open(media_path, 'wb')
+                recorder.setnchannels(1)
+                recorder.setsampwidth(2)
+                recorder.setframerate(SAMPLE_RATE)
+            with metrics.file(name, backend=self.backend, model=self.model_name, mode='live'):
+                reader = LiveAudioReader(source, input_format, input_args, chunk_sec, recorder=recorder)
+                # 受け取った音声の長さを記録する
+                chunks = (metrics.add('audio_seconds', len(chunk) / SAMPLE_RATE) or chunk for chunk in reader)
+                segments = self.transcribe_live(
+                    metrics.timed(chunks, 'decode'), self.transcribe_options(),
+                    min_chunk_sec=min_chunk_sec, max_buffer_sec=max_buffer_sec, show_partial=show_partial
+                )
+
+                def write_stdout(segments: Iterable[Dict]) -> Iterator[Dict]:
+                    # 確定した結果をその場で読めるよう、ログとは別に標準出力へ書き出す
+                    for segment in segments:
+                        sys.stdout.write(self.format_line(segment))
+                        sys.stdout.flush()
+                        yield segment
+
+                segments = metrics.timed(segments, 'inference', count='segments')
+                if echo:
+                    segments = write_stdout(segments)
+                if self.archive:
+                    segments = self.archive_segments(name, segments)
+                with metrics.stage('write'):
+                    self.create_output_file(name, segments, media_path)
             return True
         except Exception as e:
-            print(f"Error processing {file_path}: {str(e)}")
-            return False
\ No newline at end of file
+            logger.error(f"Error processing {source}: {str(e)}")
+            return False
+        finally:
+            if recorder:
+                recorder.close()
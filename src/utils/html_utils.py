@@ -0,0 +1,652 @@
+import os
+import json
+import html
+from typing import Dict, Iterable, Optional, TextIO, Union
+from urllib.parse import quote
+from utils.word_utils import WordTimings
+from utils.transcript_utils import Transcript
+
+# 動画として表示する拡張子
+VIDEO_EXTENSIONS = ['.mp4', '.webm', '.ogg']
+# <source>のtype属性に指定するMIMEタイプ
+MIME_TYPES = {
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+    '.ogg': 'video/ogg',
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.wav': 'audio/wav',
+}
+
+# セグメントデータ(JSON配列)の直前までのテンプレート
+# 差し込む値: title, media_type, media_src, mime_type (いずれもエスケープ済みの値を渡す)
+HTML_HEAD = """
+<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>文字起こし - {title}</title>
+    <style>
+        :root {{
+            --header-height: 60px;
+            --search-height: 60px;
+            --player-height: 200px;
+            --spacing: 20px;
+        }}
+        
+        body {{
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 0;
+            background-color: #f5f5f5;
+            height: 100vh;
+            overflow: hidden;
+        }}
+        
+        .header {{
+            height: var(--header-height);
+            background: white;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            padding: 0 20px;
+            display: flex;
+            align-items: center;
+            justify-content: space-between;
+            position: fixed;
+            top: 0;
+            left: 0;
+            right: 0;
+            z-index: 100;
+        }}
+        
+        .main-container {{
+            display: flex;
+            height: calc(100vh - var(--header-height) - 40px);
+            margin-top: var(--header-height);
+            gap: var(--spacing);
+            padding: var(--spacing);
+        }}
+        
+        .media-container {{
+            flex: 1;
+            background: white;
+            padding: var(--spacing);
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            height: fit-content;
+            position: sticky;
+            top: calc(var(--header-height) + var(--spacing));
+        }}
+        
+        .transcript-container {{
+            flex: 1;
+            display: flex;
+            flex-direction: column;
+            gap: var(--spacing);
+            max-width: 50%;
+        }}
+        
+        .search-container {{
+            background: white;
+            padding: 15px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }}
+        
+        .search-input {{
+            width: 100%;
+            box-sizing: border-box;
+            padding: 8px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+            font-size: 1em;
+        }}
+        
+        .transcript-content {{
+            background: white;
+            padding: var(--spacing);
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            overflow-y: auto;
+            height: calc(100vh - var(--header-height) - var(--search-height) - var(--spacing) * 4);
+        }}
+        
+        {media_type} {{
+            width: 100%;
+            border-radius: 4px;
+        }}
+        
+        .segment {{
+            padding: 15px;
+            margin: 5px 0;
+            cursor: pointer;
+            border-radius: 4px;
+            transition: all 0.2s;
+            position: relative;
+        }}
+        
+        .segment:hover {{
+            background-color: #f0f0f0;
+        }}
+        
+        .segment.active {{
+            background-color: #e3f2fd;
+        }}
+        
+        .segment.highlight {{
+            background-color: #fff3cd;
+        }}
+        
+        .timestamp {{
+            color: #666;
+            font-size: 0.9em;
+            margin-bottom: 5px;
+            user-select: none;
+        }}
+        
+        .text {{
+            line-height: 1.5;
+        }}
+        
+        .word.current {{
+            background-color: #ffe082;
+            border-radius: 2px;
+        }}
+        
+        .text[contenteditable="true"] {{
+            border: 1px solid #ddd;
+            padding: 5px;
+            border-radius: 4px;
+        }}
+        
+        .segment-actions {{
+            display: none;
+            position: absolute;
+            right: 10px;
+            top: 10px;
+            gap: 5px;
+        }}
+        
+        .segment:hover .segment-actions {{
+            display: flex;
+        }}
+        
+        .btn {{
+            padding: 5px 10px;
+            border: none;
+            border-radius: 4px;
+            cursor: pointer;
+            font-size: 0.9em;
+            background: #f0f0f0;
+            transition: background-color 0.2s;
+        }}
+        
+        .btn:hover {{
+            background: #e0e0e0;
+        }}
+        
+        .header-actions {{
+            display: flex;
+            gap: 10px;
+        }}
+        
+        .tooltip {{
+            position: fixed;
+            background: rgba(0, 0, 0, 0.8);
+            color: white;
+            padding: 5px 10px;
+            border-radius: 4px;
+            font-size: 0.9em;
+            pointer-events: none;
+            z-index: 1000;
+        }}
+        
+        @media (max-width: 768px) {{
+            .main-container {{
+                flex-direction: column;
+            }}
+            
+            .media-container, .transcript-container {{
+                max-width: 100%;
+            }}
+            
+            .media-container {{
+                position: static;
+            }}
+            
+            .transcript-content {{
+                height: auto;
+                max-height: 50vh;
+            }}
+        }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>文字起こし - {title}</h1>
+        <div class="header-actions">
+            <button class="btn" id="copy-all">全体をコピー</button>
+            <button class="btn" id="copy-all-with-timestamps">タイムスタンプ付きでコピー</button>
+        </div>
+    </div>
+    
+    <div class="main-container">
+        <div class="media-container">
+            <{media_type} id="media-player" controls>
+                <source src="{media_src}" type="{mime_type}">
+                お使いのブラウザは{media_type}タグをサポートしていません。
+            </{media_type}>
+        </div>
+        
+        <div class="transcript-container">
+            <div class="search-container">
+                <input type="text" class="search-input" placeholder="テキストを検索..." id="search-input">
+            </div>
+            
+            <div class="transcript-content" id="transcript"></div>
+        </div>
+    </div>
+    
+    <script type="application/json" id="transcript-data">[
+"""
+
+# セグメントデータの直後からのテンプレート
+HTML_TAIL = """
+]</script>
+    
+    <script>
+        const player = document.getElementById('media-player');
+        const transcript = document.getElementById('transcript');
+        const searchInput = document.getElementById('search-input');
+        const BLOCK_SIZE = 50;            // 表示単位(ブロック)あたりのセグメント数
+        const ESTIMATED_ROW_HEIGHT = 80;  // 未表示ブロックの高さの見積もり(px)
+        const SEARCH_DELAY = 200;         // 検索のデバウンス(ms)
+        const ACTIONS_HTML = '<button class="btn" data-action="play">再生</button>'
+            + '<button class="btn" data-action="edit">編集</button>'
+            + '<button class="btn" data-action="copy">コピー</button>'
+            + '<button class="btn" data-action="copy-ts">TS付きコピー</button>';
+        let tooltip = null;
+        
+        // セグメントデータ ([開始, 終了, テキスト, 単語] の配列) を開始時刻順の配列に展開
+        // 単語は [単語の配列, 開始(ms)の配列, 終了(ms)の配列] で、単語のタイムスタンプが無い場合は省略される
+        const rows = JSON.parse(document.getElementById('transcript-data').textContent);
+        for (let i = 1; i < rows.length; i++) {
+            if (rows[i][0] < rows[i - 1][0]) {
+                rows.sort((a, b) => a[0] - b[0]);
+                break;
+            }
+        }
+        const count = rows.length;
+        const starts = new Float64Array(count);
+        const ends = new Float64Array(count);
+        const texts = new Array(count);
+        const words = new Array(count);
+        rows.forEach((row, i) => {
+            starts[i] = row[0];
+            ends[i] = row[1];
+            texts[i] = row[2];
+            words[i] = row[3] || null;
+        });
+        rows.length = 0;
+        let lowerTexts = null;
+        const matches = new Uint8Array(count);
+        let activeIndex = -1;
+        let activeWord = -1;
+        
+        // 時刻の表示形式 (MM:SS)
+        function formatTime(seconds) {
+            const pad = n => String(n).padStart(2, '0');
+            return `${pad(Math.floor(seconds / 60))}:${pad(Math.floor(seconds % 60))}`;
+        }
+        
+        function formatRange(i) {
+            return `${formatTime(starts[i])} - ${formatTime(ends[i])}`;
+        }
+        
+        // 再生位置を含むセグメントを二分探索 (見つからない場合は-1)
+        function findSegment(time) {
+            let lo = 0;
+            let hi = count - 1;
+            let found = -1;
+            while (lo <= hi) {
+                const mid = (lo + hi) >> 1;
+                if (starts[mid] <= time) {
+                    found = mid;
+                    lo = mid + 1;
+                } else {
+                    hi = mid - 1;
+                }
+            }
+            return found >= 0 && time <= ends[found] ? found : -1;
+        }
+        
+        // 仮想リスト: セグメントをブロック単位に分け、表示範囲付近のブロックだけDOMに描画する
+        const blocks = [];
+        const fragment = document.createDocumentFragment();
+        for (let start = 0; start < count; start += BLOCK_SIZE) {
+            const el = document.createElement('div');
+            el.className = 'block';
+            el.dataset.block = blocks.length;
+            const size = Math.min(BLOCK_SIZE, count - start);
+            el.style.height = `${size * ESTIMATED_ROW_HEIGHT}px`;
+            blocks.push({ el, start, end: start + size, rendered: false });
+            fragment.appendChild(el);
+        }
+        transcript.appendChild(fragment);
+        
+        function createRow(i) {
+            const row = document.createElement('div');
+            row.className = 'segment';
+            row.dataset.index = i;
+            row.classList.toggle('active', i === activeIndex);
+            row.classList.toggle('highlight', matches[i] === 1);
+            const timestamp = document.createElement('div');
+            timestamp.className = 'timestamp';
+            timestamp.textContent = formatRange(i);
+            const text = document.createElement('div');
+            text.className = 'text';
+            if (words[i] && texts[i] === words[i][3]) {
+                // 単語ごとに分けて再生中の単語をハイライトできるようにする (編集後は元のテキストのみ)
+                words[i][0].forEach((word, w) => {
+                    const span = document.createElement('span');
+                    span.className = 'word';
+                    span.dataset.word = w;
+                    span.textContent = word;
+                    text.appendChild(span);
+                });
+            } else {
+                text.textContent = texts[i];
+            }
+            const actions = document.createElement('div');
+            actions.className = 'segment-actions';
+            actions.innerHTML = ACTIONS_HTML;
+            row.append(timestamp, text, actions);
+            return row;
+        }
+        
+        function renderBlock(block) {
+            if (block.rendered) return;
+            const rows = [];
+            for (let i = block.start; i < block.end; i++) {
+                rows.push(createRow(i));
+            }
+            block.el.replaceChildren(...rows);
+            block.el.style.height = '';
+            block.rendered = true;
+        }
+        
+        function unrenderBlock(block) {
+            if (!block.rendered) return;
+            // 実際の高さを保ったまま中身を破棄し、スクロール位置がずれないようにする
+            block.el.style.height = `${block.el.offsetHeight}px`;
+            block.el.replaceChildren();
+            block.rendered = false;
+        }
+        
+        const observer = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                const block = blocks[Number(entry.target.dataset.block)];
+                if (entry.isIntersecting) {
+                    renderBlock(block);
+                } else {
+                    unrenderBlock(block);
+                }
+            });
+        }, { root: transcript, rootMargin: '1000px 0px' });
+        blocks.forEach(block => observer.observe(block.el));
+        
+        function findRow(i) {
+            return transcript.querySelector(`.segment[data-index="${i}"]`);
+        }
+        
+        function updateText(i, text) {
+            texts[i] = text;
+            if (lowerTexts) {
+                lowerTexts[i] = text.toLowerCase();
+            }
+        }
+        
+        // ツールチップ作成
+        function createTooltip() {
+            const tooltip = document.createElement('div');
+            tooltip.className = 'tooltip';
+            tooltip.style.display = 'none';
+            document.body.appendChild(tooltip);
+            return tooltip;
+        }
+        
+        // テキストコピー機能
+        function copyToClipboard(text) {
+            navigator.clipboard.writeText(text).then(() => {
+                showTooltip('コピーしました');
+            });
+        }
+        
+        // ツールチップ表示
+        function showTooltip(text, x = null, y = null) {
+            if (!tooltip) {
+                tooltip = createTooltip();
+            }
+            
+            tooltip.textContent = text;
+            tooltip.style.display = 'block';
+            
+            if (x !== null && y !== null) {
+                tooltip.style.left = `${x}px`;
+                tooltip.style.top = `${y}px`;
+            } else {
+                // デフォルト位置（画面中央上部）
+                tooltip.style.left = '50%';
+                tooltip.style.top = '10%';
+                tooltip.style.transform = 'translateX(-50%)';
+            }
+            
+            setTimeout(() => {
+                tooltip.style.display = 'none';
+            }, 2000);
+        }
+        
+        // 検索機能 (入力が止まってからまとめて検索する)
+        let searchTimer = null;
+        function applySearch() {
+            const searchText = searchInput.value.toLowerCase();
+            if (!lowerTexts) {
+                lowerTexts = texts.map(text => text.toLowerCase());
+            }
+            for (let i = 0; i < count; i++) {
+                matches[i] = searchText && lowerTexts[i].includes(searchText) ? 1 : 0;
+            }
+            transcript.querySelectorAll('.segment').forEach(row => {
+                row.classList.toggle('highlight', matches[Number(row.dataset.index)] === 1);
+            });
+        }
+        searchInput.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(applySearch, SEARCH_DELAY);
+        });
+        
+        // セグメントのボタン操作 (再生・編集・コピー)
+        transcript.addEventListener('click', (e) => {
+            const button = e.target.closest('button[data-action]');
+            if (!button) return;
+            e.stopPropagation();
+            const row = button.closest('.segment');
+            const i = Number(row.dataset.index);
+            const textDiv = row.querySelector('.text');
+            switch (button.dataset.action) {
+                case 'play':
+                    player.currentTime = starts[i];
+                    player.play();
+                    break;
+                case 'edit':
+                    textDiv.contentEditable = textDiv.contentEditable === 'true' ? 'false' : 'true';
+                    button.textContent = textDiv.contentEditable === 'true' ? '保存' : '編集';
+                    if (textDiv.contentEditable === 'true') {
+                        player.pause();
+                        textDiv.focus();
+                    }
+                    break;
+                case 'copy':
+                    copyToClipboard(texts[i].trim());
+                    break;
+                case 'copy-ts':
+                    copyToClipboard(`${formatRange(i)} ${texts[i].trim()}`);
+                    break;
+            }
+        });
+        
+        // 編集内容をデータに反映 (ブロックを描画し直しても残るように)
+        transcript.addEventListener('input', (e) => {
+            const row = e.target.closest('.segment');
+            if (row) {
+                updateText(Number(row.dataset.index), e.target.textContent);
+            }
+        });
+        
+        // 全体コピー機能
+        document.getElementById('copy-all').onclick = () => {
+            copyToClipboard(texts.map(text => text.trim()).join('\\n'));
+        };
+        
+        document.getElementById('copy-all-with-timestamps').onclick = () => {
+            copyToClipboard(texts.map((text, i) => `${formatRange(i)} ${text.trim()}`).join('\\n'));
+        };
+        
+        // 再生位置に応じたセグメントのハイライトと自動スクロール
+        function setActive(i) {
+            if (activeIndex >= 0) {
+                const previous = findRow(activeIndex);
+                if (previous) previous.classList.remove('active');
+            }
+            activeIndex = i;
+            renderBlock(blocks[Math.floor(i / BLOCK_SIZE)]);
+            const row = findRow(i);
+            row.classList.add('active');
+            
+            // スクロール位置の調整
+            transcript.scrollTop = row.offsetTop - transcript.offsetTop;
+        }
+        
+        // 再生位置を含む単語を二分探索 (見つからない場合は-1)
+        function findWord(i, time) {
+            const wordStarts = words[i][1];
+            const ms = time * 1000;
+            let lo = 0;
+            let hi = wordStarts.length - 1;
+            let found = -1;
+            while (lo <= hi) {
+                const mid = (lo + hi) >> 1;
+                if (wordStarts[mid] <= ms) {
+                    found = mid;
+                    lo = mid + 1;
+                } else {
+                    hi = mid - 1;
+                }
+            }
+            return found >= 0 && ms <= words[i][2][found] ? found : -1;
+        }
+        
+        function setActiveWord(w) {
+            const row = findRow(activeIndex);
+            if (!row) return;
+            const previous = row.querySelector('.word.current');
+            if (previous) previous.classList.remove('current');
+            activeWord = w;
+            const span = w >= 0 ? row.querySelector(`.word[data-word="${w}"]`) : null;
+            if (span) span.classList.add('current');
+        }
+        
+        player.addEventListener('timeupdate', () => {
+            const i = findSegment(player.currentTime);
+            if (i >= 0 && i !== activeIndex) {
+                setActive(i);
+                activeWord = -1;
+            }
+            if (activeIndex >= 0 && words[activeIndex]) {
+                const w = findWord(activeIndex, player.currentTime);
+                if (w !== activeWord) {
+                    setActiveWord(w);
+                }
+            }
+        });
+    </script>
+</body>
+</html>
+"""
+
+class HtmlTranscriptWriter:
+    """
+    文字起こしHTMLの書き出し
+    テンプレートの先頭・各セグメント・末尾を順にファイルハンドルへ直接書き込むため、
+    セグメント数に関係なくページ全体をメモリ上に組み立てることはない。
+    """
+
+    def __init__(self, f: TextIO, media_file: str, media_src: Optional[str] = None):
+        """
+        HtmlTranscriptWriter初期化
+        Args:
+            f: 書き込み先のファイルハンドル
+            media_file: 再生するメディアのファイル名
+            media_src: HTMLから参照するメディアの相対パス (Noneの場合はmedia_fileのファイル名)
+        """
+        self.f = f
+        self.media_file = media_file
+        self.media_src = media_src
+        self.count = 0
+
+    def write_head(self) -> None:
+        """テンプレートの先頭部分を書き込む"""
+        media_filename = os.path.basename(self.media_file)
+        media_ext = os.path.splitext(media_filename)[1].lower()
+        media_type = 'video' if media_ext in VIDEO_EXTENSIONS else 'audio'
+        mime_type = MIME_TYPES.get(media_ext, f"{media_type}/{media_ext[1:]}")
+        media_src = quote((self.media_src or media_filename).replace(os.sep, '/'))
+        self.f.write(HTML_HEAD.format(
+            title=html.escape(media_filename),
+            media_type=media_type,
+            media_src=html.escape(media_src, quote=True),
+            mime_type=html.escape(mime_type, quote=True),
+        ))
+
+    def write_segment(self, segment: Dict) -> None:
+        """1セグメント分のデータ [開始, 終了, テキスト(, 単語)] を書き込む"""
+        self.write_row(segment['start'], segment['end'], segment['text'], WordTimings.coerce(segment.get('words')))
+
+    def write_row(self, start: float, end: float, text: str, words: Optional[WordTimings] = None) -> None:
+        """開始・終了・テキスト・単語から1セグメント分のデータを書き込む"""
+        text = text.strip()
+        row = [round(start, 3), round(end, 3), text]
+        if words:
+            # 単語の連結がセグメントのテキストと一致する場合のみ単語ごとに表示する
+            row.append([words.words(), words.start_ms.tolist(), words.end_ms.tolist(), words.text.strip()])
+        # </script> や <!-- で埋め込みが途切れないよう < をエスケープする
+        data = json.dumps(row, ensure_ascii=False).replace('<', '\\u003c')
+        if self.count:
+            self.f.write(',')
+        self.f.write(data)
+        self.f.write('\n')
+        self.count += 1
+
+    def write_tail(self) -> None:
+        """テンプレートの末尾部分を書き込む"""
+        self.f.write(HTML_TAIL)
+
+    def write_all(self, segments: Union[Iterable[Dict], Transcript], flush: bool = True) -> None:
+        """
+        ページ全体を書き込む
+        flushがTrueの場合はセグメントごとにディスクへ書き出す
+        Transcriptを渡した場合は配列から直接書き出す
+        """
+        self.write_head()
+        if isinstance(segments, Transcript):
+            has_words = len(segments.word_start_ms) > 0
+            for i, (start, end, text) in enumerate(segments.rows()):
+                self.write_row(start, end, text, segments.words(i) if has_words else None)
+            self.write_tail()
+            return
+        for segment in segments:
+            self.write_segment(segment)
+            if flush:
+                self.f.flush()
+        # 全セグメント出力後にHTMLを閉じる
+        self.write_tail()
@@ -0,0 +1,24 @@
+import sys
+import logging
+from typing import Union
+
+# 設定ファイルで指定するログレベル
+#   debug  : 認識したセグメントもすべて表示する (openai-whisperのverbose=True)
+#   info   : ファイルごとの処理状況を表示する
+#   warning: 警告とエラーのみ
+LOG_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+def configure_logging(level: Union[str, int] = 'info') -> None:
+    """ログ出力の設定 (メッセージのみを標準出力へ出す)"""
+    if isinstance(level, str):
+        level = LOG_LEVELS[level.lower()]
+    logging.basicConfig(format='%(message)s', level=level, stream=sys.stdout, force=True)
+
+def current_level() -> int:
+    """現在のログレベル (ワーカープロセスへ引き継ぐため)"""
+    return logging.getLogger().getEffectiveLevel()
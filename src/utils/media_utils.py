@@ -0,0 +1,107 @@
+import os
+import shutil
+import hashlib
+import logging
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# LinuxのFICLONE ioctl (Btrfs/XFSなどでのreflinkコピー)
+FICLONE = 0x40049409
+
+# 配置方法
+#   auto    : reflink → hardlink → copy の順に試す
+#   reflink : 書き込み時コピーの複製 (対応ファイルシステムのみ)
+#   hardlink: ハードリンク (同じファイルシステム内のみ)
+#   symlink : 相対パスのシンボリックリンク
+#   relative: 配置せずHTMLから元ファイルを相対パスで参照
+#   copy    : 通常のコピー
+PLACEMENT_STRATEGIES = ['auto', 'reflink', 'hardlink', 'symlink', 'relative', 'copy']
+
+def _reflink(source: str, dest: str) -> None:
+    """reflinkによる複製。非対応の場合はOSError"""
+    if fcntl is None:
+        raise OSError("reflink is not supported on this platform")
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(dest)
+            raise
+    shutil.copystat(source, dest)
+
+def _symlink(source: str, dest: str) -> None:
+    """相対パスのシンボリックリンク (ディレクトリごと移動・マウントしても辿れるように)"""
+    os.symlink(os.path.relpath(source, os.path.dirname(dest)), dest)
+
+def _is_placed(source: str, dest: str) -> bool:
+    """destがsourceを配置したものかどうか (リンクは同じファイル、コピーはサイズと更新日時で判定する)"""
+    if not os.path.exists(dest):
+        return False
+    if os.path.samefile(source, dest):
+        return True
+    # copy2・reflinkは更新日時も複製する
+    source_stat, dest_stat = os.stat(source), os.stat(dest)
+    return source_stat.st_size == dest_stat.st_size and source_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+_PLACERS = {
+    'reflink': _reflink,
+    'hardlink': os.link,
+    'symlink': _symlink,
+    'copy': shutil.copy2,
+}
+
+def place_media(source: str, output_dir: str, strategy: str = 'auto') -> Tuple[str, str]:
+    """
+    HTMLから再生するメディアを出力ディレクトリに配置
+    指定した方法が使えない場合はコピーで代替する。
+    Args:
+        source: 元のメディアファイルのパス
+        output_dir: 出力ディレクトリのパス
+        strategy: 配置方法 (PLACEMENT_STRATEGIES)
+    Returns:
+        (HTMLから参照するパス(出力ディレクトリからの相対パス), 実際に使った配置方法)
+    同じ名前の別のファイルが配置済みの場合は上書きせず、元ファイルのパスから求めた名前で配置する
+    (先に作ったHTMLが別のメディアを参照しないように)
+    """
+    if strategy not in PLACEMENT_STRATEGIES:
+        raise ValueError(f"Unknown media placement: {strategy}")
+
+    if strategy == 'relative':
+        return os.path.relpath(source, output_dir), strategy
+
+    media_name = os.path.basename(source)
+    dest = os.path.join(output_dir, media_name)
+    if os.path.lexists(dest) and not os.path.exists(dest):
+        # リンク先が無くなったシンボリックリンク
+        os.remove(dest)
+    if os.path.exists(dest):
+        if _is_placed(source, dest):
+            # 既に配置済み (または出力ディレクトリ内のファイル)
+            return media_name, 'existing'
+        stem, ext = os.path.splitext(media_name)
+        digest = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:8]
+        conflict = media_name
+        media_name = f"{stem}-{digest}{ext}"
+        dest = os.path.join(output_dir, media_name)
+        if _is_placed(source, dest):
+            return media_name, 'existing'
+        logger.warning(f"Media name conflict: {conflict} is another file, placing {source} as {media_name}")
+        if os.path.lexists(dest):
+            # 同じ元ファイルの古い配置 (元ファイルが変わった場合)
+            os.remove(dest)
+
+    candidates = ['reflink', 'hardlink'] if strategy == 'auto' else [strategy]
+    for name in candidates + ['copy']:
+        try:
+            _PLACERS[name](source, dest)
+            return media_name, name
+        except OSError:
+            if name == 'copy':
+                raise
@@ -0,0 +1,62 @@
+import os
+import resource
+import sys
+import threading
+
+def current_rss_bytes() -> int:
+    """現在の常駐メモリ(RSS)のバイト数"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    """プロセス開始からのピーク常駐メモリ(RSS)のバイト数"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxではキロバイト、macOSではバイト単位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class RssSampler:
+    """
+    区間内のピーク常駐メモリ(RSS)の計測
+    ru_maxrssはプロセス開始からの最大値で下がらないため、別スレッドで定期的にRSSを読んで最大値を保持する
+    """
+
+    def __init__(self, interval_sec: float = 0.05):
+        """
+        RssSampler初期化
+        Args:
+            interval_sec: RSSを読む間隔(秒)
+        """
+        self.interval_sec = interval_sec
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self) -> int:
+        """現在のRSSを読んで最大値を更新"""
+        rss = current_rss_bytes()
+        if rss > self.peak:
+            self.peak = rss
+        return rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_sec):
+            self.sample()
+
+    def start(self) -> 'RssSampler':
+        """計測の開始"""
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> int:
+        """計測を終了して区間内のピーク(バイト)を返す"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+        return self.peak
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+from utils.memory_utils import RssSampler, current_rss_bytes
+
+# 計測する処理段階
+#   convert  : 動画などからの音声の抽出 (ffmpeg)
+#   decode   : 音声のデコード (PCMキャッシュの作成・読み込みを含む)
+#   cache    : 文字起こしキャッシュのキー計算と読み込み
+#   vad      : 共通のVADによる音声区間の検出、faster-whisperのVADと特徴量抽出 (transcribeの呼び出し時に先行して実行される)
+#   inference: モデルの推論
+#   media    : HTML出力の再生用メディアの用意と配置
+#   write    : 出力ファイルへの書き出し (HTMLはファイルへ直接書き出すため整形を含む)
+STAGES = ['convert', 'decode', 'cache', 'vad', 'inference', 'media', 'write']
+
+class MetricsRecorder:
+    """
+    ファイルごとの処理段階別の計測
+    file()の中で呼ばれたstage()の時間を段階ごとに合計し、終了時に1ファイル1行のJSON Linesとして追記する。
+    段階が入れ子になった場合は内側の時間を外側から除くため、各段階の時間の合計は処理時間を超えない。
+    """
+
+    def __init__(self, enabled: bool = False, jsonl_path: Optional[str] = None):
+        """
+        MetricsRecorder初期化
+        Args:
+            enabled: 計測するかどうか
+            jsonl_path: 計測結果を追記するJSON Linesファイルのパス (Noneの場合は書き出さない)
+        """
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self._local = threading.local()
+
+    def configure(self, enabled: bool, jsonl_path: Optional[str] = None) -> None:
+        """設定の変更"""
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+
+    def settings(self) -> Dict:
+        """ワーカープロセスへ引き継ぐ設定"""
+        return {'enabled': self.enabled, 'jsonl_path': self.jsonl_path}
+
+    def current(self) -> Optional[Dict]:
+        """計測中のファイルの記録"""
+        return getattr(self._local, 'record', None)
+
+    @contextmanager
+    def file(self, file_path: str, **fields) -> Iterator[Optional[Dict]]:
+        """
+        1ファイル分の計測
+        既に計測中の場合は同じ記録を使う (ドライバーとプロセッサの両方で囲んでも二重にならない)
+        """
+        if not self.enabled or self.current() is not None:
+            if self.current() is not None:
+                self.current().update(fields)
+            yield self.current()
+            return
+        record = {
+            'file': os.path.basename(file_path),
+            'path': file_path,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'stages': {},
+            'segments': 0,
+            'ok': True,
+            **fields,
+        }
+        self._local.record = record
+        self._local.stack = []
+        # ru_maxrssはプロセス全体のピークで、前に処理した大きいファイルの値が残るためファイルの間だけ計測する
+        sampler = self._local.sampler = RssSampler().start()
+        start_time = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record['ok'] = False
+            raise
+        finally:
+            self._local.record = None
+            self._local.sampler = None
+            record['peak_rss_bytes'] = sampler.stop()
+            self._finish(record, time.perf_counter() - start_time)
+
+    def _finish(self, record: Dict, wall_seconds: float) -> None:
+        """記録を確定して書き出す"""
+        record['wall_seconds'] = wall_seconds
+        record['stages']['other'] = max(0.0, wall_seconds - sum(record['stages'].values()))
+        audio_seconds = record.get('audio_seconds') or 0.0
+        record['rtf'] = wall_seconds / audio_seconds if audio_seconds else None
+        record['segments_per_sec'] = record['segments'] / wall_seconds if wall_seconds else None
+        record['rss_bytes'] = current_rss_bytes()
+        if self.jsonl_path:
+            # 1行を1回で追記するため、複数のワーカープロセスから書き込んでも行が混ざらない
+            line = json.dumps(record, ensure_ascii=False) + '\n'
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """処理段階の計測 (計測中のファイルが無い場合は何もしない)"""
+        record = self.current()
+        if record is None:
+            yield
+            return
+        stack = self._local.stack
+        # サンプリングの間隔より短い段階のピークも拾えるよう段階の境目でも読む
+        self._local.sampler.sample()
+        now = time.perf_counter()
+        if stack:
+            # 外側の段階を一時停止する
+            outer = stack[-1]
+            record['stages'][outer[0]] = record['stages'].get(outer[0], 0.0) + now - outer[1]
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._local.sampler.sample()
+            _, resumed = stack.pop()
+            record['stages'][name] = record['stages'].get(name, 0.0) + now - resumed
+            if stack:
+                stack[-1][1] = now
+
+    def timed(self, iterable: Iterable, name: str, count: Optional[str] = None) -> Iterator:
+        """
+        イテレータの各要素の取り出しにかかる時間を段階として計測
+        遅延評価されるセグメントの推論時間を、書き出しなどの消費側の時間と分けて計測するために使う
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            if count:
+                self.add(count)
+            yield item
+
+    def set(self, **fields) -> None:
+        """計測中のファイルの記録に値を設定"""
+        record = self.current()
+        if record is not None:
+            record.update(fields)
+
+    def add(self, name: str, value: float = 1) -> None:
+        """計測中のファイルの記録の値に加算"""
+        record = self.current()
+        if record is not None:
+            record[name] = record.get(name, 0) + value
+
+_metrics = MetricsRecorder()
+
+def get_metrics() -> MetricsRecorder:
+    """プロセス内で共有する計測"""
+    return _metrics
+
+def load_records(jsonl_path: str) -> List[Dict]:
+    """計測結果の読み込み"""
+    if not os.path.exists(jsonl_path):
+        return []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _escape(value: str) -> str:
+    """Prometheusのラベル値のエスケープ (バックスラッシュ・ダブルクォート・改行)"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+def render_prometheus(records: List[Dict]) -> str:
+    """計測結果をPrometheusのテキスト形式に集計"""
+    totals = {}
+    for record in records:
+        key = (record.get('backend') or '', record.get('model') or '')
+        total = totals.setdefault(key, {
+            'ok': 0, 'failed': 0, 'stages': {}, 'audio': 0.0, 'wall': 0.0, 'segments': 0, 'peak': 0
+        })
+        total['ok' if record.get('ok') else 'failed'] += 1
+        for stage, seconds in record.get('stages', {}).items():
+            total['stages'][stage] = total['stages'].get(stage, 0.0) + seconds
+        total['audio'] += record.get('audio_seconds') or 0.0
+        total['wall'] += record.get('wall_seconds') or 0.0
+        total['segments'] += record.get('segments') or 0
+        total['peak'] = max(total['peak'], record.get('peak_rss_bytes') or 0)
+
+    lines = [
+        '# HELP whisper_files_total Processed files.',
+        '# TYPE whisper_files_total counter',
+    ]
+    for (backend, model), total in totals.items():
+        for status in ('ok', 'failed'):
+            lines.append(f"whisper_files_total{{{_labels(backend=backend, model=model, status=status)}}} {total[status]}")
+    metrics = [
+        ('whisper_stage_seconds_total', 'counter', 'Time spent per pipeline stage.'),
+        ('whisper_audio_seconds_total', 'counter', 'Seconds of audio processed.'),
+        ('whisper_wall_seconds_total', 'counter', 'Wall-clock seconds spent processing files.'),
+        ('whisper_segments_total', 'counter', 'Segments produced.'),
+        ('whisper_rtf', 'gauge', 'Processing time divided by audio duration.'),
+        ('whisper_peak_rss_bytes', 'gauge', 'Largest per-file peak resident memory while processing a file.'),
+    ]
+    for name, metric_type, description in metrics:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+        for (backend, model), total in totals.items():
+            labels = _labels(backend=backend, model=model)
+            if name == 'whisper_stage_seconds_total':
+                for stage, seconds in sorted(total['stages'].items()):
+                    lines.append(f"{name}{{{labels},{_labels(stage=stage)}}} {seconds:.6f}")
+            elif name == 'whisper_audio_seconds_total':
+                lines.append(f"{name}{{{labels}}} {total['audio']:.3f}")
+            elif name == 'whisper_wall_seconds_total':
+                lines.append(f"{name}{{{labels}}} {total['wall']:.3f}")
+            elif name == 'whisper_segments_total':
+                lines.append(f"{name}{{{labels}}} {total['segments']}")
+            elif name == 'whisper_rtf':
+                lines.append(f"{name}{{{labels}}} {total['wall'] / total['audio'] if total['audio'] else 0.0:.6f}")
+            elif name == 'whisper_peak_rss_bytes':
+                lines.append(f"{name}{{{labels}}} {total['peak']}")
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(jsonl_path: str, prom_path: str) -> None:
+    """計測結果を集計してPrometheusのテキストファイル (node_exporterのtextfile collector用) に書き出す"""
+    os.makedirs(os.path.dirname(os.path.abspath(prom_path)), exist_ok=True)
+    tmp_path = f"{prom_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_prometheus(load_records(jsonl_path)))
+    os.replace(tmp_path, prom_path)
@@ -0,0 +1,141 @@
+import gc
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.memory_utils import current_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+ModelKey = Tuple[str, str, str, Optional[str]]
+
+class ModelPool:
+    """
+    プロセス内で共有するモデルのレジストリ
+    (backend, name, device, compute_type) をキーにロード済みモデルを再利用し、
+    メモリ上限を超えた場合は最も長く使われていないモデルから解放する(LRU)。
+    """
+
+    def __init__(self, max_memory_mb: float = 0):
+        """
+        ModelPool初期化
+        Args:
+            max_memory_mb: 保持するモデルの合計メモリ上限(MB)。0の場合は無制限
+        """
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self._models: 'OrderedDict[ModelKey, Dict]' = OrderedDict()
+        self._lock = threading.RLock()
+
+    def set_max_memory(self, max_memory_mb: float) -> None:
+        """メモリ上限(MB)の変更"""
+        with self._lock:
+            self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+            self._evict()
+
+    def get(
+        self,
+        backend: str,
+        model_name: str,
+        device: str,
+        compute_type: Optional[str],
+        loader: Callable[[], Any]
+    ) -> Any:
+        """
+        モデルの取得。未ロードの場合はloaderでロードして登録する
+        Args:
+            backend: バックエンド名 ('whisper' or 'faster-whisper')
+            model_name: モデル名
+            device: デバイス ('cpu' or 'cuda')
+            compute_type: 計算精度 (バックエンドが使わない場合はNone)
+            loader: モデルをロードする関数
+        """
+        key = (backend, model_name, device, compute_type)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                entry['hits'] += 1
+                return entry['model']
+
+            rss_before = current_rss_bytes()
+            start_time = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - start_time
+            size_bytes = max(current_rss_bytes() - rss_before, self._parameter_bytes(model))
+
+            self._models[key] = {
+                'model': model,
+                'load_seconds': load_seconds,
+                'size_bytes': size_bytes,
+                'hits': 0,
+            }
+            logger.info(f"Loaded model: {model_name} ({backend}, {device}, {compute_type}) "
+                        f"in {load_seconds:.2f}s, {size_bytes / 1024 / 1024:.1f} MB")
+            self._evict(keep=key)
+            return model
+
+    @staticmethod
+    def _parameter_bytes(model: Any) -> int:
+        """torchモデルのパラメータサイズ (RSSの差分が取れない場合の目安)"""
+        parameters = getattr(model, 'parameters', None)
+        if not callable(parameters):
+            return 0
+        try:
+            return sum(p.numel() * p.element_size() for p in parameters())
+        except Exception:
+            return 0
+
+    def _evict(self, keep: Optional[ModelKey] = None) -> None:
+        """メモリ上限を超えている間、最も古いモデルを解放する"""
+        if not self.max_memory_bytes:
+            return
+        evicted = False
+        while self.total_bytes() > self.max_memory_bytes:
+            key = next((k for k in self._models if k != keep), None)
+            if key is None:
+                break
+            entry = self._models.pop(key)
+            logger.info(f"Evicted model: {key[1]} ({key[0]}, {key[2]}, {key[3]}), "
+                        f"{entry['size_bytes'] / 1024 / 1024:.1f} MB")
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def total_bytes(self) -> int:
+        """保持しているモデルの合計サイズ(バイト)"""
+        return sum(entry['size_bytes'] for entry in self._models.values())
+
+    def stats(self) -> List[Dict]:
+        """ロード済みモデルごとのロード時間とサイズ (古い順)"""
+        with self._lock:
+            return [
+                {
+                    'backend': key[0],
+                    'model': key[1],
+                    'device': key[2],
+                    'compute_type': key[3],
+                    'load_seconds': entry['load_seconds'],
+                    'size_bytes': entry['size_bytes'],
+                    'hits': entry['hits'],
+                }
+                for key, entry in self._models.items()
+            ]
+
+    def report(self) -> None:
+        """ロード済みモデルの一覧をログに出力"""
+        for stat in self.stats():
+            logger.info(f"{stat['backend']:<15} {stat['model']:<10} {stat['device']:<5} {str(stat['compute_type']):<13} "
+                  f"load {stat['load_seconds']:.2f}s  {stat['size_bytes'] / 1024 / 1024:.1f} MB  hits {stat['hits']}")
+
+    def clear(self) -> None:
+        """全モデルを解放"""
+        with self._lock:
+            self._models.clear()
+            gc.collect()
+
+_model_pool = ModelPool()
+
+def get_model_pool() -> ModelPool:
+    """プロセス共通のModelPoolを取得"""
+    return _model_pool
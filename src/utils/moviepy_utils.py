@@ -1,23 +1,145 @@
 import os
-from moviepy.editor import VideoFileClip, AudioFileClip
+import shutil
+import hashlib
+import logging
+import subprocess
+from typing import List, Optional, Tuple
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from utils.metrics_utils import get_metrics
 
-def convert_audio_file(audio_path):
+logger = logging.getLogger(__name__)
+
+# 音声トラックだけを取り出す対象のコンテナ
+VIDEO_EXTENSIONS = ['.mov', '.mp4', '.m4v', '.mkv', '.webm', '.avi']
+EXTRACT_EXTENSIONS = VIDEO_EXTENSIONS + ['.m4a']
+# ブラウザでそのまま再生できる形式
+BROWSER_EXTENSIONS = ['.mp4', '.webm', '.ogg', '.mp3', '.wav', '.m4a']
+
+def get_media_duration(media_path):
+    """メディアファイルの長さ(秒)を取得。取得できない場合は0.0を返す"""
+    try:
+        return float(ffmpeg_parse_infos(media_path).get('duration') or 0.0)
+    except Exception:
+        return 0.0
+
+def _is_up_to_date(dest_path: str, source_path: str) -> bool:
+    """変換済みファイルが元ファイルより新しいかどうか"""
+    return os.path.exists(dest_path) and os.path.getmtime(dest_path) >= os.path.getmtime(source_path)
+
+def _work_path(source_path: str, work_dir: str, extension: str) -> str:
+    """
+    元ファイルに対応する作業ファイルのパス
+    元ファイルのパスと状態(更新日時・サイズ)ごとのディレクトリに置くため、同じ名前の別の入力と衝突せず、
+    元ファイルが変わった場合は別のパスになる。出力ファイル名に使うためファイル名は元ファイルの名前のままにする。
+    同じ元ファイルの古い作業ファイルは削除する。
+    """
+    stat = os.stat(source_path)
+    path_hash = hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:8]
+    state_hash = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8')).hexdigest()[:8]
+    directory = os.path.join(os.path.abspath(work_dir), f"{path_hash}-{state_hash}")
+    if not os.path.isdir(directory):
+        os.makedirs(work_dir, exist_ok=True)
+        for name in os.listdir(work_dir):
+            if name.startswith(f"{path_hash}-"):
+                shutil.rmtree(os.path.join(work_dir, name), ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(directory, base_name + extension)
+
+def _run_ffmpeg(args: List[str]) -> None:
+    """ffmpegの実行 (一時ファイルに書き出してから置き換える)"""
+    dest_path = args[-1]
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp{os.path.splitext(dest_path)[1]}"
+    cmd = ['ffmpeg', '-nostdin', '-y', '-loglevel', 'error'] + args[:-1] + [tmp_path]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"ffmpeg failed: {e.stderr.decode(errors='ignore')}") from e
+    os.replace(tmp_path, dest_path)
+
+def convert_audio_file(audio_path, work_dir='../output/.work'):
+    """
+    文字起こし用の音声ファイルを用意
+    動画や.m4aは映像を再エンコードせず音声トラックだけを16kHzモノラルのPCM(.wav)として取り出す。
+    それ以外の音声ファイルはそのまま返す。元のファイルは削除しない。
+    """
     current_path = os.path.abspath(audio_path)
     file_extension = os.path.splitext(current_path)[-1].lower()
+    if file_extension not in EXTRACT_EXTENSIONS:
+        return current_path
+
+    wav_path = _work_path(current_path, work_dir, '.wav')
+    if not os.path.exists(wav_path):
+        with get_metrics().stage('convert'):
+            _run_ffmpeg([
+                '-i', current_path,
+                '-map', '0:a:0', '-vn',
+                '-ac', '1', '-ar', '16000', '-c:a', 'pcm_s16le',
+                # 同じ入力から同じバイト列を出力するため (キャッシュのキーが変わらないように)
+                '-map_metadata', '-1', '-fflags', '+bitexact',
+                wav_path
+            ])
+    return wav_path
+
+def prepare_browser_media(media_path, work_dir='../output/.work') -> Optional[str]:
+    """
+    HTML出力用のブラウザで再生できるメディアを用意
+    再生できない動画(.movなど)は再エンコードせずmp4コンテナへ入れ替える(リマックス)。
+    リマックスできない場合はNoneを返す。
+    """
+    current_path = os.path.abspath(media_path)
+    file_extension = os.path.splitext(current_path)[-1].lower()
+    if file_extension in BROWSER_EXTENSIONS:
+        return current_path
+    if file_extension not in VIDEO_EXTENSIONS:
+        return None
+
+    mp4_path = _work_path(current_path, work_dir, '.mp4')
+    if not os.path.exists(mp4_path):
+        try:
+            with get_metrics().stage('media'):
+                _run_ffmpeg([
+                    '-i', current_path,
+                    '-map', '0:v:0?', '-map', '0:a:0?',
+                    '-c', 'copy', '-movflags', '+faststart',
+                    mp4_path
+                ])
+        except RuntimeError as e:
+            logger.warning(f"Remux failed: {current_path}: {str(e)}")
+            return None
+    return mp4_path
+
+def prepare_input(audio_path, work_dir='../output/.work', html: bool = False) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    入力ファイルを文字起こし用に変換し、(音声のパス, HTML出力で再生するメディアのパス) を返す
+    音声トラックの無い動画や壊れたファイルなど変換できない場合は、失敗として記録してNoneを返す
+    (1つのファイルの失敗で残りのファイルの処理が止まらないように)
+    """
+    try:
+        current_path = convert_audio_file(audio_path, work_dir)
+        media_path = prepare_browser_media(audio_path, work_dir) if html else None
+    except Exception as e:
+        logger.error(f"Error converting {audio_path}: {str(e)}")
+        get_metrics().set(ok=False, error=str(e))
+        return None
+    return current_path, media_path
 
-    # .movファイルを.mp4に変換
-    if file_extension == '.mov':
-        mp4_path = current_path.replace('.mov', '.mp4')
-        with VideoFileClip(current_path) as clip:
-            clip.write_videofile(mp4_path, codec="libx264")
-        current_path = mp4_path
-        os.remove(audio_path)
-
-    # .m4aファイルを.mp3に変換
-    elif file_extension == '.m4a':
-        mp3_path = current_path.replace('.m4a', '.mp3')
-        with AudioFileClip(current_path) as clip:
-            clip.write_audiofile(mp3_path)
-        current_path = mp3_path
-        os.remove(audio_path)
-    return current_path
\ No newline at end of file
+def make_audio_proxy(media_path, output_dir) -> str:
+    """
+    再生用の軽量な音声のみのプロキシ(.m4a)を出力ディレクトリに作成
+    大きな動画をそのまま配置する代わりに使う
+    """
+    current_path = os.path.abspath(media_path)
+    base_name = os.path.splitext(os.path.basename(current_path))[0]
+    proxy_path = os.path.abspath(os.path.join(output_dir, f"{base_name}_proxy.m4a"))
+    if not _is_up_to_date(proxy_path, current_path):
+        _run_ffmpeg([
+            '-i', current_path,
+            '-map', '0:a:0', '-vn',
+            '-ac', '1', '-c:a', 'aac', '-b:a', '48k',
+            '-movflags', '+faststart',
+            proxy_path
+        ])
+    return proxy_path
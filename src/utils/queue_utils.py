@@ -0,0 +1,180 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+# ジョブの状態
+#   queued : 処理待ち (next_attemptを過ぎたものから取り出す)
+#   running: 処理中
+#   done   : 完了
+#   failed : 再試行の上限に達して失敗
+JOB_STATES = ['queued', 'running', 'done', 'failed']
+
+class JobQueue:
+    """
+    SQLiteによる永続的なジョブキュー
+    プロセスが終了しても未処理のジョブは残り、再起動後に処理を再開できる。
+    同じファイルでも更新日時かサイズが変われば別のジョブとして登録する。
+    失敗したジョブは指数バックオフで再試行する。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        JobQueue初期化
+        Args:
+            db_path: データベースファイルのパス
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        # 読み込みと書き込みが互いを待たないようにする
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                UNIQUE (path, size, mtime_ns)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority, next_attempt)')
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def enqueue(self, path: str, size: int, mtime_ns: int, priority: int = 0) -> Optional[int]:
+        """ジョブを登録してIDを返す。登録済みの場合はNone"""
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO jobs (path, size, mtime_ns, priority, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, size, mtime_ns, priority, now, now)
+            )
+            return cursor.lastrowid if cursor.rowcount else None
+
+    def contains(self, path: str, size: int, mtime_ns: int) -> bool:
+        """同じ状態のファイルが登録済みかどうか"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT 1 FROM jobs WHERE path = ? AND size = ? AND mtime_ns = ?', (path, size, mtime_ns)
+            ).fetchone()
+        return row is not None
+
+    def claim(self) -> Optional[Dict]:
+        """処理できるジョブを1件取り出して処理中にする (優先度の高い順、同じ場合は登録順)"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM jobs WHERE state = 'queued' AND next_attempt <= ? "
+                    "ORDER BY priority DESC, id LIMIT 1", (now,)
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                        (now, row['id'])
+                    )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job['state'] = 'running'
+        job['attempts'] += 1
+        return job
+
+    def complete(self, job_id: int) -> None:
+        """ジョブを完了にする"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'done', error = NULL, updated = ? WHERE id = ?", (time.time(), job_id)
+            )
+
+    def fail(
+        self,
+        job_id: int,
+        error: str,
+        max_attempts: int = 5,
+        backoff_sec: float = 30,
+        backoff_max_sec: float = 3600
+    ) -> str:
+        """
+        ジョブの失敗を記録し、変更後の状態を返す
+        再試行の上限に達していなければ backoff_sec * 2^(試行回数-1) 秒後 (上限backoff_max_sec) に再試行する
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            attempts = row['attempts'] if row else max_attempts
+            if attempts >= max_attempts:
+                state, next_attempt = 'failed', now
+            else:
+                state = 'queued'
+                next_attempt = now + min(backoff_max_sec, backoff_sec * 2 ** (attempts - 1))
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, error = ?, next_attempt = ?, updated = ? WHERE id = ?',
+                (state, error, next_attempt, now, job_id)
+            )
+        return state
+
+    def recover(self) -> int:
+        """前回の終了時に処理中だったジョブを処理待ちに戻し、件数を返す"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET state = 'queued', updated = ? WHERE state = 'running'", (time.time(),)
+            )
+            return cursor.rowcount
+
+    def depth(self) -> int:
+        """未完了(処理待ち・処理中)のジョブ数"""
+        with self.lock:
+            row = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')").fetchone()
+        return row[0]
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        """ジョブの取得"""
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs(self, state: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """ジョブの一覧 (新しい順)"""
+        with self.lock:
+            if state:
+                rows = self.conn.execute(
+                    'SELECT * FROM jobs WHERE state = ? ORDER BY id DESC LIMIT ?', (state, limit)
+                ).fetchall()
+            else:
+                rows = self.conn.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """状態ごとのジョブ数"""
+        with self.lock:
+            rows = self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def retry_failed(self) -> int:
+        """失敗したジョブを試行回数をリセットして処理待ちに戻し、件数を返す"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, next_attempt = 0, updated = ? WHERE state = 'failed'",
+                (time.time(),)
+            )
+            return cursor.rowcount
@@ -0,0 +1,236 @@
+import re
+import multiprocessing
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+
+# 句読点・記号・空白は認識誤りとして数えない
+_IGNORED_CHARS = re.compile(r'[\s、。，．,.!?！？「」『』・…:：;；"\'()（）\[\]]')
+# 単語分割用 (空白は残して句読点のみ除く)
+_WORD_PUNCTUATION = re.compile(r'[、。，．,.!?！？「」『』・…:：;；"()（）\[\]]')
+
+# この大きさ以下の部分問題は全体の表を作って直接アラインメントする
+_FULL_TABLE_CELLS = 1 << 16
+
+# アラインメントの操作 (difflib.SequenceMatcher.get_opcodesと同じ形式)
+Opcode = Tuple[str, int, int, int, int]
+
+def normalize_text(text: str) -> str:
+    """比較用にテキストを正規化 (空白・句読点の除去と英字の小文字化)"""
+    return _IGNORED_CHARS.sub('', text).lower()
+
+def tokenize_words(text: str) -> List[str]:
+    """単語誤り率用の単語分割 (空白区切り。分かち書きされていない日本語にはCERを使う)"""
+    return _WORD_PUNCTUATION.sub(' ', text).lower().split()
+
+def _encode(sequence: Sequence, vocabulary: Dict = None) -> np.ndarray:
+    """比較できるよう整数の配列に変換 (文字列はコードポイント、それ以外は語彙の番号)"""
+    if isinstance(sequence, str):
+        return np.frombuffer(sequence.encode('utf-32-le'), dtype=np.uint32)
+    vocabulary = {} if vocabulary is None else vocabulary
+    return np.array([vocabulary.setdefault(item, len(vocabulary)) for item in sequence], dtype=np.int64)
+
+def _encode_pair(reference: Sequence, hypothesis: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    vocabulary = {}
+    return _encode(reference, vocabulary), _encode(hypothesis, vocabulary)
+
+def _last_row(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    編集距離の表の最終行 (aの全体とbの各接頭辞との距離)
+    行ごとの更新をbの方向にベクトル化する。挿入による行内の依存は
+    cur[j] = min_k(cur[k] + j - k) を累積最小値で一括計算して解消する。
+    """
+    positions = np.arange(len(b) + 1, dtype=np.int64)
+    row = positions.copy()
+    current = np.empty_like(row)
+    for item in a:
+        np.minimum(row[:-1] + (b != item), row[1:] + 1, out=current[1:])
+        current[0] = row[0] + 1
+        current -= positions
+        np.minimum.accumulate(current, out=current)
+        current += positions
+        row, current = current, row
+    return row
+
+def levenshtein(reference: Sequence, hypothesis: Sequence) -> int:
+    """
+    編集距離 (置換・削除・挿入の最小回数)
+    Myersのビット並列アルゴリズム (Hyyröによる編集距離版) で計算する。
+    長い方の系列の各位置を多倍長整数の1ビットに割り当て、表の1列分をまとめて更新する。
+    """
+    # ビット列を長い方、Pythonのループを短い方にする (距離は対称)
+    if len(reference) < len(hypothesis):
+        reference, hypothesis = hypothesis, reference
+    length = len(reference)
+    if length == 0:
+        return len(hypothesis)
+
+    # 要素ごとの出現位置のビットマスク
+    peq = {}
+    for i, item in enumerate(reference):
+        peq[item] = peq.get(item, 0) | (1 << i)
+
+    mask = (1 << length) - 1
+    high = 1 << (length - 1)
+    # 縦方向の差分 (+1 / -1) のビット列
+    pv, mv = mask, 0
+    score = length
+    for item in hypothesis:
+        eq = peq.get(item, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+def _align_full(a: np.ndarray, b: np.ndarray, steps: List[str]) -> None:
+    """小さな部分問題を全体の表からバックトレースしてアラインメント"""
+    n, m = len(a), len(b)
+    positions = np.arange(m + 1, dtype=np.int64)
+    table = np.empty((n + 1, m + 1), dtype=np.int64)
+    table[0] = positions
+    for i in range(1, n + 1):
+        current = table[i]
+        np.minimum(table[i - 1, :-1] + (b != a[i - 1]), table[i - 1, 1:] + 1, out=current[1:])
+        current[0] = i
+        current -= positions
+        np.minimum.accumulate(current, out=current)
+        current += positions
+
+    path = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and table[i, j] == table[i - 1, j - 1] + (a[i - 1] != b[j - 1]):
+            path.append('equal' if a[i - 1] == b[j - 1] else 'replace')
+            i, j = i - 1, j - 1
+        elif i > 0 and table[i, j] == table[i - 1, j] + 1:
+            path.append('delete')
+            i -= 1
+        else:
+            path.append('insert')
+            j -= 1
+    steps.extend(reversed(path))
+
+def _align(a: np.ndarray, b: np.ndarray, steps: List[str]) -> None:
+    """
+    Hirschbergのアルゴリズムによるアラインメント
+    メモリは系列長に比例する分だけで済むため、長い文字起こし同士でも全体の表を持たない
+    """
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a_start, a_end, b_start, b_end = stack.pop()
+        n, m = a_end - a_start, b_end - b_start
+        if n == 0:
+            steps.extend(['insert'] * m)
+            continue
+        if m == 0:
+            steps.extend(['delete'] * n)
+            continue
+        if n == 1 or (n + 1) * (m + 1) <= _FULL_TABLE_CELLS:
+            _align_full(a[a_start:a_end], b[b_start:b_end], steps)
+            continue
+        middle = a_start + n // 2
+        sub_b = b[b_start:b_end]
+        forward = _last_row(a[a_start:middle], sub_b)
+        backward = _last_row(a[middle:a_end][::-1], sub_b[::-1])[::-1]
+        split = b_start + int(np.argmin(forward + backward))
+        # 後半を先に積み、前半から処理されるようにする
+        stack.append((middle, a_end, split, b_end))
+        stack.append((a_start, middle, b_start, split))
+
+def align(reference: Sequence, hypothesis: Sequence) -> List[Opcode]:
+    """
+    編集距離が最小となるアラインメント
+    Returns:
+        (tag, i1, i2, j1, j2) のリスト。tagは 'equal', 'replace', 'delete', 'insert'
+        連続する不一致はまとめ、削除と挿入の両方を含む場合は 'replace' とする
+    """
+    a, b = _encode_pair(reference, hypothesis)
+    steps = []
+    _align(a, b, steps)
+
+    opcodes = []
+    i = j = 0
+    index = 0
+    while index < len(steps):
+        i1, j1 = i, j
+        if steps[index] == 'equal':
+            while index < len(steps) and steps[index] == 'equal':
+                i, j, index = i + 1, j + 1, index + 1
+            opcodes.append(('equal', i1, i, j1, j))
+            continue
+        while index < len(steps) and steps[index] != 'equal':
+            if steps[index] != 'insert':
+                i += 1
+            if steps[index] != 'delete':
+                j += 1
+            index += 1
+        tag = 'replace' if i > i1 and j > j1 else ('delete' if i > i1 else 'insert')
+        opcodes.append((tag, i1, i, j1, j))
+    return opcodes
+
+def character_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """正規化後の文字単位の (誤り数, 参照文字数)"""
+    reference = normalize_text(reference)
+    hypothesis = normalize_text(hypothesis)
+    return levenshtein(reference, hypothesis), len(reference)
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """単語単位の (誤り数, 参照単語数)"""
+    reference_words = tokenize_words(reference)
+    return levenshtein(reference_words, tokenize_words(hypothesis)), len(reference_words)
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """文字誤り率 (CER)"""
+    errors, total = character_errors(reference, hypothesis)
+    return errors / total if total else float(bool(errors))
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """単語誤り率 (WER)"""
+    errors, total = word_errors(reference, hypothesis)
+    return errors / total if total else float(bool(errors))
+
+def _score_pair(pair: Tuple[str, str]) -> Dict:
+    reference, hypothesis = pair
+    char_errors, chars = character_errors(reference, hypothesis)
+    word_error_count, words = word_errors(reference, hypothesis)
+    return {'char_errors': char_errors, 'chars': chars, 'word_errors': word_error_count, 'words': words}
+
+def evaluate_corpus(pairs: Iterable[Tuple[str, str]], workers: int = 0) -> Dict:
+    """
+    参照テキストと認識結果の組をまとめて評価
+    Args:
+        pairs: (参照テキスト, 認識結果) の組
+        workers: 並列に評価するプロセス数 (0の場合はCPU数、1の場合は並列化しない)
+    Returns:
+        コーパス全体のCER/WER (誤り数の合計 / 参照長の合計) と組ごとの結果
+    """
+    pairs = list(pairs)
+    workers = workers or multiprocessing.cpu_count()
+    if workers > 1 and len(pairs) > 1:
+        with multiprocessing.get_context('spawn').Pool(min(workers, len(pairs))) as pool:
+            # 長さの偏りがあっても負荷が偏らないよう小さな単位で配る
+            items = pool.map(_score_pair, pairs, chunksize=max(1, len(pairs) // (workers * 4)))
+    else:
+        items = [_score_pair(pair) for pair in pairs]
+
+    char_errors = sum(item['char_errors'] for item in items)
+    chars = sum(item['chars'] for item in items)
+    word_error_count = sum(item['word_errors'] for item in items)
+    words = sum(item['words'] for item in items)
+    return {
+        'cer': char_errors / chars if chars else 0.0,
+        'wer': word_error_count / words if words else 0.0,
+        'char_errors': char_errors,
+        'chars': chars,
+        'word_errors': word_error_count,
+        'words': words,
+        'items': items,
+    }
@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from utils.transcript_utils import Transcript, SUFFIX as TRANSCRIPT_SUFFIX
+
+# 文字のn-gramで索引付けする文字 (ひらがな・カタカナ・漢字)。単語の区切りが無いため2文字ずつ区切る
+CJK_CHARS = '々〆぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ'
+TOKEN_PATTERN = re.compile(rf'(?P<cjk>[{CJK_CHARS}]+)|(?P<word>(?:(?![{CJK_CHARS}])[^\W_])+)')
+
+# 同じ文字起こしが複数の形式で出力されている場合に索引付けする形式の優先順
+SOURCE_PRIORITY = [TRANSCRIPT_SUFFIX, '.html', '.txt', '.srt']
+
+# txt出力の行 ([HH:MM:SS.mmm] -> [HH:MM:SS.mmm]: テキスト / [MM:SS] テキスト)
+FULL_LINE = re.compile(r'^\[(\d+):(\d+):(\d+)\.(\d+)\] -> \[(\d+):(\d+):(\d+)\.(\d+)\]: ?(.*)$')
+SIMPLE_LINE = re.compile(r'^\[(\d+):(\d+)\] (.*)$')
+SRT_TIME = re.compile(r'(\d+):(\d+):(\d+),(\d+) --> (\d+):(\d+):(\d+),(\d+)')
+HTML_DATA = re.compile(r'<script type="application/json" id="transcript-data">(.*?)</script>', re.S)
+
+logger = logging.getLogger(__name__)
+
+def normalize(text: str) -> str:
+    """検索用の正規化 (全角・半角の統一と大文字・小文字の区別をなくす)"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+def tokenize(text: str) -> List[str]:
+    """
+    正規化済みのテキストを索引の語に分割
+    日本語の連続部分は2文字ずつのn-gramに、最後の1文字は1文字の語にもする (1文字での検索のため)。英数字は単語ごと
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text):
+        if match.group('word'):
+            terms.append(match.group('word'))
+            continue
+        run = match.group('cjk')
+        terms += [run[i:i + 2] for i in range(len(run) - 1)]
+        terms.append(run[-1])
+    return terms
+
+def format_position(seconds: Optional[float]) -> str:
+    """検索結果の開始時刻を[HH:MM:SS.mmm]形式に変換 (時刻の無い行は空欄)"""
+    if seconds is None:
+        return '[--:--:--.---]'
+    milliseconds = max(0, int(round(seconds * 1000)))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"[{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}]"
+
+def _seconds(hours: str, minutes: str, seconds: str, fraction: str = '0') -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction) / (10 ** len(fraction))
+
+def read_segments(path: str) -> Iterator[Tuple[Optional[float], Optional[float], str]]:
+    """出力ファイルから (開始秒, 終了秒, テキスト) を読み出す (時刻の無いtxtの行はNone)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == TRANSCRIPT_SUFFIX:
+        yield from Transcript.load(path).rows()
+    elif ext == '.html':
+        with open(path, 'r', encoding='utf-8') as f:
+            match = HTML_DATA.search(f.read())
+        if match:
+            for row in json.loads(match.group(1)):
+                yield row[0], row[1], row[2]
+    elif ext == '.srt':
+        with open(path, 'r', encoding='utf-8') as f:
+            for block in f.read().split('\n\n'):
+                lines = block.strip().splitlines()
+                times = SRT_TIME.search(lines[1]) if len(lines) >= 3 else None
+                if times:
+                    values = times.groups()
+                    yield _seconds(*values[:4]), _seconds(*values[4:]), ' '.join(lines[2:])
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                match = FULL_LINE.match(line)
+                if match:
+                    values = match.groups()
+                    yield _seconds(*values[:4]), _seconds(*values[4:8]), values[8]
+                    continue
+                match = SIMPLE_LINE.match(line)
+                if match:
+                    yield _seconds('0', match.group(1), match.group(2)), None, match.group(3)
+                elif line.strip():
+                    yield None, None, line
+
+class SearchIndex:
+    """
+    文字起こし結果の全文検索の転置索引 (SQLite)
+    語からセグメントへの対応(postings)を保持し、検索語のすべての語を含むセグメントを絞り込んでから元のテキストで照合する。
+    ファイルの更新日時とサイズを記録し、変更のあったファイルだけを索引し直す。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        SearchIndex初期化
+        Args:
+            db_path: データベースファイルのパス
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                segments INTEGER NOT NULL,
+                indexed REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                doc_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                start REAL,
+                end REAL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS segments_doc ON segments (doc_id);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                segment_id INTEGER NOT NULL,
+                PRIMARY KEY (term, segment_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_segment ON postings (segment_id);
+        ''')
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _remove(self, doc_id: int) -> None:
+        self.conn.execute('DELETE FROM postings WHERE segment_id IN (SELECT id FROM segments WHERE doc_id = ?)', (doc_id,))
+        self.conn.execute('DELETE FROM segments WHERE doc_id = ?', (doc_id,))
+        self.conn.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
+
+    def add(self, path: str, name: Optional[str] = None) -> int:
+        """ファイルを索引付けする (索引済みの場合は置き換える)。セグメント数を返す"""
+        stat = os.stat(path)
+        segments = list(read_segments(path))
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT id FROM documents WHERE path = ?', (path,)).fetchone()
+                if row:
+                    self._remove(row['id'])
+                doc_id = self.conn.execute(
+                    'INSERT INTO documents (path, name, size, mtime_ns, segments, indexed) VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, name or os.path.splitext(os.path.basename(path))[0], stat.st_size, stat.st_mtime_ns,
+                     len(segments), time.time())
+                ).lastrowid
+                for seq, (start, end, text) in enumerate(segments):
+                    segment_id = self.conn.execute(
+                        'INSERT INTO segments (doc_id, seq, start, end, text) VALUES (?, ?, ?, ?, ?)',
+                        (doc_id, seq, start, end, text.strip())
+                    ).lastrowid
+                    self.conn.executemany(
+                        'INSERT OR IGNORE INTO postings (term, segment_id) VALUES (?, ?)',
+                        [(term, segment_id) for term in set(tokenize(normalize(text)))]
+                    )
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return len(segments)
+
+    def remove(self, path: str) -> bool:
+        """ファイルを索引から削除"""
+        with self.lock:
+            row = self.conn.execute('SELECT id FROM documents WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                return False
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._remove(row['id'])
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return True
+
+    def update(self, directories: Iterable[str]) -> Dict[str, int]:
+        """
+        ディレクトリ内の出力ファイルを索引に反映する (追加・変更されたものだけを索引し直し、削除されたものを除く)
+        同じ名前の結果が複数の形式で出力されている場合はSOURCE_PRIORITYの順に1つだけを使う
+        Returns:
+            件数 (added, updated, removed, unchanged)
+        """
+        chosen = {}
+        for directory in directories:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if not entry.is_file() or ext not in SOURCE_PRIORITY or entry.name.startswith('.'):
+                    continue
+                current = chosen.get(stem)
+                if current is None or SOURCE_PRIORITY.index(ext) < SOURCE_PRIORITY.index(current[1]):
+                    chosen[stem] = (entry.path, ext, entry.stat())
+
+        with self.lock:
+            indexed = {row['path']: row for row in self.conn.execute('SELECT id, path, size, mtime_ns FROM documents')}
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        wanted = set()
+        for stem, (path, _ext, stat) in sorted(chosen.items()):
+            wanted.add(path)
+            row = indexed.get(path)
+            if row is not None and row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+                counts['unchanged'] += 1
+                continue
+            try:
+                self.add(path, stem)
+            except (OSError, ValueError) as e:
+                # 書き込み途中などで読めないファイルは次回に回す
+                logger.warning(f"Index error: {path}: {str(e)}")
+                continue
+            counts['updated' if row is not None else 'added'] += 1
+        for path in indexed:
+            if path not in wanted:
+                self.remove(path)
+                counts['removed'] += 1
+        return counts
+
+    def _candidates(self, terms: List[str]) -> Optional[Set[int]]:
+        """すべての語を含むセグメントのID (語が無い場合はNone)"""
+        candidates = None
+        # 該当の少ない語から絞り込む
+        postings = []
+        for term in set(terms):
+            if len(term) == 1 and TOKEN_PATTERN.fullmatch(term) and TOKEN_PATTERN.fullmatch(term).group('cjk'):
+                # 1文字の語はその文字で始まる語すべてを対象にする
+                rows = self.conn.execute(
+                    'SELECT DISTINCT segment_id FROM postings WHERE term >= ? AND term < ?', (term, term + '\U0010ffff')
+                )
+            else:
+                rows = self.conn.execute('SELECT segment_id FROM postings WHERE term = ?', (term,))
+            postings.append({row[0] for row in rows})
+            if not postings[-1]:
+                return set()
+        for ids in sorted(postings, key=len):
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query: str, limit: int = 50, name_filter: Optional[str] = None) -> List[Dict]:
+        """
+        検索語を含むセグメントを返す (ファイル名・開始時刻順)
+        索引の語で絞り込んだ後、正規化したテキストに検索語がそのまま含まれるものだけを返す
+        Args:
+            query: 検索語
+            limit: 返す件数の上限
+            name_filter: ファイル名に含まれる文字列で絞り込む
+        """
+        needle = normalize(query).strip()
+        terms = tokenize(needle)
+        if not terms:
+            return []
+        with self.lock:
+            candidates = self._candidates(terms)
+            if not candidates:
+                return []
+            hits = []
+            ids = sorted(candidates)
+            # SQLiteの変数の上限を超えないよう分けて取り出す
+            for chunk_start in range(0, len(ids), 500):
+                chunk = ids[chunk_start:chunk_start + 500]
+                rows = self.conn.execute(
+                    f'''SELECT documents.path, documents.name, segments.seq, segments.start, segments.end, segments.text
+                        FROM segments JOIN documents ON documents.id = segments.doc_id
+                        WHERE segments.id IN ({','.join('?' * len(chunk))})''',
+                    chunk
+                )
+                for row in rows:
+                    if name_filter and name_filter not in row['name']:
+                        continue
+                    if needle in normalize(row['text']):
+                        hits.append(dict(row))
+        hits.sort(key=lambda hit: (hit['name'], hit['seq']))
+        return hits[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        """索引の件数"""
+        with self.lock:
+            return {
+                'documents': self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0],
+                'segments': self.conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0],
+                'postings': self.conn.execute('SELECT COUNT(*) FROM postings').fetchone()[0],
+            }
+
+def update_index(db_path: str, directories: Iterable[str]) -> Dict[str, int]:
+    """索引を開いて出力ディレクトリの内容を反映する (文字起こしの処理の最後に呼ぶ)"""
+    index = SearchIndex(db_path)
+    try:
+        counts = index.update(directories)
+    finally:
+        index.close()
+    logger.info(f"Search index updated: {counts['added']} added, {counts['updated']} updated, {counts['removed']} removed")
+    return counts
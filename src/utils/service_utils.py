@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import heapq
+import uuid
+import logging
+import itertools
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+from utils.batch_utils import create_worker_pool, transcribe_file_in_worker, warm_up
+
+logger = logging.getLogger(__name__)
+
+class ServiceBusy(Exception):
+    """受け付け可能なジョブ数を超えた場合の例外"""
+
+class TranscriptionService:
+    """
+    文字起こしサービス
+    (バックエンド, モデル) ごとにモデルをロード済みのワーカープロセスを常駐させ、
+    受け付けたジョブを優先度の高い順 (同じ場合は受け付け順) に空いているワーカーへ割り当てる。
+    セグメントはジョブごとのJSON Linesファイルに逐次書き出され、処理中でも読み出せる。
+    """
+
+    def __init__(
+        self,
+        pools: List[Dict],
+        processor_classes: Dict[str, Type],
+        processor_kwargs: Dict,
+        model_kwargs: Dict,
+        work_dir: str,
+        max_pending: int = 100
+    ):
+        """
+        TranscriptionService初期化
+        Args:
+            pools: ワーカープールの設定 ({'backend', 'model', 'workers'} のリスト。先頭が既定)
+            processor_classes: バックエンド名からプロセッサクラスへの対応
+            processor_kwargs: プロセッサの初期化引数
+            model_kwargs: set_modelに渡す追加引数
+            work_dir: アップロードされた音声とセグメントの保存先
+            max_pending: 処理待ちのジョブ数の上限 (超えた場合は受け付けない)
+        """
+        self.work_dir = work_dir
+        self.max_pending = max_pending
+        self.default_pool = (pools[0]['backend'], pools[0]['model'])
+        os.makedirs(work_dir, exist_ok=True)
+
+        self.jobs: Dict[str, Dict] = {}
+        self.pending: Dict[Tuple[str, str], List] = {}
+        self.running: Dict[Tuple[str, str], int] = {}
+        self.workers: Dict[Tuple[str, str], int] = {}
+        self.executors = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.closed = False
+
+        self.pool_args = {}
+        for pool in pools:
+            key = (pool['backend'], pool['model'])
+            self.pool_args[key] = (
+                processor_classes[pool['backend']], processor_kwargs, pool['model'], model_kwargs, pool['workers']
+            )
+            # 起動時にロードしておき、最初のジョブからモデルのロードを待たない
+            self.executors[key] = create_worker_pool(*self.pool_args[key])
+            warm_up(self.executors[key], pool['workers'])
+            self.workers[key] = pool['workers']
+            self.pending[key] = []
+            self.running[key] = 0
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def pools(self) -> List[Dict]:
+        """ワーカープールの状態"""
+        with self.condition:
+            return [
+                {
+                    'backend': key[0],
+                    'model': key[1],
+                    'workers': self.workers[key],
+                    'running': self.running[key],
+                    'pending': len(self.pending[key]),
+                }
+                for key in self.executors
+            ]
+
+    def submit(
+        self,
+        source_path: str,
+        filename: str,
+        backend: Optional[str] = None,
+        model: Optional[str] = None,
+        language: str = 'ja',
+        priority: int = 0
+    ) -> Dict:
+        """
+        ジョブを受け付ける
+        Args:
+            source_path: アップロードされた音声のパス (サービスが引き取り、ジョブの削除時に消す)
+            filename: 元のファイル名
+            backend: バックエンド (Noneの場合は既定のプール)
+            model: モデル名 (Noneの場合は既定のプール)
+            language: 言語
+            priority: 優先度 (大きいほど先に処理する)
+        Returns:
+            ジョブの状態
+        """
+        # 指定された条件に合う最初のプールを使う
+        candidates = [
+            key for key in self.executors
+            if (backend is None or key[0] == backend) and (model is None or key[1] == model)
+        ]
+        if not candidates:
+            raise ValueError(f"Unknown backend/model: {backend}/{model}")
+        key = self.default_pool if self.default_pool in candidates else candidates[0]
+        with self.condition:
+            if self.closed:
+                raise ServiceBusy("service is shutting down")
+            pending = sum(len(items) for items in self.pending.values())
+            if pending >= self.max_pending:
+                raise ServiceBusy(f"too many pending jobs ({pending})")
+            job_id = uuid.uuid4().hex
+            job = {
+                'id': job_id,
+                'filename': filename,
+                'backend': key[0],
+                'model': key[1],
+                'language': language,
+                'priority': priority,
+                'state': 'queued',
+                'error': None,
+                'segments': 0,
+                'submitted': time.time(),
+                'started': None,
+                'finished': None,
+                'source_path': source_path,
+                'segments_path': os.path.join(self.work_dir, f"{job_id}.jsonl"),
+            }
+            self.jobs[job_id] = job
+            heapq.heappush(self.pending[key], (-priority, next(self.sequence), job_id))
+            self.condition.notify_all()
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """ジョブの状態 (処理待ちの場合は順番も含む)"""
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = {name: value for name, value in job.items() if not name.endswith('_path')}
+            if job['state'] == 'queued':
+                key = (job['backend'], job['model'])
+                status['position'] = sorted(self.pending[key]).index(
+                    next(item for item in self.pending[key] if item[2] == job_id)
+                )
+            return status
+
+    def _dispatch(self) -> None:
+        """空いているワーカーへ処理待ちのジョブを割り当てる"""
+        while True:
+            with self.condition:
+                while not self.closed and not any(
+                    self.pending[key] and self.running[key] < self.workers[key] for key in self.executors
+                ):
+                    self.condition.wait()
+                if self.closed:
+                    return
+                for key in self.executors:
+                    while self.pending[key] and self.running[key] < self.workers[key]:
+                        _, _, job_id = heapq.heappop(self.pending[key])
+                        job = self.jobs[job_id]
+                        job['state'] = 'running'
+                        job['started'] = time.time()
+                        self.running[key] += 1
+                        args = (job['source_path'], self.work_dir, job['segments_path'], job['language'])
+                        try:
+                            future = self.executors[key].submit(transcribe_file_in_worker, *args)
+                        except BrokenProcessPool:
+                            # ワーカーが異常終了した場合はプールを作り直す
+                            logger.warning(f"Restarting worker pool: {key[0]}/{key[1]}")
+                            self.executors[key].shutdown(wait=False, cancel_futures=True)
+                            self.executors[key] = create_worker_pool(*self.pool_args[key])
+                            future = self.executors[key].submit(transcribe_file_in_worker, *args)
+                        future.add_done_callback(lambda future, job_id=job_id: self._finish(job_id, future))
+
+    def _finish(self, job_id: str, future) -> None:
+        """ジョブの完了を記録"""
+        with self.condition:
+            job = self.jobs[job_id]
+            self.running[(job['backend'], job['model'])] -= 1
+            job['finished'] = time.time()
+            try:
+                job['segments'] = future.result()
+                job['state'] = 'done'
+            except Exception as e:
+                job['state'] = 'failed'
+                job['error'] = str(e) or type(e).__name__
+            self.condition.notify_all()
+        logger.info(f"Job {job['state']}: {job_id} {job['filename']} ({job['finished'] - job['started']:.2f}s)")
+
+    def segments(self, job_id: str) -> List[Dict]:
+        """書き出し済みのセグメント"""
+        job = self.jobs[job_id]
+        if not os.path.exists(job['segments_path']):
+            return []
+        with open(job['segments_path'], 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.endswith('\n')]
+
+    def follow(self, job_id: str, poll_sec: float = 0.2) -> Iterator[Dict]:
+        """セグメントを書き出された順に返し、ジョブが終わるまで待ち続ける"""
+        job = self.jobs[job_id]
+        position = 0
+        while True:
+            finished = job['state'] in ('done', 'failed')
+            if os.path.exists(job['segments_path']):
+                with open(job['segments_path'], 'r', encoding='utf-8') as f:
+                    f.seek(position)
+                    while True:
+                        line = f.readline()
+                        # 書き込み途中の行は次に回す
+                        if not line.endswith('\n'):
+                            break
+                        position = f.tell()
+                        yield json.loads(line)
+            if finished:
+                return
+            with self.condition:
+                self.condition.wait(poll_sec)
+
+    def delete(self, job_id: str) -> bool:
+        """完了したジョブと音声・セグメントのファイルを削除"""
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None or job['state'] in ('queued', 'running'):
+                return False
+            del self.jobs[job_id]
+        for path in (job['source_path'], job['segments_path']):
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+    def close(self) -> None:
+        """受け付けを止め、処理中のジョブの完了を待ってワーカーを終了する"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for executor in self.executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,52 @@
+from typing import Dict, Iterable, TextIO
+from utils.word_utils import WordTimings
+
+def format_srt_timestamp(seconds: float) -> str:
+    """秒数をSRTの時刻 (HH:MM:SS,mmm) に変換"""
+    milliseconds = max(0, int(round(seconds * 1000)))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+class SrtWriter:
+    """
+    SRT字幕の書き出し
+    単語のタイムスタンプがあるセグメントは単語ごとに、無いセグメントはセグメントごとに1つの字幕にする。
+    """
+
+    def __init__(self, f: TextIO):
+        """
+        SrtWriter初期化
+        Args:
+            f: 書き込み先のファイルハンドル
+        """
+        self.f = f
+        self.count = 0
+
+    def write_cue(self, start: float, end: float, text: str) -> None:
+        """1つの字幕を書き込む"""
+        text = text.strip()
+        if not text:
+            return
+        self.count += 1
+        self.f.write(f"{self.count}\n{format_srt_timestamp(start)} --> {format_srt_timestamp(end)}\n{text}\n\n")
+
+    def write_segment(self, segment: Dict) -> None:
+        """1セグメント分の字幕を書き込む"""
+        words = WordTimings.coerce(segment.get('words'))
+        if not words:
+            self.write_cue(segment['start'], segment['end'], segment['text'])
+            return
+        for word, start, end in words:
+            self.write_cue(start, end, word)
+
+    def write_all(self, segments: Iterable[Dict], flush: bool = True) -> None:
+        """
+        全セグメントを書き込む
+        flushがTrueの場合はセグメントごとにディスクへ書き出す
+        """
+        for segment in segments:
+            self.write_segment(segment)
+            if flush:
+                self.f.flush()
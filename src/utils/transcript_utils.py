@@ -0,0 +1,363 @@
+import os
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from utils.word_utils import WordTimings
+
+# バイナリ形式 (.wtr)
+#   ヘッダー: マジック, バージョン, セグメント数, テキストのバイト数, 単語数, 単語テキストのバイト数, メタ情報のバイト数
+#   続けて以下の順に各領域を8バイト境界に揃えて並べる (すべてリトルエンディアン)
+#     meta(JSON), start(float32), end(float32), text_offsets(int64), text(UTF-8),
+#     word_index(int64), word_offsets(int64), word_start_ms(int32), word_end_ms(int32), word_probability(float16), word_text(UTF-8)
+MAGIC = b'WTRN'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQQQQ')
+SUFFIX = '.wtr'
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+def _layout(count: int, text_bytes: int, word_count: int, word_text_bytes: int, meta_bytes: int) -> List[Tuple[str, np.dtype, int]]:
+    """各領域の (名前, 型, 要素数)"""
+    return [
+        ('meta', np.dtype(np.uint8), meta_bytes),
+        ('start', np.dtype('<f4'), count),
+        ('end', np.dtype('<f4'), count),
+        ('text_offsets', np.dtype('<i8'), count + 1),
+        ('text', np.dtype(np.uint8), text_bytes),
+        ('word_index', np.dtype('<i8'), count + 1),
+        ('word_offsets', np.dtype('<i8'), word_count + 1),
+        ('word_start_ms', np.dtype('<i4'), word_count),
+        ('word_end_ms', np.dtype('<i4'), word_count),
+        ('word_probability', np.dtype('<f2'), word_count),
+        ('word_text', np.dtype(np.uint8), word_text_bytes),
+    ]
+
+def _write_file(path: str, meta: Dict, counts: Tuple[int, int, int, int], columns: Dict[str, Union[np.ndarray, BinaryIO]]) -> None:
+    """
+    バイナリ形式のファイルを書き出す (書き込み途中のファイルが読まれないよう一時ファイルから置き換える)
+    Args:
+        path: 保存先のパス
+        meta: メタ情報
+        counts: (セグメント数, テキストのバイト数, 単語数, 単語テキストのバイト数)
+        columns: 各領域の配列、または先頭から書き出し済みのリトルエンディアンの値を持つファイル
+    """
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    columns = dict(columns, meta=np.frombuffer(meta_bytes, dtype=np.uint8))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, *counts, len(meta_bytes)))
+        position = HEADER.size
+        for name, dtype, count in _layout(*counts, len(meta_bytes)):
+            f.write(b'\0' * (_align(position) - position))
+            position = _align(position)
+            column = columns[name]
+            if isinstance(column, np.ndarray):
+                data = np.ascontiguousarray(column, dtype=dtype).tobytes()
+                f.write(data)
+                size = len(data)
+            else:
+                column.seek(0)
+                shutil.copyfileobj(column, f)
+                size = f.tell() - position
+            assert size == dtype.itemsize * count, name
+            position += size
+    os.replace(tmp_path, path)
+
+class Transcript:
+    """
+    列指向の文字起こし結果
+    セグメントの開始・終了をfloat32の配列、テキストを1つのUTF-8のバッファと区切り位置で保持する。
+    単語のタイムスタンプも同様に全セグメント分を1つの配列にまとめ、セグメントごとの範囲をword_indexで引く。
+    load()はファイルをメモリマップして各配列をコピーせずに参照するため、件数に関係なくすぐに読み込める。
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Optional[Dict] = None):
+        """
+        Transcript初期化
+        Args:
+            arrays: 各領域の配列 (_layoutの名前をキーとする。metaは除く)
+            meta: メタ情報 (音声ファイル名・モデルなど)
+        """
+        self.start = arrays['start']
+        self.end = arrays['end']
+        self.text_offsets = arrays['text_offsets']
+        self.text_buffer = arrays['text']
+        self.word_index = arrays['word_index']
+        self.word_offsets = arrays['word_offsets']
+        self.word_start_ms = arrays['word_start_ms']
+        self.word_end_ms = arrays['word_end_ms']
+        self.word_probability = arrays['word_probability']
+        self.word_text_buffer = arrays['word_text']
+        self.meta = meta or {}
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Dict], meta: Optional[Dict] = None) -> 'Transcript':
+        """セグメントの辞書から作成 (wordsはWordTimingsまたはその辞書形式)"""
+        starts = []
+        ends = []
+        text = bytearray()
+        text_offsets = [0]
+        word_index = [0]
+        word_text = bytearray()
+        word_offsets = [0]
+        word_starts = []
+        word_ends = []
+        word_probabilities = []
+        for segment in segments:
+            starts.append(segment['start'])
+            ends.append(segment['end'])
+            text += segment['text'].encode('utf-8')
+            text_offsets.append(len(text))
+            words = WordTimings.coerce(segment.get('words'))
+            if words:
+                for word in words.words():
+                    word_text += word.encode('utf-8')
+                    word_offsets.append(len(word_text))
+                word_starts.append(words.start_ms)
+                word_ends.append(words.end_ms)
+                word_probabilities.append(
+                    words.probabilities if words.probabilities is not None else np.zeros(len(words), dtype=np.float16)
+                )
+            word_index.append(len(word_offsets) - 1)
+
+        def concat(parts: List[np.ndarray], dtype: str) -> np.ndarray:
+            return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+        return cls({
+            'start': np.asarray(starts, dtype='<f4'),
+            'end': np.asarray(ends, dtype='<f4'),
+            'text_offsets': np.asarray(text_offsets, dtype='<i8'),
+            'text': np.frombuffer(bytes(text), dtype=np.uint8),
+            'word_index': np.asarray(word_index, dtype='<i8'),
+            'word_offsets': np.asarray(word_offsets, dtype='<i8'),
+            'word_start_ms': concat(word_starts, '<i4'),
+            'word_end_ms': concat(word_ends, '<i4'),
+            'word_probability': concat(word_probabilities, '<f2'),
+            'word_text': np.frombuffer(bytes(word_text), dtype=np.uint8),
+        }, meta)
+
+    @classmethod
+    def from_jsonl(cls, path: str, meta: Optional[Dict] = None) -> 'Transcript':
+        """セグメントのJSON Lines (キャッシュのエントリやサービスのセグメント) から作成"""
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if records and 'meta' in records[0]:
+            # キャッシュのエントリは先頭行がメタ情報
+            meta = {**records.pop(0)['meta'], **(meta or {})}
+        return cls.from_segments(records, meta)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def text(self, i: int) -> str:
+        """i番目のセグメントのテキスト"""
+        return self.text_buffer[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode('utf-8')
+
+    def texts(self) -> List[str]:
+        """全セグメントのテキスト (バッファを1回だけデコードして区切る)"""
+        data = self.text_buffer.tobytes()
+        offsets = self.text_offsets.tolist()
+        return [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def words(self, i: int) -> Optional[WordTimings]:
+        """i番目のセグメントの単語のタイムスタンプ (無い場合はNone)"""
+        first, last = int(self.word_index[i]), int(self.word_index[i + 1])
+        if first == last:
+            return None
+        offsets = self.word_offsets[first:last + 1]
+        data = self.word_text_buffer[offsets[0]:offsets[-1]].tobytes()
+        relative = (offsets - offsets[0]).tolist()
+        words = [data[start:end].decode('utf-8') for start, end in zip(relative[:-1], relative[1:])]
+        char_offsets = np.zeros(len(words) + 1, dtype=np.int32)
+        np.cumsum([len(word) for word in words], out=char_offsets[1:])
+        return WordTimings(
+            ''.join(words), char_offsets,
+            self.word_start_ms[first:last], self.word_end_ms[first:last], self.word_probability[first:last]
+        )
+
+    def rows(self) -> Iterator[Tuple[float, float, str]]:
+        """(開始秒, 終了秒, テキスト) を順に返す (辞書を作らずに出力する場合に使う)"""
+        # float32の誤差でミリ秒の表示がずれないよう、元の精度(ミリ秒)に丸める
+        starts = np.round(self.start.astype(np.float64), 3).tolist()
+        ends = np.round(self.end.astype(np.float64), 3).tolist()
+        return zip(starts, ends, self.texts())
+
+    def __getitem__(self, i: int) -> Dict:
+        """i番目のセグメントの辞書"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        segment = {'text': self.text(i), 'start': round(float(self.start[i]), 3), 'end': round(float(self.end[i]), 3)}
+        words = self.words(i)
+        if words is not None:
+            segment['words'] = words
+        return segment
+
+    def __iter__(self) -> Iterator[Dict]:
+        """セグメントの辞書を順に返す (セグメントのイテレータを受け取る既存の処理にそのまま渡せる)"""
+        has_words = len(self.word_start_ms) > 0
+        for i, (start, end, text) in enumerate(self.rows()):
+            segment = {'text': text, 'start': start, 'end': end}
+            if has_words:
+                words = self.words(i)
+                if words is not None:
+                    segment['words'] = words
+            yield segment
+
+    def save(self, path: str) -> None:
+        """バイナリ形式で保存 (書き込み途中のファイルが読まれないよう一時ファイルから置き換える)"""
+        counts = (len(self), len(self.text_buffer), len(self.word_start_ms), len(self.word_text_buffer))
+        _write_file(path, self.meta, counts, {
+            'start': self.start, 'end': self.end,
+            'text_offsets': self.text_offsets, 'text': self.text_buffer,
+            'word_index': self.word_index, 'word_offsets': self.word_offsets,
+            'word_start_ms': self.word_start_ms, 'word_end_ms': self.word_end_ms,
+            'word_probability': self.word_probability, 'word_text': self.word_text_buffer,
+        })
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> 'Transcript':
+        """
+        バイナリ形式から読み込む
+        use_mmapがTrueの場合はメモリマップした領域をコピーせずに参照する (読み取り専用)
+        """
+        with open(path, 'rb') as f:
+            if use_mmap and os.path.getsize(path) > 0:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        if len(buffer) < HEADER.size:
+            raise ValueError(f"invalid transcript file: {path}")
+        magic, version, count, text_bytes, word_count, word_text_bytes, meta_bytes = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"invalid transcript file: {path}")
+        arrays = {}
+        position = HEADER.size
+        for name, dtype, length in _layout(count, text_bytes, word_count, word_text_bytes, meta_bytes):
+            position = _align(position)
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=length, offset=position)
+            position += dtype.itemsize * length
+        meta = json.loads(arrays.pop('meta').tobytes().decode('utf-8') or '{}')
+        return cls(arrays, meta)
+
+class TranscriptWriter:
+    """
+    セグメントを1件ずつバイナリ形式で書き出す
+    各領域を一時ファイルに追記し、close()で1つのファイルにまとめる。
+    セグメントをメモリに溜めないため、長いファイルでもメモリ使用量は一定になる。
+    """
+    COLUMNS = [(name, dtype) for name, dtype, _count in _layout(0, 0, 0, 0, 0) if name != 'meta']
+
+    def __init__(self, path: str, meta: Optional[Dict] = None):
+        """
+        TranscriptWriter初期化
+        Args:
+            path: 保存先のパス
+            meta: メタ情報 (音声ファイル名・モデルなど)
+        """
+        self.path = path
+        self.meta = meta or {}
+        spill_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(spill_dir, exist_ok=True)
+        self._dtypes = dict(self.COLUMNS)
+        # 保存先と同じファイルシステムに置き、close()でのコピーをディスク内で済ませる
+        self._columns = {name: tempfile.TemporaryFile(dir=spill_dir) for name, _dtype in self.COLUMNS}
+        self.count = 0
+        self.text_bytes = 0
+        self.word_count = 0
+        self.word_text_bytes = 0
+        for name in ('text_offsets', 'word_index', 'word_offsets'):
+            self._write(name, [0])
+
+    def _write(self, name: str, values) -> None:
+        self._columns[name].write(np.asarray(values, dtype=self._dtypes[name]).tobytes())
+
+    def add(self, segment: Dict) -> None:
+        """セグメントを追記 (wordsはWordTimingsまたはその辞書形式)"""
+        self._write('start', [segment['start']])
+        self._write('end', [segment['end']])
+        text = segment['text'].encode('utf-8')
+        self._columns['text'].write(text)
+        self.text_bytes += len(text)
+        self._write('text_offsets', [self.text_bytes])
+        words = WordTimings.coerce(segment.get('words'))
+        if words:
+            offsets = []
+            for word in words.words():
+                data = word.encode('utf-8')
+                self._columns['word_text'].write(data)
+                self.word_text_bytes += len(data)
+                offsets.append(self.word_text_bytes)
+            self._write('word_offsets', offsets)
+            self._write('word_start_ms', words.start_ms)
+            self._write('word_end_ms', words.end_ms)
+            self._write(
+                'word_probability',
+                words.probabilities if words.probabilities is not None else np.zeros(len(words), dtype=np.float16)
+            )
+            self.word_count += len(words)
+        self._write('word_index', [self.word_count])
+        self.count += 1
+
+    def close(self) -> None:
+        """書き出したセグメントを1つのファイルにまとめて保存する"""
+        try:
+            counts = (self.count, self.text_bytes, self.word_count, self.word_text_bytes)
+            _write_file(self.path, self.meta, counts, self._columns)
+        finally:
+            self.abort()
+
+    def abort(self) -> None:
+        """保存せずに一時ファイルを削除"""
+        for column in self._columns.values():
+            column.close()
+
+class TranscriptArchive:
+    """
+    文字起こし結果のバイナリ形式 (.wtr) での保存先
+    音声ファイル名とモデル名ごとに1ファイルを保存し、モデルを使わずに出力し直せるようにする。
+    """
+
+    def __init__(self, archive_dir: str = '../output/.transcripts'):
+        """
+        TranscriptArchive初期化
+        Args:
+            archive_dir: 保存先ディレクトリのパス
+        """
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def path_for(self, file_path: str, model_name: Optional[str] = None) -> str:
+        """音声ファイルとモデルに対応する保存先のパス"""
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        if model_name:
+            base_name = f"{base_name}_{model_name}"
+        return os.path.join(self.archive_dir, base_name + SUFFIX)
+
+    def tee(self, path: str, segments: Iterable[Dict], meta: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        セグメントをそのまま返しながら書き出し、最後まで読み切った場合のみ保存する
+        """
+        writer = TranscriptWriter(path, meta)
+        try:
+            for segment in segments:
+                writer.add(segment)
+                yield segment
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    def entries(self) -> List[str]:
+        """保存されているファイルのパス (名前順)"""
+        return sorted(
+            os.path.join(self.archive_dir, name)
+            for name in os.listdir(self.archive_dir) if name.endswith(SUFFIX)
+        )
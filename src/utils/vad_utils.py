@@ -0,0 +1,143 @@
+import logging
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from utils.audio_utils import SAMPLE_RATE
+from utils.word_utils import WordTimings
+
+logger = logging.getLogger(__name__)
+
+# (開始サンプル, 終了サンプル)
+Region = Tuple[int, int]
+
+# 音量の計算を分けて行う長さ (メモリマップした長い音声を一度にコピーしない)
+ENERGY_BLOCK_SEC = 600
+
+def silero_speech_regions(audio: np.ndarray, settings: Dict, sample_rate: int = SAMPLE_RATE) -> List[Region]:
+    """faster-whisperに含まれるSilero VADで音声区間を検出 (faster-whisperが無い場合はImportError)"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    options = VadOptions(
+        threshold=settings['threshold'],
+        min_speech_duration_ms=settings['min_speech_ms'],
+        min_silence_duration_ms=settings['min_silence_ms'],
+        speech_pad_ms=settings['speech_pad_ms'],
+    )
+    return [
+        (chunk['start'], chunk['end'])
+        for chunk in get_speech_timestamps(np.asarray(audio, dtype=np.float32), options, sampling_rate=sample_rate)
+    ]
+
+def energy_speech_regions(
+    audio: np.ndarray,
+    settings: Dict,
+    sample_rate: int = SAMPLE_RATE,
+    frame_ms: int = 30
+) -> List[Region]:
+    """
+    音量で音声区間を検出 (Silero VADが使えない場合の代わり)
+    フレームの音量がenergy_threshold_dbを超える部分を音声とし、min_silence_ms未満の無音はつなげ、
+    min_speech_ms未満の区間は捨て、前後にspeech_pad_msの余白を付ける
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    block = ENERGY_BLOCK_SEC * sample_rate // frame * frame
+    levels = []
+    for start in range(0, len(audio) // frame * frame, block):
+        frames = np.asarray(audio[start:start + block], dtype=np.float32)
+        frames = frames[:len(frames) // frame * frame].reshape(-1, frame)
+        levels.append(np.sqrt(np.square(frames).mean(axis=1)))
+    if not levels:
+        return []
+    decibels = 20 * np.log10(np.maximum(np.concatenate(levels), 1e-10))
+    voiced = np.concatenate(([0], (decibels > settings['energy_threshold_db']).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(voiced)).reshape(-1, 2)
+
+    min_silence = settings['min_silence_ms'] / frame_ms
+    min_speech = settings['min_speech_ms'] / frame_ms
+    pad = int(settings['speech_pad_ms'] * sample_rate / 1000)
+    runs = []
+    for start, end in edges.tolist():
+        if runs and start - runs[-1][1] < min_silence:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    regions = []
+    for start, end in runs:
+        if end - start < min_speech:
+            continue
+        start = max(0, start * frame - pad)
+        end = min(len(audio), end * frame + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+def detect_speech(audio: np.ndarray, settings: Dict, sample_rate: int = SAMPLE_RATE) -> List[Region]:
+    """
+    音声区間を検出
+    methodが'auto'の場合はSilero VADを使い、faster-whisperがインストールされていない場合は音量で検出する
+    """
+    method = settings.get('method', 'auto')
+    if method in ('auto', 'silero'):
+        try:
+            return silero_speech_regions(audio, settings, sample_rate)
+        except ImportError:
+            if method == 'silero':
+                raise
+            logger.debug("Silero VAD is not available, using energy-based detection")
+    return energy_speech_regions(audio, settings, sample_rate)
+
+class SpeechMap:
+    """
+    音声区間だけを連結した音声と元の音声の時刻の対応
+    連結した音声の文字起こし結果の時刻を元の音声の時刻に戻す
+    """
+
+    def __init__(self, regions: List[Region], sample_rate: int = SAMPLE_RATE):
+        """
+        SpeechMap初期化
+        Args:
+            regions: 音声区間 (開始時刻順で重ならないこと)
+            sample_rate: サンプリングレート
+        """
+        self.regions = regions
+        self.sample_rate = sample_rate
+        lengths = np.asarray([end - start for start, end in regions], dtype=np.int64)
+        # 各区間の連結した音声での開始秒と元の音声での開始秒
+        self.concat_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) / sample_rate
+        self.original_starts = np.asarray([start for start, _end in regions], dtype=np.int64) / sample_rate
+
+    @property
+    def speech_seconds(self) -> float:
+        """音声区間の合計(秒)"""
+        return sum(end - start for start, end in self.regions) / self.sample_rate
+
+    def extract(self, audio: np.ndarray) -> np.ndarray:
+        """音声区間だけを連結した音声"""
+        return np.concatenate([np.asarray(audio[start:end], dtype=np.float32) for start, end in self.regions])
+
+    def to_original(self, seconds: Union[float, np.ndarray], is_end: bool = False) -> Union[float, np.ndarray]:
+        """
+        連結した音声の時刻を元の音声の時刻に変換
+        区間の境目ちょうどの時刻は、終了時刻なら前の区間の終わり、開始時刻なら次の区間の始まりとみなす
+        """
+        index = np.searchsorted(self.concat_starts, seconds, side='left' if is_end else 'right') - 1
+        index = np.clip(index, 0, len(self.regions) - 1)
+        return seconds - self.concat_starts[index] + self.original_starts[index]
+
+    def map_segment(self, segment: Dict) -> Dict:
+        """セグメントの時刻を元の音声の時刻に変換 (単語のタイムスタンプがあればそれも)"""
+        mapped = {
+            **segment,
+            'start': round(float(self.to_original(segment['start'])), 3),
+            'end': round(float(self.to_original(segment['end'], is_end=True)), 3),
+        }
+        if segment.get('words') is not None:
+            words = WordTimings.coerce(segment['words'])
+            mapped['words'] = WordTimings(
+                words.text,
+                words.offsets,
+                np.round(self.to_original(words.start_ms / 1000) * 1000),
+                np.round(self.to_original(words.end_ms / 1000, is_end=True) * 1000),
+                words.probabilities
+            )
+        return mapped
@@ -0,0 +1,54 @@
+import os
+import time
+import glob
+from typing import Dict, List, Tuple
+
+class FolderWatcher:
+    """
+    入力ディレクトリのポーリングによる監視
+    サイズと更新日時がsettle_sec秒以上変わらなかったファイルを書き込み完了とみなして返す。
+    inotifyなどに依存しないため、Dockerのバインドマウントやネットワークドライブでも動作する。
+    """
+
+    def __init__(self, input_dir: str, settle_sec: float = 5.0, pattern: str = '*'):
+        """
+        FolderWatcher初期化
+        Args:
+            input_dir: 監視するディレクトリのパス
+            settle_sec: 書き込み完了とみなすまでの変化の無い時間(秒)
+            pattern: 対象ファイルのパターン
+        """
+        self.input_dir = input_dir
+        self.settle_sec = settle_sec
+        self.pattern = pattern
+        # パス → ((サイズ, 更新日時), 最後に変化を検知した時刻)
+        self.pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+
+    def poll(self) -> List[Tuple[str, int, int]]:
+        """書き込みが完了したファイルの (パス, サイズ, 更新日時(ns)) を返す"""
+        now = time.monotonic()
+        stable = []
+        seen = set()
+        for path in glob.iglob(os.path.join(self.input_dir, self.pattern)):
+            # 書き込み途中の一時ファイルや隠しファイルは対象外
+            if os.path.basename(path).startswith('.'):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path) or stat.st_size == 0:
+                continue
+            path = os.path.abspath(path)
+            seen.add(path)
+            state = (stat.st_size, stat.st_mtime_ns)
+            previous = self.pending.get(path)
+            if previous is None or previous[0] != state:
+                self.pending[path] = (state, now)
+            elif now - previous[1] >= self.settle_sec:
+                stable.append((path, stat.st_size, stat.st_mtime_ns))
+        # 削除されたファイルを忘れる
+        for path in list(self.pending):
+            if path not in seen:
+                del self.pending[path]
+        return stable
@@ -1,8 +1,32 @@
 import os
+import io
+import logging
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
-from typing import List, Dict
-import shutil
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+import numpy as np
+import torch
 import whisper
+from utils.cache_utils import TranscriptionCache
+from utils.model_pool_utils import get_model_pool
+from utils.audio_utils import load_audio, PcmCache, StreamingAudioReader, SAMPLE_RATE
+from utils.chunk_utils import plan_windows, stitch_window_segments
+from utils.batch_utils import create_worker_pool, transcribe_in_worker
+from utils.moviepy_utils import get_media_duration, make_audio_proxy
+from utils.media_utils import place_media
+from utils.html_utils import HtmlTranscriptWriter
+from utils.srt_utils import SrtWriter
+from utils.word_utils import WordTimings, shift_segment
+from utils.transcript_utils import Transcript, TranscriptArchive
+from utils.metrics_utils import get_metrics
+from utils.vad_utils import SpeechMap, detect_speech
+from utils.checkpoint_utils import Checkpoint, CheckpointStore, decode_segment
+
+logger = logging.getLogger(__name__)
+
+# 単語のタイムスタンプを使う出力フォーマット (html: 再生中の単語のハイライト / srt: 単語ごとの字幕)
+WORD_FORMATS = ['html', 'srt']
 
 def format_timestamp(seconds: float) -> str:
     """秒数を[HH:MM:SS.mmm]形式に変換"""
@@ -14,14 +38,26 @@ def format_timestamp(seconds: float) -> str:
     return f"[{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}]"
 
 class WhisperProcessor:
+    backend = 'whisper'
+
     def __init__(
         self, 
         output_dir: str = '../output',
         input_dir: str = '../input',
         include_timestamps: bool = True,
         timestamp_format: str = 'full',
-        output_format: str = 'txt',  # 'txt' or 'html'
-        language: str = 'ja' # 'ja' or 'en'
+        output_format: str = 'txt',  # 'txt', 'html' or 'srt'
+        language: str = 'ja', # 'ja' or 'en'
+        cache: Optional[TranscriptionCache] = None,
+        long_audio: Optional[Dict] = None,
+        pcm_cache: Optional[PcmCache] = None,
+        streaming_decode: Optional[Dict] = None,
+        media_placement: str = 'copy',
+        media_proxy: bool = False,
+        word_timestamps: bool = False,
+        archive: Optional[TranscriptArchive] = None,
+        vad: Optional[Dict] = None,
+        checkpoints: Optional[CheckpointStore] = None
     ):
         """
         WhisperProcessor初期化
@@ -30,7 +66,18 @@ class WhisperProcessor:
             input_dir: 入力ディレクトリのパス
             include_timestamps: タイムスタンプを含めるかどうか
             timestamp_format: タイムスタンプのフォーマット ('full' or 'simple')
-            output_format: 出力フォーマット ('txt' or 'html')
+            output_format: 出力フォーマット ('txt', 'html' or 'srt')
+            cache: 文字起こし結果のキャッシュ (Noneの場合は使用しない)
+            long_audio: 長時間音声の分割並列処理の設定 (enabled, min_duration_sec, window_sec, overlap_sec, workers)
+            pcm_cache: デコード済みPCMのキャッシュ (Noneの場合は毎回デコードする)
+            streaming_decode: 音声を窓ごとに読み込むストリーミング処理の設定 (enabled, min_duration_sec, window_sec, overlap_sec)
+            media_placement: HTML出力のメディアの配置方法 ('auto', 'reflink', 'hardlink', 'symlink', 'relative', 'copy')
+            media_proxy: HTML出力で元のメディアの代わりに音声のみの軽量なプロキシを使うかどうか
+            word_timestamps: 単語のタイムスタンプを使う出力フォーマット(html, srt)で単語単位のタイムスタンプを求めるかどうか
+            archive: 文字起こし結果をバイナリ形式で保存する先 (Noneの場合は保存しない)
+            vad: 文字起こしの前に音声区間を検出して無音を除く設定 (method, threshold, energy_threshold_db, min_speech_ms,
+                min_silence_ms, speech_pad_ms。Noneの場合は使用しない)
+            checkpoints: 窓ごとに処理する長いファイルの途中経過の保存先 (Noneの場合は保存せず、中断すると最初からやり直す)
         """
         self.output_dir = output_dir
         self.input_dir = input_dir
@@ -38,512 +85,478 @@ class WhisperProcessor:
         self.timestamp_format = timestamp_format
         self.output_format = output_format
         self.language = language
+        self.cache = cache
+        self.long_audio = long_audio
+        self.pcm_cache = pcm_cache
+        self.streaming_decode = streaming_decode
+        self.media_placement = media_placement
+        self.media_proxy = media_proxy
+        self.word_timestamps = word_timestamps
+        self.archive = archive
+        self.vad = vad
+        self.checkpoints = checkpoints
+        self.model_name = None
+        self.model_kwargs = {}
+        # 長時間音声の窓を処理するプロセスプール (long_audio_pool)
+        self._long_pool = None
+        self._long_pool_key = None
         os.makedirs(output_dir, exist_ok=True)
 
-    def set_model(self, model_name: str, device: str = 'cpu', compute_type: str = 'int8') -> None:
+    def set_model(
+        self,
+        model_name: str,
+        device: str = 'cpu',
+        compute_type: str = 'int8',
+        cpu_threads: int = 0,
+        preload: bool = True
+    ) -> None:
         """
         モデルの設定
         Args:
             model_name: モデル名 ('tiny', 'small', 'base', 'medium', 'large', 'large-v3')
             device: デバイス ('cpu' or 'cuda')
             compute_type: 計算精度 ('float16', 'int8_float16', 'int8')
+            cpu_threads: CPUスレッド数 (0の場合はデフォルト)
+            preload: すぐにロードするかどうか (Falseの場合は最初に文字起こしする時にロードするため、
+                VADで全てのファイルが無音だった場合はロードしない)
         """
+        if cpu_threads:
+            torch.set_num_threads(cpu_threads)
         self.model_name = model_name
-        self.model = whisper.load_model(model_name)
+        self.model_kwargs = dict(device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        if preload:
+            self.load_model(model_name)
+
+    def load_model(self, model_name: str) -> Any:
+        """モデルプールからモデルを取得 (未ロードか解放済みの場合はロードする)"""
+        device = self.model_kwargs['device']
+        # openai-whisperはcompute_typeを使わないためキーにはNoneを使う
+        return get_model_pool().get(
+            self.backend, model_name, device, None,
+            lambda: whisper.load_model(model_name, device=device)
+        )
+
+    @property
+    def model(self) -> Any:
+        """
+        set_modelで設定したモデル
+        参照はモデルプールだけが持ち、使うたびに取得する (プールが解放したモデルがメモリに残らないように)
+        """
+        return self.load_model(self.model_name) if self.model_name else None
+
+    def model_label(self) -> str:
+        """出力ファイル名や保存先に付けるモデル名"""
+        return self.model_name
+
+    def needs_words(self) -> bool:
+        """出力に単語のタイムスタンプが必要かどうか (単語の位置合わせは追加の処理になるため必要な場合のみ求める)"""
+        return self.word_timestamps and self.output_format in WORD_FORMATS
+
+    def transcribe_options(self) -> Dict:
+        """transcribeに渡すオプション (キャッシュキーにも使用)"""
+        return {
+            'word_timestamps': self.needs_words(),
+        }
+
+    def transcribe(self, audio: Union[str, np.ndarray], options: Dict) -> Iterator[Dict]:
+        """文字起こしを実行してセグメントのイテレータを返す"""
+        # セグメントごとの表示はdebugの場合のみ (大きなファイルでは表示自体に時間がかかる)
+        if logger.isEnabledFor(logging.DEBUG):
+            verbose = True
+        elif logger.isEnabledFor(logging.INFO):
+            verbose = False  # 進捗バーのみ
+        else:
+            verbose = None
+        with warnings.catch_warnings():
+            # メモリマップした読み取り専用のPCMをtorchに渡す際の警告 (書き込みはしないため問題ない)
+            warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+            result = self.model.transcribe(
+                audio,
+                language=self.language,
+                verbose=verbose,
+                **options
+            )
+        return (self.make_segment(segment) for segment in result["segments"])
+
+    @staticmethod
+    def make_segment(segment: Dict) -> Dict:
+        """openai-whisperのセグメントから出力に使う項目だけを取り出す"""
+        converted = {'text': segment['text'], 'start': segment['start'], 'end': segment['end']}
+        if segment.get('words'):
+            converted['words'] = WordTimings.from_words(segment['words'])
+        return converted
+
+    def load_audio(self, file_path: str) -> Union[str, np.ndarray]:
+        """
+        文字起こしに渡す音声を用意
+        PCMキャッシュがある場合はメモリマップしたPCMを、無い場合はパスをそのまま返す
+        """
+        if self.pcm_cache:
+            with get_metrics().stage('decode'):
+                return self.pcm_cache.load(file_path)
+        return file_path
+
+    def speech_map(self, audio: np.ndarray) -> Optional[SpeechMap]:
+        """音声区間を検出して元の時刻との対応を返す (音声が無い場合はNone)"""
+        with get_metrics().stage('vad'):
+            regions = detect_speech(audio, self.vad)
+        return SpeechMap(regions) if regions else None
+
+    def transcribe_speech(self, audio: Union[str, np.ndarray], options: Dict) -> Iterator[Dict]:
+        """
+        音声区間だけを連結して文字起こしし、時刻を元の音声の時刻に戻して返す
+        音声区間が無い場合はモデルを実行せずに空の結果を返す (モデルが未ロードの場合もロードしない)
+        """
+        if isinstance(audio, str):
+            with get_metrics().stage('decode'):
+                audio = load_audio(audio)
+        speech = self.speech_map(audio)
+        if speech is None:
+            logger.info("No speech detected")
+            return iter(())
+        logger.debug(f"Speech: {speech.speech_seconds:.1f}s / {len(audio) / SAMPLE_RATE:.1f}s ({len(speech.regions)} regions)")
+        return (speech.map_segment(segment) for segment in self.transcribe(speech.extract(audio), options))
+
+    def decode_mode(self, file_path: str) -> str:
+        """
+        音声の読み込み方法を決定
+        Returns:
+            'stream': 窓ごとに読み込んで逐次処理 (メモリ使用量を一定に保つため最優先)
+            'long': 全体を読み込んで窓ごとに並列処理
+            'whole': 全体をそのまま処理
+        """
+        duration = None
+        for mode, settings in (('stream', self.streaming_decode), ('long', self.long_audio)):
+            if not settings or not settings.get('enabled'):
+                continue
+            if duration is None:
+                duration = get_media_duration(file_path)
+            if duration >= settings['min_duration_sec']:
+                return mode
+        return 'whole'
+
+    def transcribe_streaming(self, file_path: str, options: Dict, checkpoint: Optional[Checkpoint] = None) -> Iterator[Dict]:
+        """
+        ffmpegのパイプから窓ごとに音声を読み込んで文字起こしする
+        全体を読み込まないため、入力の長さに関係なくメモリ使用量は一定になる。
+        重なり部分は中央で区切り、中心がどちら側にあるかでセグメントを振り分ける。
+        checkpointを指定した場合は窓ごとの結果と引き継ぐ文脈を保存し、保存されていればその続きの窓から処理する。
+        """
+        overlap_sec = self.streaming_decode['overlap_sec']
+        reader = StreamingAudioReader(file_path, self.streaming_decode['window_sec'], overlap_sec)
+        pending = []
+        prompt = ''
+        resumed = self.resume(file_path, checkpoint)
+        if resumed:
+            yield from resumed['segments']
+            prompt = resumed['state']['prompt']
+            pending = [decode_segment(segment) for segment in resumed['state']['pending']]
+        for index, (offset, window) in enumerate(get_metrics().timed(reader, 'decode')):
+            if resumed and index <= resumed['window']:
+                # 処理済みの窓は読み飛ばす (窓の区切りを同じにするため先頭から読み込む)
+                continue
+            window_start = offset / SAMPLE_RATE
+            boundary = window_start + len(window) / SAMPLE_RATE - overlap_sec / 2
+            window_options = dict(options)
+            if prompt:
+                # 窓をまたいで文脈を引き継ぐ
+                window_options['initial_prompt'] = prompt
+            # 前の窓の末尾付近のセグメントはこの窓で処理し直すため破棄する
+            pending = []
+            completed = []
+            window_segments = self.transcribe_speech(window, window_options) if self.vad else self.transcribe(window, window_options)
+            for segment in window_segments:
+                segment = shift_segment(segment, window_start)
+                middle = (segment['start'] + segment['end']) / 2
+                if offset > 0 and middle < window_start + overlap_sec / 2:
+                    continue
+                if middle < boundary:
+                    prompt = (prompt + segment['text'])[-200:]
+                    completed.append(segment)
+                    yield segment
+                else:
+                    pending.append(segment)
+            if checkpoint:
+                checkpoint.add(index, completed, {'prompt': prompt, 'pending': pending})
+        # 最後の窓の末尾付近は次の窓が無いためそのまま使う
+        yield from pending
+        if checkpoint:
+            checkpoint.remove()
+
+    def transcribe_long(self, file_path: str, options: Dict, checkpoint: Optional[Checkpoint] = None) -> Iterator[Dict]:
+        """
+        長時間音声を重なりのある窓に分割し、複数のワーカープロセスで並列に文字起こしする
+        各窓の結果は全体の時刻に補正し、重なり部分の重複を除いて時系列順に返す
+        checkpointを指定した場合は窓ごとの結果を保存し、保存されていればその続きの窓から処理する
+        """
+        with get_metrics().stage('decode'):
+            audio = self.pcm_cache.load(file_path) if self.pcm_cache else load_audio(file_path)
+        speech = None
+        if self.vad:
+            # 音声区間だけを連結してから窓に分割する
+            speech = self.speech_map(audio)
+            if speech is None:
+                logger.info(f"No speech detected: {file_path}")
+                return
+            audio = speech.extract(audio)
+        windows = plan_windows(
+            audio,
+            window_sec=self.long_audio['window_sec'],
+            overlap_sec=self.long_audio['overlap_sec']
+        )
+        first = 0
+        resumed = self.resume(file_path, checkpoint)
+        if resumed:
+            yield from resumed['segments']
+            first = resumed['window'] + 1
+        if first >= len(windows):
+            # 全ての窓が完了した後に中断された場合
+            checkpoint.remove()
+            return
+        logger.info(f"Long audio: {len(windows)} windows, {self.long_audio['workers']} workers")
+
+        executor = self.long_audio_pool()
+        # メモリマップしたPCMのスライスはワーカーへ渡す際にコピーされる
+        futures = [
+            executor.submit(transcribe_in_worker, audio[window[0]:window[1]], options)
+            for window in windows[first:]
+        ]
+        try:
+            # 完了順ではなく窓の順に取り出して時系列を保つ
+            for index, window, future in zip(range(first, len(windows)), windows[first:], futures):
+                completed = []
+                for segment in stitch_window_segments(window, future.result()):
+                    segment = speech.map_segment(segment) if speech else segment
+                    completed.append(segment)
+                    yield segment
+                if checkpoint:
+                    checkpoint.add(index, completed)
+        finally:
+            # 途中で中断された場合、プールは次のファイルでも使うため残りの窓を取り消す
+            for future in futures:
+                future.cancel()
+        if checkpoint:
+            checkpoint.remove()
+
+    def long_audio_pool(self) -> ProcessPoolExecutor:
+        """
+        長時間音声の窓を処理するプロセスプール
+        ファイルごとに作り直すとワーカーがモデルをロードし直すため、モデルが変わるまで使い回す
+        """
+        key = (self.model_name, sorted(self.model_kwargs.items()))
+        if self._long_pool is None or self._long_pool_key != key:
+            self.close()
+            worker_kwargs = dict(output_dir=self.output_dir, input_dir=self.input_dir, language=self.language)
+            self._long_pool = create_worker_pool(
+                type(self), worker_kwargs, self.model_name, self.model_kwargs, self.long_audio['workers']
+            )
+            self._long_pool_key = key
+        return self._long_pool
+
+    def close(self) -> None:
+        """長時間音声の処理に使ったワーカープロセスを終了"""
+        if self._long_pool is not None:
+            self._long_pool.shutdown()
+            self._long_pool = None
+            self._long_pool_key = None
+
+    def resume(self, file_path: str, checkpoint: Optional[Checkpoint]) -> Optional[Dict]:
+        """チェックポイントから途中経過を読み込む (無い場合はNone)"""
+        resumed = checkpoint.load() if checkpoint else None
+        if resumed:
+            logger.info(f"Resuming from checkpoint: {file_path} ({resumed['window'] + 1} windows, {len(resumed['segments'])} segments done)")
+            get_metrics().set(resumed_windows=resumed['window'] + 1)
+        return resumed
+
+    def cache_params(self, options: Dict) -> Dict:
+        """キャッシュキーに含めるパラメータ"""
+        params = {
+            'backend': self.backend,
+            'model': self.model_name,
+            'language': self.language,
+            **options
+        }
+        if self.vad:
+            params['vad'] = dict(self.vad)
+        return params
 
     def format_line(self, segment: Dict) -> str:
         """セグメントを指定されたフォーマットで文字列に変換"""
-        text = segment['text'].strip()
+        return self.format_row(segment['start'], segment['end'], segment['text'])
+
+    def format_row(self, start: float, end: float, text: str) -> str:
+        """開始・終了・テキストを指定されたフォーマットで文字列に変換 (Transcriptから辞書を作らずに出力する場合に使う)"""
+        text = text.strip()
         
         if not self.include_timestamps:
             return f"{text}\n"
             
-        start_time = format_timestamp(segment['start'])
-        end_time = format_timestamp(segment['end'])
+        start_time = format_timestamp(start)
+        end_time = format_timestamp(end)
         
         if self.timestamp_format == 'simple':
-            simple_start = f"[{int(segment['start'])//60:02d}:{int(segment['start'])%60:02d}]"
+            simple_start = f"[{int(start)//60:02d}:{int(start)%60:02d}]"
             return f"{simple_start} {text}\n"
         else:
             return f"{start_time} -> {end_time}: {text}\n"
 
-    def generate_html_content(self, segments: List[Dict], media_file: str) -> str:
+    def generate_html_content(self, segments: Union[Iterable[Dict], Transcript], media_file: str) -> str:
         """Enhanced HTMLコンテンツの生成"""
-        media_filename = os.path.basename(media_file)
-        media_ext = os.path.splitext(media_filename)[1].lower()
-        is_video = media_ext in ['.mp4', '.webm', '.ogg']
-        media_type = 'video' if is_video else 'audio'
-        
-        html_template = f"""
-<!DOCTYPE html>
-<html lang="ja">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>文字起こし - {media_filename}</title>
-    <style>
-        :root {{
-            --header-height: 60px;
-            --search-height: 60px;
-            --player-height: 200px;
-            --spacing: 20px;
-        }}
-        
-        body {{
-            font-family: Arial, sans-serif;
-            margin: 0;
-            padding: 0;
-            background-color: #f5f5f5;
-            height: 100vh;
-            overflow: hidden;
-        }}
-        
-        .header {{
-            height: var(--header-height);
-            background: white;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            padding: 0 20px;
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            position: fixed;
-            top: 0;
-            left: 0;
-            right: 0;
-            z-index: 100;
-        }}
-        
-        .main-container {{
-            display: flex;
-            height: calc(100vh - var(--header-height) - 40px);
-            margin-top: var(--header-height);
-            gap: var(--spacing);
-            padding: var(--spacing);
-        }}
-        
-        .media-container {{
-            flex: 1;
-            background: white;
-            padding: var(--spacing);
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            height: fit-content;
-            position: sticky;
-            top: calc(var(--header-height) + var(--spacing));
-        }}
-        
-        .transcript-container {{
-            flex: 1;
-            display: flex;
-            flex-direction: column;
-            gap: var(--spacing);
-            max-width: 50%;
-        }}
-        
-        .search-container {{
-            background: white;
-            padding: 15px;
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        
-        .search-input {{
-            width: 100%;
-            box-sizing: border-box;
-            padding: 8px;
-            border: 1px solid #ddd;
-            border-radius: 4px;
-            font-size: 1em;
-        }}
-        
-        .transcript-content {{
-            background: white;
-            padding: var(--spacing);
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            overflow-y: auto;
-            height: calc(100vh - var(--header-height) - var(--search-height) - var(--spacing) * 4);
-        }}
-        
-        {media_type} {{
-            width: 100%;
-            border-radius: 4px;
-        }}
-        
-        .segment {{
-            padding: 15px;
-            margin: 5px 0;
-            cursor: pointer;
-            border-radius: 4px;
-            transition: all 0.2s;
-            position: relative;
-        }}
-        
-        .segment:hover {{
-            background-color: #f0f0f0;
-        }}
-        
-        .segment.active {{
-            background-color: #e3f2fd;
-        }}
-        
-        .segment.highlight {{
-            background-color: #fff3cd;
-        }}
-        
-        .timestamp {{
-            color: #666;
-            font-size: 0.9em;
-            margin-bottom: 5px;
-            user-select: none;
-        }}
-        
-        .text {{
-            line-height: 1.5;
-        }}
-        
-        .text[contenteditable="true"] {{
-            border: 1px solid #ddd;
-            padding: 5px;
-            border-radius: 4px;
-        }}
-        
-        .segment-actions {{
-            display: none;
-            position: absolute;
-            right: 10px;
-            top: 10px;
-            gap: 5px;
-        }}
-        
-        .segment:hover .segment-actions {{
-            display: flex;
-        }}
-        
-        .btn {{
-            padding: 5px 10px;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            font-size: 0.9em;
-            background: #f0f0f0;
-            transition: background-color 0.2s;
-        }}
-        
-        .btn:hover {{
-            background: #e0e0e0;
-        }}
-        
-        .header-actions {{
-            display: flex;
-            gap: 10px;
-        }}
-        
-        .tooltip {{
-            position: fixed;
-            background: rgba(0, 0, 0, 0.8);
-            color: white;
-            padding: 5px 10px;
-            border-radius: 4px;
-            font-size: 0.9em;
-            pointer-events: none;
-            z-index: 1000;
-        }}
-        
-        @media (max-width: 768px) {{
-            .main-container {{
-                flex-direction: column;
-            }}
-            
-            .media-container, .transcript-container {{
-                max-width: 100%;
-            }}
-            
-            .media-container {{
-                position: static;
-            }}
-            
-            .transcript-content {{
-                height: auto;
-                max-height: 50vh;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>文字起こし - {media_filename}</h1>
-        <div class="header-actions">
-            <button class="btn" id="copy-all">全体をコピー</button>
-            <button class="btn" id="copy-all-with-timestamps">タイムスタンプ付きでコピー</button>
-        </div>
-    </div>
-    
-    <div class="main-container">
-        <div class="media-container">
-            <{media_type} id="media-player" controls>
-                <source src="{media_filename}" type="{media_type}/{media_ext[1:]}">
-                お使いのブラウザは{media_type}タグをサポートしていません。
-            </{media_type}>
-        </div>
-        
-        <div class="transcript-container">
-            <div class="search-container">
-                <input type="text" class="search-input" placeholder="テキストを検索..." id="search-input">
-            </div>
-            
-            <div class="transcript-content" id="transcript">
-                {self._generate_segments_html(segments)}
-            </div>
-        </div>
-    </div>
-    
-    <script>
-        const player = document.getElementById('media-player');
-        const transcript = document.getElementById('transcript');
-        const segments = document.querySelectorAll('.segment');
-        const searchInput = document.getElementById('search-input');
-        let currentSegment = null;
-        let tooltip = null;
-        
-        // ツールチップ作成
-        function createTooltip() {{
-            const tooltip = document.createElement('div');
-            tooltip.className = 'tooltip';
-            tooltip.style.display = 'none';
-            document.body.appendChild(tooltip);
-            return tooltip;
-        }}
-        
-        // テキストコピー機能
-        function copyToClipboard(text) {{
-            navigator.clipboard.writeText(text).then(() => {{
-                showTooltip('コピーしました');
-            }});
-        }}
-        
-        // ツールチップ表示
-        function showTooltip(text, x = null, y = null) {{
-            if (!tooltip) {{
-                tooltip = createTooltip();
-            }}
-            
-            tooltip.textContent = text;
-            tooltip.style.display = 'block';
-            
-            if (x !== null && y !== null) {{
-                tooltip.style.left = `${{x}}px`;
-                tooltip.style.top = `${{y}}px`;
-            }} else {{
-                // デフォルト位置（画面中央上部）
-                tooltip.style.left = '50%';
-                tooltip.style.top = '10%';
-                tooltip.style.transform = 'translateX(-50%)';
-            }}
-            
-            setTimeout(() => {{
-                tooltip.style.display = 'none';
-            }}, 2000);
-        }}
-        
-        // 検索機能
-        searchInput.addEventListener('input', () => {{
-            const searchText = searchInput.value.toLowerCase();
-            segments.forEach(segment => {{
-                const text = segment.querySelector('.text').textContent.toLowerCase();
-                segment.classList.toggle('highlight', searchText ? text.includes(searchText) : false);
-            }});
-        }});
-        
-        // セグメントの編集機能
-        segments.forEach(segment => {{
-            const textDiv = segment.querySelector('.text');
-            const timestamp = segment.querySelector('.timestamp').textContent;
-
-            // 再生ボタン
-            const playBtn = document.createElement('button');
-            playBtn.className = 'btn';
-            playBtn.textContent = '再生';
-            playBtn.onclick = (e) => {{
-                e.stopPropagation();
-                const start = parseFloat(segment.dataset.start);
-                player.currentTime = start;
-                player.play();
-            }};
-            
-            // 編集ボタン
-            const editBtn = document.createElement('button');
-            editBtn.className = 'btn';
-            editBtn.textContent = '編集';
-            editBtn.onclick = (e) => {{
-                e.stopPropagation();
-                textDiv.contentEditable = textDiv.contentEditable === 'true' ? 'false' : 'true';
-                editBtn.textContent = textDiv.contentEditable === 'true' ? '保存' : '編集';
-                if (textDiv.contentEditable === 'true') {{
-                    player.pause();
-                    textDiv.focus();
-                }}
-            }};
-            
-            // コピーボタン
-            const copyBtn = document.createElement('button');
-            copyBtn.className = 'btn';
-            copyBtn.textContent = 'コピー';
-            copyBtn.onclick = (e) => {{
-                e.stopPropagation();
-                const textToCopy = textDiv.textContent.trim();
-                copyToClipboard(textToCopy);
-            }};
-            
-            // タイムスタンプ付きコピーボタン
-            const copyWithTimestampBtn = document.createElement('button');
-            copyWithTimestampBtn.className = 'btn';
-            copyWithTimestampBtn.textContent = 'TS付きコピー';
-            copyWithTimestampBtn.onclick = (e) => {{
-                e.stopPropagation();
-                const textToCopy = `${{timestamp}} ${{textDiv.textContent.trim()}}`;
-                copyToClipboard(textToCopy);
-            }};
-            
-            // ボタンコンテナ
-            const actions = document.createElement('div');
-            actions.className = 'segment-actions';
-            actions.append(playBtn, editBtn, copyBtn, copyWithTimestampBtn);
-            segment.appendChild(actions);
-        }});
-        
-        // 全体コピー機能
-        document.getElementById('copy-all').onclick = () => {{
-            const allText = Array.from(segments)
-                .map(segment => segment.querySelector('.text').textContent.trim())
-                .join('\\n');
-            copyToClipboard(allText);
-        }};
-        
-        document.getElementById('copy-all-with-timestamps').onclick = () => {{
-            const allText = Array.from(segments)
-                .map(segment => {{
-                    const timestamp = segment.querySelector('.timestamp').textContent;
-                    const text = segment.querySelector('.text').textContent.trim();
-                    return `${{timestamp}} ${{text}}`;
-                }})
-                .join('\\n');
-            copyToClipboard(allText);
-        }};
-        
-        // セグメントクリック時の再生
-        // segments.forEach(segment => {{
-        //     segment.addEventListener('click', () => {{
-        //         const start = parseFloat(segment.dataset.start);
-        //         player.currentTime = start;
-        //         player.play();
-        //     }});
-        // }});
-        
-        // 再生位置に応じたセグメントのハイライトと自動スクロール
-        player.addEventListener('timeupdate', () => {{
-            const currentTime = player.currentTime;
-            segments.forEach(segment => {{
-                const start = parseFloat(segment.dataset.start);
-                const end = parseFloat(segment.dataset.end);
-                
-                if (currentTime >= start && currentTime <= end) {{
-                    if (currentSegment !== segment) {{
-                        if (currentSegment) {{
-                            currentSegment.classList.remove('active');
-                        }}
-                        segment.classList.add('active');
-                        currentSegment = segment;
-                        
-                        // スクロール位置の調整
-                        transcript.scrollTop = segment.offsetTop - transcript.offsetTop;
-                    }}
-                }}
-            }});
-        }});
-    </script>
-</body>
-</html>
-    """
-        return html_template
-
-    def _generate_segments_html(self, segments: List[Dict]) -> str:
-        """セグメントのHTML生成"""
-        segments_html = ""
-        for segment in segments:
-            start = segment['start']
-            end = segment['end']
-            text = segment['text'].strip()
-            timestamp = f"{int(start//60):02d}:{int(start%60):02d} - {int(end//60):02d}:{int(end%60):02d}"
-            
-            segments_html += f"""
-                <div class="segment" data-start="{start}" data-end="{end}">
-                    <div class="timestamp">{timestamp}</div>
-                    <div class="text">{text}</div>
-                </div>
-            """
-        return segments_html
+        buffer = io.StringIO()
+        HtmlTranscriptWriter(buffer, media_file).write_all(segments, flush=False)
+        return buffer.getvalue()
 
     def create_output_file(
         self,
         base_file_path: str,
-        segments: List[Dict]
+        segments: Union[Iterable[Dict], Transcript],
+        media_path: Optional[str] = None
     ) -> None:
-        """出力ファイルの作成"""
+        """
+        出力ファイルの作成
+        セグメントはイテレータとして受け取り、生成されるたびにファイルへ書き出す
+        Transcriptを渡した場合は配列から直接書き出す
+        media_pathを指定した場合はHTMLで再生するメディアとしてbase_file_pathの代わりに使う
+        """
         file_name = os.path.basename(base_file_path)
         base_name = os.path.splitext(file_name)[0]
 
         if not self.model_name:
             return
-        
-        if self.model_name:
-            output_name = f"{base_name}_{self.model_name}"
-        else:
-            output_name = base_name
+        output_name = f"{base_name}_{self.model_label()}"
 
-        if self.output_format == 'html':
+        if self.output_format == 'srt':
+            # SRTファイル作成
+            srt_file = os.path.join(self.output_dir, f"{output_name}.srt")
+            with open(srt_file, 'w', encoding='utf-8') as f:
+                SrtWriter(f).write_all(segments)
+
+            logger.info(f"input  : {base_file_path}")
+            logger.info(f"output : {srt_file}")
+        elif self.output_format == 'html':
             # HTMLファイル作成
             html_file = os.path.join(self.output_dir, f"{output_name}.html")
-            html_content = self.generate_html_content(segments, file_name)
             
-            # 元のメディアファイルを出力ディレクトリにコピー
-            media_dest = os.path.join(self.output_dir, file_name)
-            shutil.copy2(base_file_path, media_dest)
+            media_source = media_path or base_file_path
+            with get_metrics().stage('media'):
+                if self.media_proxy:
+                    # 出力ディレクトリに直接作成されるため配置は不要
+                    media_source = make_audio_proxy(media_source, self.output_dir)
+                # 元のメディアファイルを出力ディレクトリに配置 (コピーは他の方法が使えない場合のみ)
+                media_src, placement = place_media(media_source, self.output_dir, self.media_placement)
             
             with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+                HtmlTranscriptWriter(f, os.path.basename(media_source), media_src).write_all(segments)
             
-            print(f"input  : {base_file_path}")
-            print(f"output : {html_file}")
-            print(f"media  : {media_dest}")
+            logger.info(f"input  : {base_file_path}")
+            logger.info(f"output : {html_file}")
+            logger.info(f"media  : {media_src} ({placement})")
         else:
             # テキストファイル作成
             txt_file = os.path.join(self.output_dir, f"{output_name}.txt")
             with open(txt_file, 'w', encoding='utf-8') as f:
-                for segment in segments:
-                    f.write(self.format_line(segment))
+                if isinstance(segments, Transcript):
+                    f.writelines(self.format_row(*row) for row in segments.rows())
+                else:
+                    for segment in segments:
+                        f.write(self.format_line(segment))
+                        f.flush()
             
-            print(f"input  : {base_file_path}")
-            print(f"output : {txt_file}")
+            logger.info(f"input  : {base_file_path}")
+            logger.info(f"output : {txt_file}")
+
+    def transcribe_file(self, file_path: str) -> Iterator[Dict]:
+        """
+        音声ファイルを文字起こししてセグメントのイテレータを返す
+        長さに応じて読み込み方法を選び、キャッシュがあればキャッシュから返す
+        """
+        metrics = get_metrics()
+        options = self.transcribe_options()
+        mode = self.decode_mode(file_path)
+        if metrics.current() is not None:
+            metrics.set(mode=mode, audio_seconds=get_media_duration(file_path))
+        params = self.cache_params(options)
+        if mode != 'whole':
+            # 分割した場合は結果が変わりうるため窓の設定もキーに含める
+            settings = self.streaming_decode if mode == 'stream' else self.long_audio
+            params[mode] = {
+                'window_sec': settings['window_sec'],
+                'overlap_sec': settings['overlap_sec'],
+            }
+        if self.cache:
+            with metrics.stage('cache'):
+                cache_key = self.cache.make_key(file_path, params)
+                segments = self.cache.get(cache_key)
+            if segments is not None:
+                logger.info(f"Cache hit: {file_path}")
+                metrics.set(cache_hit=True)
+                return metrics.timed(segments, 'cache', count='segments')
+        # 窓ごとに処理する場合のみ途中経過を保存する (全体を1回で処理する場合は途中から再開できない)
+        checkpoint = self.checkpoints.open(file_path, params) if self.checkpoints and mode != 'whole' else None
+
+        def decode() -> Iterator[Dict]:
+            # openai-whisperは呼び出し時にまとめて推論するため、呼び出し自体も最初の取り出しまで遅らせる
+            if mode == 'stream':
+                yield from self.transcribe_streaming(file_path, options, checkpoint)
+            elif mode == 'long':
+                yield from self.transcribe_long(file_path, options, checkpoint)
+            elif self.vad:
+                yield from self.transcribe_speech(self.load_audio(file_path), options)
+            else:
+                yield from self.transcribe(self.load_audio(file_path), options)
+
+        # 遅延評価されるセグメントは取り出すたびに推論が進むため、取り出しの時間を推論として計測する
+        # (音声のデコードなど内側で計測する段階の時間は除かれる)
+        segments = metrics.timed(decode(), 'inference', count='segments')
+        if self.cache:
+            # 出力と同時にキャッシュへ書き込み、最後まで完了した場合のみ確定する
+            segments = self.cache.tee(cache_key, segments, source=file_path, params=params)
+        return segments
+
+    def archive_segments(self, file_path: str, segments: Iterable[Dict], source_path: Optional[str] = None) -> Iterator[Dict]:
+        """
+        出力と同時に文字起こし結果をバイナリ形式で保存する
+        Args:
+            file_path: 文字起こしした音声ファイルのパス
+            segments: セグメントのイテレータ
+            source_path: 変換前の入力ファイルのパス (Noneの場合はfile_path)。出力し直す際に元のメディアを探すために保存する
+        """
+        meta = {
+            'source': os.path.basename(source_path or file_path),
+            'backend': self.backend,
+            'model': self.model_label(),
+            'language': self.language,
+        }
+        return self.archive.tee(self.archive.path_for(file_path, self.model_label()), segments, meta)
 
     def process_audio_file(
         self,
-        file_path: str
+        file_path: str,
+        media_path: Optional[str] = None,
+        source_path: Optional[str] = None
     ) -> bool:
-        """音声ファイルの処理"""
-        print(f"Processing: {file_path}")
-        try:
-            if not self.model or not self.model_name:
-                print("Model not set. Please set the model before processing.")
+        """
+        音声ファイルの処理
+        Args:
+            file_path: 文字起こしする音声ファイルのパス
+            media_path: HTML出力で再生するメディアのパス (Noneの場合はfile_path)
+            source_path: 変換前の入力ファイルのパス (動画から音声を取り出した場合など。Noneの場合はfile_path)
+        """
+        logger.info(f"Processing: {file_path}")
+        metrics = get_metrics()
+        with metrics.file(file_path, backend=self.backend, model=self.model_name):
+            try:
+                if not self.model_name:
+                    logger.error("Model not set. Please set the model before processing.")
+                    metrics.set(ok=False)
+                    return False
+                segments = self.transcribe_file(file_path)
+                if self.archive:
+                    segments = self.archive_segments(file_path, segments, source_path)
+                with metrics.stage('write'):
+                    self.create_output_file(file_path, segments, media_path)
+                return True
+            except Exception as e:
+                logger.error(f"Error processing {file_path}: {str(e)}")
+                metrics.set(ok=False, error=str(e))
                 return False
-            result = self.model.transcribe(
-                file_path,
-                language=self.language,
-                word_timestamps=True,  # HTML出力の場合は常にTrue
-                verbose=True,
-            )
-            self.create_output_file(file_path, result["segments"])
-            return True
-        except Exception as e:
-            print(f"Error processing {file_path}: {str(e)}")
-            return False
\ No newline at end of file
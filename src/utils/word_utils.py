@@ -0,0 +1,120 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+class WordTimings:
+    """
+    セグメント内の単語ごとのタイムスタンプ (列指向)
+    単語ごとの辞書のリストではなく、単語を連結したテキストと区切り位置、開始・終了(ミリ秒)、確率の配列で保持する。
+    """
+    __slots__ = ('text', 'offsets', 'start_ms', 'end_ms', 'probabilities')
+
+    def __init__(
+        self,
+        text: str,
+        offsets: np.ndarray,
+        start_ms: np.ndarray,
+        end_ms: np.ndarray,
+        probabilities: Optional[np.ndarray] = None
+    ):
+        """
+        WordTimings初期化
+        Args:
+            text: 単語を連結したテキスト
+            offsets: 各単語の開始位置とテキストの長さ (単語数+1)
+            start_ms: 各単語の開始時刻(ミリ秒)
+            end_ms: 各単語の終了時刻(ミリ秒)
+            probabilities: 各単語の確率 (Noneの場合は保持しない)
+        """
+        self.text = text
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.start_ms = np.asarray(start_ms, dtype=np.int32)
+        self.end_ms = np.asarray(end_ms, dtype=np.int32)
+        self.probabilities = None if probabilities is None else np.asarray(probabilities, dtype=np.float16)
+
+    @classmethod
+    def from_words(cls, words: Iterable[Any]) -> 'WordTimings':
+        """
+        バックエンドの単語の結果から作成
+        faster-whisperのWord (属性) とopenai-whisperの辞書 (キー) のどちらも受け付ける
+        """
+        texts = []
+        starts = []
+        ends = []
+        probabilities = []
+        for word in words:
+            if isinstance(word, dict):
+                texts.append(word['word'])
+                starts.append(word['start'])
+                ends.append(word['end'])
+                probabilities.append(word.get('probability', 0.0))
+            else:
+                texts.append(word.word)
+                starts.append(word.start)
+                ends.append(word.end)
+                probabilities.append(getattr(word, 'probability', 0.0))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        return cls(
+            ''.join(texts),
+            offsets,
+            np.round(np.asarray(starts, dtype=np.float64) * 1000),
+            np.round(np.asarray(ends, dtype=np.float64) * 1000),
+            probabilities
+        )
+
+    @classmethod
+    def coerce(cls, value: Any) -> Optional['WordTimings']:
+        """WordTimings・to_json()の辞書・単語ごとの辞書のリストのいずれかをWordTimingsに変換"""
+        if value is None or isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls.from_json(value)
+        return cls.from_words(value)
+
+    def __len__(self) -> int:
+        return len(self.start_ms)
+
+    def words(self) -> List[str]:
+        """各単語のテキスト"""
+        offsets = self.offsets.tolist()
+        return [self.text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def __iter__(self) -> Iterator[Tuple[str, float, float]]:
+        """(単語, 開始秒, 終了秒) を順に返す"""
+        for word, start, end in zip(self.words(), self.start_ms.tolist(), self.end_ms.tolist()):
+            yield word, start / 1000, end / 1000
+
+    def shifted(self, offset_sec: float) -> 'WordTimings':
+        """時刻をoffset_secずらしたコピー (テキストと区切り位置は共有する)"""
+        offset_ms = int(round(offset_sec * 1000))
+        return WordTimings(self.text, self.offsets, self.start_ms + offset_ms, self.end_ms + offset_ms, self.probabilities)
+
+    def to_json(self) -> Dict:
+        """JSONに変換できる形式"""
+        data = {
+            'text': self.text,
+            'offsets': self.offsets.tolist(),
+            'start_ms': self.start_ms.tolist(),
+            'end_ms': self.end_ms.tolist(),
+        }
+        if self.probabilities is not None:
+            data['probability'] = [round(float(value), 3) for value in self.probabilities]
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'WordTimings':
+        """to_json()の形式から作成"""
+        return cls(data['text'], data['offsets'], data['start_ms'], data['end_ms'], data.get('probability'))
+
+def shift_segment(segment: Dict, offset_sec: float) -> Dict:
+    """セグメントの時刻をずらす (単語のタイムスタンプがあればそれも)"""
+    shifted = {**segment, 'start': segment['start'] + offset_sec, 'end': segment['end'] + offset_sec}
+    if segment.get('words') is not None:
+        shifted['words'] = WordTimings.coerce(segment['words']).shifted(offset_sec)
+    return shifted
+
+def json_default(value: Any) -> Any:
+    """json.dumpsのdefault (セグメントに含まれるWordTimingsを変換する)"""
+    if isinstance(value, WordTimings):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
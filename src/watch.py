@@ -0,0 +1,202 @@
+import os
+import signal
+import logging
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from utils.batch_utils import create_worker_pool, process_input_in_worker, warm_up
+from utils.cache_utils import TranscriptionCache
+from utils.audio_utils import PcmCache
+from utils.transcript_utils import TranscriptArchive
+from utils.checkpoint_utils import CheckpointStore
+from utils.search_utils import update_index
+from utils.queue_utils import JobQueue
+from utils.watch_utils import FolderWatcher
+from utils.metrics_utils import get_metrics, write_prometheus
+from utils.log_utils import configure_logging
+from config import WHISPER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def processor_class(backend):
+    # 使わないバックエンドはインストールされていない場合もあるため必要な方だけインポートする
+    if backend == 'whisper':
+        from utils.whisper_utils import WhisperProcessor
+        return WhisperProcessor
+    from utils.faster_whisper_utils import FasterWhisperProcessor
+    return FasterWhisperProcessor
+
+def run(args):
+    config = WHISPER_CONFIG['watch']
+    configure_logging(WHISPER_CONFIG['logging']['level'])
+    metrics = get_metrics()
+    metrics.configure(WHISPER_CONFIG['metrics']['enabled'], WHISPER_CONFIG['metrics']['jsonl'])
+    processor_kwargs = dict(
+        output_dir=WHISPER_CONFIG['paths']['output'],
+        input_dir=WHISPER_CONFIG['paths']['input'],
+        include_timestamps=WHISPER_CONFIG['timestamps']['include'],
+        timestamp_format=WHISPER_CONFIG['timestamps']['format'],
+        output_format=WHISPER_CONFIG['output_format'],
+        language=args.language,
+        cache=TranscriptionCache(
+            WHISPER_CONFIG['cache']['dir'],
+            WHISPER_CONFIG['cache']['max_size_mb']
+        ) if WHISPER_CONFIG['cache']['enabled'] else None,
+        # ジョブ単位で並列化するため、ワーカー内での分割並列処理は行わない
+        long_audio=None,
+        pcm_cache=PcmCache(WHISPER_CONFIG['pcm_cache']['dir']) if WHISPER_CONFIG['pcm_cache']['enabled'] else None,
+        streaming_decode=WHISPER_CONFIG['streaming_decode'],
+        media_placement=WHISPER_CONFIG['media']['placement'],
+        media_proxy=WHISPER_CONFIG['media']['proxy'],
+        word_timestamps=WHISPER_CONFIG['word_timestamps'],
+        archive=TranscriptArchive(WHISPER_CONFIG['transcripts']['dir']) if WHISPER_CONFIG['transcripts']['enabled'] else None,
+        vad=WHISPER_CONFIG['vad'] if WHISPER_CONFIG['vad']['enabled'] else None,
+        checkpoints=CheckpointStore(
+            WHISPER_CONFIG['checkpoint']['dir'],
+            WHISPER_CONFIG['checkpoint']['interval_sec']
+        ) if WHISPER_CONFIG['checkpoint']['enabled'] else None
+    )
+    model_kwargs = dict(device=WHISPER_CONFIG['device'], compute_type=WHISPER_CONFIG['compute_type'])
+    work_dir = WHISPER_CONFIG['paths']['work']
+    workers = max(1, args.workers)
+    retry = dict(
+        max_attempts=config['max_attempts'],
+        backoff_sec=config['backoff_sec'],
+        backoff_max_sec=config['backoff_max_sec']
+    )
+
+    queue = JobQueue(config['db'])
+    recovered = queue.recover()
+    if recovered:
+        logger.info(f"Recovered: {recovered} jobs")
+    watcher = FolderWatcher(processor_kwargs['input_dir'], config['settle_sec'])
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    def start_pool():
+        # 各ワーカーはモデルを一度だけロードし、デーモンの終了まで保持する
+        executor = create_worker_pool(processor_class(args.backend), processor_kwargs, args.model, model_kwargs, workers)
+        warm_up(executor, workers)
+        return executor
+
+    logger.info(f"Watching: {processor_kwargs['input_dir']} ({args.backend}/{args.model}, {workers} workers)")
+    executor = start_pool()
+    running = {}
+    known = set()
+    throttled = False
+    try:
+        while not stop.is_set() or running:
+            # 完了したジョブの結果を記録
+            broken = False
+            finished = [future for future in running if future.done()]
+            for future in finished:
+                job = running.pop(future)
+                error = None
+                try:
+                    _path, ok = future.result()
+                    if not ok:
+                        error = 'processing failed'
+                except BrokenProcessPool as e:
+                    broken = True
+                    error = f"worker crashed: {str(e)}"
+                except Exception as e:
+                    error = str(e)
+                if error is None:
+                    queue.complete(job['id'])
+                    logger.info(f"Done: {job['path']}")
+                else:
+                    state = queue.fail(job['id'], error, **retry)
+                    logger.error(f"Failed: {job['path']} (attempt {job['attempts']}, {state}): {error}")
+            if broken:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = start_pool()
+            if finished and metrics.enabled:
+                # ワーカーが追記した計測結果を集計し直す
+                write_prometheus(WHISPER_CONFIG['metrics']['jsonl'], WHISPER_CONFIG['metrics']['prometheus'])
+            if finished and WHISPER_CONFIG['search']['enabled']:
+                # 完了したジョブの出力を検索できるようにする (変更のあったファイルだけを索引し直す)
+                update_index(WHISPER_CONFIG['search']['db'], [WHISPER_CONFIG['paths']['output'], WHISPER_CONFIG['transcripts']['dir']])
+
+            if not stop.is_set():
+                # キューが上限に達している間は新しいファイルを登録しない (ファイルは入力ディレクトリに残り、空き次第登録される)
+                depth = queue.depth()
+                if depth >= config['max_queue']:
+                    if not throttled:
+                        logger.warning(f"Backpressure: queue depth {depth} >= {config['max_queue']}")
+                    throttled = True
+                else:
+                    throttled = False
+                    for path, size, mtime_ns in watcher.poll():
+                        if (path, size, mtime_ns) in known:
+                            continue
+                        known.add((path, size, mtime_ns))
+                        if not queue.contains(path, size, mtime_ns) and queue.enqueue(path, size, mtime_ns):
+                            logger.info(f"Queued: {path}")
+                            depth += 1
+                            if depth >= config['max_queue']:
+                                break
+                    # 削除されたファイルを忘れる
+                    known = {item for item in known if item[0] in watcher.pending}
+
+                # 空いているワーカーにジョブを割り当てる
+                while len(running) < workers:
+                    job = queue.claim()
+                    if job is None:
+                        break
+                    if not os.path.exists(job['path']):
+                        queue.fail(job['id'], 'file not found', **dict(retry, max_attempts=0))
+                        continue
+                    running[executor.submit(process_input_in_worker, job['path'], work_dir)] = job
+
+            if running:
+                wait(list(running), timeout=config['poll_sec'], return_when=FIRST_COMPLETED)
+            else:
+                stop.wait(config['poll_sec'])
+    finally:
+        # 処理中のジョブは完了を待ってから終了する (強制終了された場合は次回起動時に処理待ちへ戻る)
+        executor.shutdown(wait=True)
+        queue.close()
+    logger.info("Watch stopped")
+
+def status(args):
+    queue = JobQueue(WHISPER_CONFIG['watch']['db'])
+    for state, count in queue.stats().items():
+        print(f"{state:<8}: {count}")
+    for job in queue.jobs(state=args.state, limit=args.limit):
+        updated = datetime.fromtimestamp(job['updated']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{job['id']:>6}  {job['state']:<8}  {job['attempts']}  {updated}  {job['path']}"
+              + (f"  ({job['error']})" if job['error'] else ''))
+
+def retry_failed(args):
+    queue = JobQueue(WHISPER_CONFIG['watch']['db'])
+    print(f"requeued: {queue.retry_failed()}")
+
+def main():
+    config = WHISPER_CONFIG['watch']
+    parser = argparse.ArgumentParser(description="入力ディレクトリを監視して文字起こしするデーモン")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="監視を開始")
+    run_parser.add_argument('--backend', default=config['backend'], choices=['faster-whisper', 'whisper'])
+    run_parser.add_argument('--model', default=WHISPER_CONFIG['models']['default'])
+    run_parser.add_argument('--language', default=WHISPER_CONFIG['language'])
+    run_parser.add_argument('--workers', type=int, default=config['workers'], help="同時に処理するジョブ数")
+    run_parser.set_defaults(func=run)
+
+    status_parser = subparsers.add_parser('status', help="ジョブの状態を表示")
+    status_parser.add_argument('--state', choices=['queued', 'running', 'done', 'failed'])
+    status_parser.add_argument('--limit', type=int, default=20)
+    status_parser.set_defaults(func=status)
+
+    retry_parser = subparsers.add_parser('retry', help="失敗したジョブを再投入")
+    retry_parser.set_defaults(func=retry_failed)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
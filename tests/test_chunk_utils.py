@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from utils.chunk_utils import plan_windows, stitch_window_segments
+
+SR = 16000
+
+def test_windows_cover_audio_without_gaps():
+    audio = np.random.default_rng(0).standard_normal(SR * 120).astype(np.float32)
+    windows = plan_windows(audio, window_sec=30, overlap_sec=2, search_sec=5)
+    assert windows[0][2] == 0
+    assert windows[-1][3] == float('inf')
+    for previous, current in zip(windows, windows[1:]):
+        # 担当区間は隙間なくつながり、窓は担当区間の前後に重なりを持つ
+        assert previous[3] == current[2]
+        assert current[0] < previous[1]
+    for start, end, core_start, core_end in windows:
+        assert 0 <= start < end <= len(audio)
+        assert end - start <= (30 + 2 * 2) * SR
+
+def test_short_window_terminates():
+    audio = np.random.default_rng(0).standard_normal(SR * 120).astype(np.float32)
+    windows = plan_windows(audio, window_sec=5, overlap_sec=1, search_sec=4)
+    assert len(windows) >= 24
+
+def test_window_must_be_longer_than_search():
+    with pytest.raises(ValueError):
+        plan_windows(np.zeros(SR * 60, dtype=np.float32), window_sec=5, overlap_sec=1)
+
+def test_stitch_keeps_each_segment_once():
+    audio = np.zeros(SR * 100, dtype=np.float32)
+    windows = plan_windows(audio, window_sec=40, overlap_sec=5, search_sec=10)
+    # 全体の時刻で1秒ごとのセグメント。各窓には重なりを含めた範囲のセグメントを窓の先頭からの時刻で渡す
+    segments = [{'text': str(i), 'start': float(i), 'end': i + 1.0} for i in range(100)]
+    stitched = []
+    for window in windows:
+        offset = window[0] / SR
+        local = [
+            {**segment, 'start': segment['start'] - offset, 'end': segment['end'] - offset}
+            for segment in segments if window[0] / SR <= segment['start'] and segment['end'] <= window[1] / SR
+        ]
+        stitched += list(stitch_window_segments(window, local))
+    assert [segment['text'] for segment in stitched] == [segment['text'] for segment in segments]
+    assert [segment['start'] for segment in stitched] == pytest.approx([segment['start'] for segment in segments])
@@ -0,0 +1,82 @@
+import random
+import pytest
+from utils import score_utils
+from utils.score_utils import (
+    align, levenshtein, character_errors, character_error_rate, word_error_rate, evaluate_corpus
+)
+
+def reference_distance(a, b):
+    """素朴な動的計画法による編集距離"""
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+def random_pairs(count, alphabet, max_length, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        a = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+        b = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+        yield a, b
+
+def check_opcodes(a, b, opcodes):
+    """opcodesが両方の系列を隙間なく覆い、a を b に変換できることを確認して操作回数を返す"""
+    i = j = 0
+    cost = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+        elif tag == 'replace':
+            assert i2 > i1 and j2 > j1
+        elif tag == 'delete':
+            assert i2 > i1 and j2 == j1
+        else:
+            assert tag == 'insert' and i2 == i1 and j2 > j1
+        if tag != 'equal':
+            cost += max(i2 - i1, j2 - j1)
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    return cost
+
+@pytest.mark.parametrize('alphabet', ['ab', 'abcdef', '貴社の記者が汽車で帰社した'])
+def test_levenshtein_matches_reference(alphabet):
+    for a, b in random_pairs(500, alphabet, 80):
+        assert levenshtein(a, b) == reference_distance(a, b)
+
+def test_levenshtein_long_and_word_sequences():
+    for a, b in random_pairs(20, 'abc', 400, seed=1):
+        assert levenshtein(a, b) == reference_distance(a, b)
+    words_a = 'the quick brown fox jumps over the lazy dog'.split()
+    words_b = 'a quick brown dog jumps over lazy fox'.split()
+    assert levenshtein(words_a, words_b) == reference_distance(words_a, words_b)
+
+def test_align_is_minimal():
+    for a, b in random_pairs(300, 'abcd', 60, seed=2):
+        # 置換と削除・挿入が隣り合う区間は長い方の長さで数えるため、最小の編集距離と一致する
+        assert check_opcodes(a, b, align(a, b)) == reference_distance(a, b)
+
+def test_align_uses_hirschberg_split(monkeypatch):
+    # 全体の表を作らず分割する経路も同じ結果になる
+    monkeypatch.setattr(score_utils, '_FULL_TABLE_CELLS', 16)
+    for a, b in random_pairs(100, 'abc', 120, seed=3):
+        assert check_opcodes(a, b, align(a, b)) == reference_distance(a, b)
+
+def test_error_rates():
+    assert character_errors('貴社の記者が、汽車で帰社した。', '記者の記者が汽車で帰社した') == (2, 13)
+    assert character_error_rate('abc', 'abc') == 0.0
+    assert character_error_rate('', '') == 0.0
+    assert character_error_rate('', 'a') == 1.0
+    assert word_error_rate('The cat sat.', 'the cat sat on') == pytest.approx(1 / 3)
+
+def test_evaluate_corpus_sums_errors():
+    pairs = [('abcd', 'abed'), ('hello world', 'hello word')]
+    result = evaluate_corpus(pairs, workers=1)
+    assert result['char_errors'] == 2
+    assert result['chars'] == 4 + 10
+    assert result['cer'] == pytest.approx(2 / 14)
+    assert result['word_errors'] == 2
+    assert result['words'] == 3
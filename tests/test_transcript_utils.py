@@ -0,0 +1,89 @@
+import os
+import mmap
+import pytest
+from utils.transcript_utils import Transcript, TranscriptArchive, TranscriptWriter
+from utils.word_utils import WordTimings
+
+SEGMENTS = [
+    {
+        'text': ' こんにちは、世界。',
+        'start': 0.0,
+        'end': 1.5,
+        'words': WordTimings.from_words([
+            {'word': ' こんにちは、', 'start': 0.0, 'end': 0.8, 'probability': 0.9},
+            {'word': '世界。', 'start': 0.8, 'end': 1.5, 'probability': 0.75},
+        ]),
+    },
+    # 単語のタイムスタンプが無いセグメントと空のテキスト
+    {'text': '', 'start': 1.5, 'end': 2.0},
+    {
+        'text': ' Hello world',
+        'start': 2.0,
+        'end': 3.25,
+        'words': WordTimings.from_words([
+            {'word': ' Hello', 'start': 2.0, 'end': 2.5, 'probability': 0.5},
+            {'word': ' world', 'start': 2.5, 'end': 3.25, 'probability': 0.25},
+        ]),
+    },
+]
+META = {'source': 'input.mp4', 'backend': 'faster-whisper', 'model': 'small', 'language': 'ja'}
+
+def check_loaded(transcript):
+    # 配列はメモリマップした領域をコピーせずに参照する
+    assert isinstance(transcript.start.base.obj, mmap.mmap)
+    assert transcript.meta == META
+    assert len(transcript) == len(SEGMENTS)
+    assert transcript.texts() == [segment['text'] for segment in SEGMENTS]
+    texts = ''.join(segment['text'] for segment in SEGMENTS).encode('utf-8')
+    assert transcript.text_buffer.tobytes() == texts
+    first = len(SEGMENTS[0]['text'].encode('utf-8'))
+    assert transcript.text_offsets.tolist() == [0, first, first, first + len(' Hello world')]
+    assert transcript.word_index.tolist() == [0, 2, 2, 4]
+    assert transcript.word_text_buffer.tobytes().decode('utf-8') == ' こんにちは、世界。 Hello world'
+    assert transcript.word_start_ms.tolist() == [0, 800, 2000, 2500]
+    assert transcript.word_end_ms.tolist() == [800, 1500, 2500, 3250]
+    assert transcript.word_probability.tolist() == pytest.approx([0.9, 0.75, 0.5, 0.25], abs=1e-3)
+    for loaded, segment in zip(transcript, SEGMENTS):
+        assert loaded['text'] == segment['text']
+        assert (loaded['start'], loaded['end']) == (segment['start'], segment['end'])
+        if 'words' in segment:
+            assert list(loaded['words']) == list(segment['words'])
+            assert loaded['words'].offsets.tolist() == segment['words'].offsets.tolist()
+        else:
+            assert 'words' not in loaded
+
+def test_save_and_mmap_load(tmp_path):
+    path = str(tmp_path / 'a.wtr')
+    Transcript.from_segments(SEGMENTS, META).save(path)
+    check_loaded(Transcript.load(path))
+
+def test_writer_matches_save(tmp_path):
+    saved = str(tmp_path / 'saved.wtr')
+    written = str(tmp_path / 'written.wtr')
+    Transcript.from_segments(SEGMENTS, META).save(saved)
+    writer = TranscriptWriter(written, META)
+    for segment in SEGMENTS:
+        writer.add(segment)
+    writer.close()
+    with open(saved, 'rb') as a, open(written, 'rb') as b:
+        assert a.read() == b.read()
+    check_loaded(Transcript.load(written))
+
+def test_empty_transcript(tmp_path):
+    path = str(tmp_path / 'empty.wtr')
+    writer = TranscriptWriter(path, META)
+    writer.close()
+    transcript = Transcript.load(path)
+    assert len(transcript) == 0
+    assert list(transcript) == []
+
+def test_archive_saves_only_completed(tmp_path):
+    archive = TranscriptArchive(str(tmp_path))
+    path = archive.path_for('input.wav', 'small')
+    segments = archive.tee(path, iter(SEGMENTS), META)
+    next(segments)
+    segments.close()
+    assert not os.path.exists(path)
+    assert list(archive.tee(path, iter(SEGMENTS), META)) == SEGMENTS
+    check_loaded(Transcript.load(path))
+    assert os.listdir(str(tmp_path)) == ['input_small.wtr']